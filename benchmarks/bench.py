@@ -0,0 +1,290 @@
+"""
+离线基准测试: 使用 fixtures/ 中的 article/info/get 响应测量
+解析 (parse_apps)、markdown 渲染与 save_app_async 写入的吞吐,
+以及以 fixtures 代替网络请求的完整流水线 (列表 -> 详情 -> 解析 -> 图片 -> 写入), 结果输出为 JSON
+
+用法: python -m benchmarks.bench --repeat 20 --output bench.json
+"""
+
+import asyncio
+import dataclasses
+import datetime as dt
+import hashlib
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+
+from pyrallis import argparsing
+
+from spider import (
+    PaiAppData,
+    PaiAppParser,
+    PaiAppSaver,
+    PaiArticleFetcher,
+    PaiCrawlManifest,
+    PaiCrawlPipeline,
+)
+from spider.data import JSONObjdctType, PaiAppMdFrontmatter
+
+
+@dataclass
+class BenchConfig:
+    fixtures_dir: str = os.path.join(os.path.dirname(__file__), "fixtures")
+    repeat: int = 20
+    parser_backend: str = "auto"
+    output: str = ""
+
+
+def load_fixtures(fixtures_dir: str) -> list[JSONObjdctType]:
+    articles = []
+    for name in sorted(os.listdir(fixtures_dir)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(fixtures_dir, name), encoding="utf-8") as f:
+            articles.append(json.load(f)["data"])
+    return articles
+
+
+def stage_result(seconds: float, articles: int, apps: int) -> dict:
+    return {
+        "seconds": round(seconds, 4),
+        "articles": articles,
+        "apps": apps,
+        "articles_per_sec": round(articles / seconds, 2) if seconds else None,
+        "apps_per_sec": round(apps / seconds, 2) if seconds else None,
+    }
+
+
+def bench_parse(
+    parser: PaiAppParser, articles: list[JSONObjdctType], repeat: int
+) -> dict:
+    apps = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for article in articles:
+            apps += len(parser.parse_app_list(article))
+    return stage_result(time.perf_counter() - start, len(articles) * repeat, apps)
+
+
+def bench_render(
+    parser: PaiAppParser, articles: list[JSONObjdctType], repeat: int
+) -> dict:
+    """
+    仅测量 markdown 渲染, 片段解析在计时之外完成
+    """
+    inputs = []
+    for article in articles:
+        article_data = parser.parse_article(article)
+        for raw in parser.split_apps(article):
+            html = raw.html_elements
+            if not isinstance(html, str):
+                html = "".join(str(e) for e in html)
+            frontmatter = PaiAppMdFrontmatter(
+                title=raw.title,
+                app_name=raw.title,
+                platforms=[],
+                keywords=[],
+                article_title=article_data.title,
+                article_id=article_data.id,
+                article_url=article_data.url,
+                released_time=article_data.release_time,
+            )
+            container = parser._parse_fragment(html)
+            inputs.append((frontmatter, list(container.contents), container))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frontmatter, nodes, container in inputs:
+            parser._construct_content(frontmatter, nodes, container)
+    return stage_result(
+        time.perf_counter() - start, len(articles) * repeat, len(inputs) * repeat
+    )
+
+
+def bench_save(apps: list[PaiAppData], articles: int, repeat: int) -> dict:
+    """
+    写入临时目录, 不下载图片
+    """
+    apps = [dataclasses.replace(app, img_list=[]) for app in apps]
+
+    async def save_all(output_dir: str):
+        saver = PaiAppSaver(output_dir=output_dir)
+        image_semaphore = asyncio.Semaphore(16)
+        try:
+            await asyncio.gather(
+                *(
+                    saver.save_app_async(app, image_semaphore=image_semaphore)
+                    for app in apps
+                )
+            )
+        finally:
+            await saver.close()
+            saver.writer.close()
+
+    seconds = 0.0
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as output_dir:
+            start = time.perf_counter()
+            asyncio.run(save_all(output_dir))
+            seconds += time.perf_counter() - start
+    return stage_result(seconds, articles * repeat, len(apps) * repeat)
+
+
+class StubFetcher(PaiArticleFetcher):
+    """
+    不发出网络请求的 fetcher: 文章列表与详情来自 fixtures, 图片写入固定内容
+    """
+
+    IMAGE = b"\x89PNG\r\n\x1a\n" + bytes(4096)
+
+    def __init__(self, articles: list[JSONObjdctType]):
+        super().__init__()
+        self.details = {int(a["id"]): a for a in articles}
+        # 与接口一致, 文章列表按发布时间倒序, 只包含列表中的字段
+        self.feed = sorted(
+            (
+                {k: a[k] for k in ("id", "title", "released_time", "modify_time")}
+                for a in articles
+            ),
+            key=lambda a: a["released_time"],
+            reverse=True,
+        )
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def _fetch_feed_page(
+        self, limit: int, offset: int, archive: bool
+    ) -> list[JSONObjdctType] | None:
+        return self.feed[offset : offset + limit]
+
+    async def fetch_article_detail(self, article_id: int) -> JSONObjdctType | None:
+        return self.details.get(article_id)
+
+    async def download_image(self, url: str, path: str, **kwargs) -> str:
+        await asyncio.to_thread(self._write_image, path)
+        return hashlib.sha256(self.IMAGE).hexdigest()
+
+    def _write_image(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.IMAGE)
+
+
+def replicate_articles(
+    articles: list[JSONObjdctType], repeat: int
+) -> list[JSONObjdctType]:
+    """
+    fixtures 复制 repeat 份, 每份使用不同的文章 id 与发布日期
+    """
+    copies = []
+    for r in range(repeat):
+        for article in articles:
+            copies.append(
+                {
+                    **article,
+                    "id": int(article["id"]) + r * 1_000_000,
+                    "released_time": int(article["released_time"]) - r * 86400,
+                }
+            )
+    return copies
+
+
+def bench_pipeline(
+    parser: PaiAppParser, articles: list[JSONObjdctType], apps: int, repeat: int
+) -> tuple[dict, dict]:
+    """
+    完整流水线在临时目录中运行两次: 首次全部处理, 第二次文章均未变化, 由抓取清单跳过
+    """
+    corpus = replicate_articles(articles, repeat)
+    start = dt.datetime.fromtimestamp(0)
+    end = dt.datetime.now()
+
+    async def crawl(output_dir: str) -> dict:
+        fetcher = StubFetcher(corpus)
+        manifest = PaiCrawlManifest(output_dir)
+        saver = PaiAppSaver(output_dir=output_dir, manifest=manifest, fetcher=fetcher)
+        pipeline = PaiCrawlPipeline(
+            fetcher=fetcher,
+            parser=parser,
+            saver=saver,
+            sleep_time=0,
+            manifest=manifest,
+        )
+        try:
+            return await pipeline.run(start, end)
+        finally:
+            await saver.close()
+            saver.writer.close()
+            manifest.close()
+
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for _ in range(2):
+            begin = time.perf_counter()
+            stats = asyncio.run(crawl(output_dir))
+            results.append(
+                {
+                    **stage_result(
+                        time.perf_counter() - begin, len(corpus), apps * repeat
+                    ),
+                    "articles_succeeded": stats["articles_succeeded"],
+                    "articles_unchanged": stats["articles_unchanged"],
+                    "images_succeeded": stats["images_succeeded"],
+                }
+            )
+    return results[0], results[1]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(cfg: BenchConfig):
+    logging.disable(logging.INFO)
+
+    articles = load_fixtures(cfg.fixtures_dir)
+    parser = PaiAppParser(backend=cfg.parser_backend)
+    apps = [app for article in articles for app in parser.parse_app_list(article)]
+    pipeline, pipeline_unchanged = bench_pipeline(
+        parser, articles, len(apps), cfg.repeat
+    )
+
+    report = {
+        "commit": git_commit(),
+        "time": dt.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "parser_backend": parser.backend,
+        "repeat": cfg.repeat,
+        "results": {
+            "parse_apps": bench_parse(parser, articles, cfg.repeat),
+            "render_markdown": bench_render(parser, articles, cfg.repeat),
+            "save_app_async": bench_save(apps, len(articles), cfg.repeat),
+            "pipeline": pipeline,
+            "pipeline_unchanged": pipeline_unchanged,
+        },
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if cfg.output:
+        with open(cfg.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main(argparsing.parse(config_class=BenchConfig))
@@ -3,18 +3,51 @@ import datetime as dt
 import json
 import logging
 import os
+import signal
+import socket
 import sys
-from dataclasses import asdict, dataclass
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from typing import Awaitable, Callable, Iterable
 
-import aiohttp
 from pyrallis import argparsing
 
-from spider import PaiAppParser, PaiAppSaver, PaiArticleFetcher
+from spider import (
+    PaiAppIndex,
+    PaiAppParser,
+    PaiAppSaver,
+    PaiAppSink,
+    PaiArticleSelector,
+    PaiArticleTimings,
+    PaiArticleFetcher,
+    PaiCrawlManifest,
+    PaiAdaptiveLimiter,
+    PaiCrawlPipeline,
+    PaiFileWriter,
+    PaiImageOptimizer,
+    PaiImageQueue,
+    PaiImageStore,
+    PaiMarkdownSink,
+    PaiMetrics,
+    PaiProfiler,
+    PaiRawArchive,
+    PaiResponseCache,
+    PaiSearchIndex,
+    PaiSearchSink,
+    PaiWorkQueue,
+)
+from spider.parser import parse_field_rules
+from spider.selector import parse_selectors
+from spider.sinks import SINKS
 from spider.util import date_format
 
 
 @dataclass
 class RunConfig:
+    mode: str = "crawl"
+    selectors: str = "paiping"
     months: int = 0
     update: bool = False
     output_dir: str = "data"
@@ -26,6 +59,68 @@ class RunConfig:
     request_timeout: int = 15
     max_retries: int = 3
     retry_base_delay: float = 0.5
+    cache_path: str = ""
+    cache_ttl: int = 7 * 24 * 3600
+    cache_max_mb: int = 256
+    parse_workers: int = 0
+    queue_size: int = 16
+    end_date: str = ""
+    feed_seek: bool = False
+    use_manifest: bool = True
+    image_store: bool = True
+    image_chunk_kb: int = 64
+    image_max_mb: int = 50
+    optimize_images: bool = False
+    image_max_dimension: int = 1600
+    image_format: str = ""
+    image_quality: int = 80
+    thumbnail_size: int = 0
+    image_workers: int = 0
+    defer_images: bool = False
+    background_images: bool = True
+    image_queue_attempts: int = 5
+    image_queue_retry_delay: float = 60
+    retry_failed_images: bool = False
+    app_dedup: str = ""
+    watch_interval: float = 30
+    watch_jitter: float = 0.2
+    watch_max_pages: int = 5
+    watch_max_failures: int = 3
+    work_queue_path: str = ""
+    shard_size: int = 8
+    shard_workers: int = 0
+    shard_lease: float = 600
+    worker_id: str = ""
+    adaptive_concurrency: bool = False
+    min_concurrency: int = 1
+    max_concurrency: int = 32
+    image_timeout: int = 30
+    connection_limit: int = 64
+    connection_limit_per_host: int = 16
+    dns_cache_ttl: int = 300
+    keepalive_timeout: int = 30
+    parser_backend: str = "html.parser"
+    extra_fields: str = ""
+    archive_path: str = ""
+    metrics_json: str = ""
+    metrics_prom: str = ""
+    metrics_interval: float = 15
+    profile: bool = False
+    profile_dir: str = "profile"
+    profile_clock: str = "wall"
+    fsync: str = "none"
+    write_batch_size: int = 64
+    sinks: str = "markdown,search"
+    sink_batch_size: int = 256
+    sqlite_path: str = ""
+    jsonl_path: str = ""
+    parquet_path: str = ""
+    search_index_path: str = ""
+    query: str = ""
+    platform: str = ""
+    keyword: str = ""
+    start_date: str = ""
+    limit: int = 20
 
 
 def setup_logging(path: str):
@@ -36,24 +131,56 @@ def setup_logging(path: str):
     )
 
 
-def get_latest_local_date(output_dir: str) -> dt.datetime | None:
-    """获取本地最新文章的日期，如果不存在返回 None"""
+def get_latest_local_date(
+    output_dir: str, subdirs: Iterable[str] = ("",)
+) -> dt.datetime | None:
+    """
+    获取本地最新文章的日期，优先读取抓取清单，否则查找输出目录及各选择器子目录下的日期目录，
+    如果不存在返回 None
+    """
     if not os.path.exists(output_dir):
         return None
 
-    date_dirs = [
-        d for d in os.listdir(output_dir) if os.path.isdir(os.path.join(output_dir, d))
-    ]
-    if not date_dirs:
-        return None
-    valid_dates = [dt.datetime.strptime(d, "%Y-%m-%d") for d in date_dirs]
+    if os.path.exists(os.path.join(output_dir, PaiCrawlManifest.FILENAME)):
+        manifest = PaiCrawlManifest(output_dir)
+        latest = manifest.latest_released_date()
+        manifest.close()
+        if latest:
+            return dt.datetime.strptime(latest, "%Y-%m-%d")
+
+    valid_dates = []
+    for subdir in set(subdirs):
+        directory = os.path.join(output_dir, subdir)
+        if not os.path.isdir(directory):
+            continue
+        for d in os.listdir(directory):
+            if not os.path.isdir(os.path.join(directory, d)):
+                continue
+            try:
+                valid_dates.append(dt.datetime.strptime(d, "%Y-%m-%d"))
+            except ValueError:
+                continue
     return max(valid_dates) if valid_dates else None
 
 
+def get_range_end(args: RunConfig) -> dt.datetime:
+    """抓取范围的结束时间, 未指定 end_date 时为当前时间"""
+    if not args.end_date:
+        return dt.datetime.now()
+    try:
+        end_date = dt.datetime.strptime(args.end_date, "%Y-%m-%d")
+    except ValueError:
+        logging.error(f"main: end_date={args.end_date} 不合法, 格式应为 YYYY-MM-DD")
+        sys.exit(0)
+    return end_date + dt.timedelta(days=1) - dt.timedelta(seconds=1)
+
+
 def calculate_time_range(
     args: RunConfig,
 ) -> tuple[dt.datetime, dt.datetime]:
-    latest_local_date = get_latest_local_date(args.output_dir)
+    latest_local_date = get_latest_local_date(
+        args.output_dir, [s.subdir for s in create_selectors(args)]
+    )
 
     if not latest_local_date:
         # 本地没有文章, 检查 months 参数
@@ -64,7 +191,7 @@ def calculate_time_range(
             logging.error(f"main: months={args.months} 不合法")
             sys.exit(0)
 
-        end = dt.datetime.now()
+        end = get_range_end(args)
         start = end - dt.timedelta(days=30 * args.months)
         return (start, end)
 
@@ -76,7 +203,7 @@ def calculate_time_range(
             logging.warning("main: 同步模式下 months 参数无效")
 
         start = latest_local_date + dt.timedelta(days=1)
-        end = dt.datetime.now()
+        end = get_range_end(args)
         return (start, end)
 
     # 本地已有文章, 但使用 months 参数抓取
@@ -84,7 +211,7 @@ def calculate_time_range(
         logging.error(f"main: months={args.months} 不合法")
         sys.exit(0)
 
-    end = dt.datetime.now()
+    end = get_range_end(args)
     months_start = end - dt.timedelta(days=30 * args.months if args.months else 0)
     if latest_local_date >= months_start:
         logging.warning(
@@ -93,6 +220,191 @@ def calculate_time_range(
     return (months_start, end)
 
 
+def start_metrics_export(
+    args: RunConfig, metrics: PaiMetrics
+) -> asyncio.Task | None:
+    """
+    指定 metrics_prom 时在后台定期写出 Prometheus 文本格式指标
+    """
+    if not args.metrics_prom:
+        return None
+    return asyncio.create_task(
+        metrics.export_periodically(args.metrics_prom, args.metrics_interval)
+    )
+
+
+async def finish_metrics(
+    args: RunConfig, metrics: PaiMetrics, exporter: asyncio.Task | None
+):
+    if exporter is not None:
+        exporter.cancel()
+    try:
+        if args.metrics_prom:
+            await asyncio.to_thread(metrics.write_prometheus, args.metrics_prom)
+        if args.metrics_json:
+            await asyncio.to_thread(metrics.write_json, args.metrics_json)
+    except OSError as e:
+        logging.error(f"main: 写出指标失败 error={e}")
+    logging.info(f"指标: {json.dumps(metrics.snapshot(), ensure_ascii=False)}")
+
+
+def search_index_path(args: RunConfig) -> str:
+    return args.search_index_path or os.path.join(
+        args.output_dir, PaiSearchIndex.FILENAME
+    )
+
+
+def create_sinks(
+    args: RunConfig, writer: PaiFileWriter, manifest: PaiCrawlManifest | None
+) -> list[PaiAppSink]:
+    """
+    按 sinks 参数 (逗号分隔) 创建输出目标, 汇总文件默认保存在输出目录下
+    """
+    default_paths = {
+        "search": search_index_path(args),
+        "sqlite": args.sqlite_path or os.path.join(args.output_dir, "apps.sqlite3"),
+        "jsonl": args.jsonl_path or os.path.join(args.output_dir, "apps.jsonl"),
+        "parquet": args.parquet_path or os.path.join(args.output_dir, "apps.parquet"),
+    }
+    sinks: list[PaiAppSink] = []
+    for name in (n.strip() for n in args.sinks.split(",")):
+        if not name:
+            continue
+        if name == PaiMarkdownSink.name:
+            sinks.append(PaiMarkdownSink(writer, manifest))
+        elif name in SINKS:
+            try:
+                sink = SINKS[name](
+                    default_paths[name],
+                    args.output_dir,
+                    batch_size=args.sink_batch_size,
+                )
+            except RuntimeError as e:
+                # 全文索引默认开启, SQLite 不支持 FTS5 trigram 时只跳过索引, 不影响抓取
+                if name != PaiSearchSink.name:
+                    raise
+                logging.warning(f"main: 全文索引不可用, 本次不维护索引 error={e}")
+                continue
+            sinks.append(sink)
+        else:
+            raise ValueError(
+                f"未知输出目标 {name}, 可选 {[PaiMarkdownSink.name, *SINKS]}"
+            )
+    return sinks
+
+
+def create_parser(args: RunConfig) -> PaiAppParser:
+    """
+    extra_fields 中的字段规则追加在默认的平台、关键词规则之后
+    """
+    return PaiAppParser(
+        backend=args.parser_backend,
+        field_rules=[
+            *PaiAppParser.FIELD_RULES,
+            *parse_field_rules(args.extra_fields),
+        ],
+    )
+
+
+def create_selectors(args: RunConfig) -> list[PaiArticleSelector]:
+    """
+    自定义选择器的附加字段追加在 extra_fields 之后, 与默认 parser 使用相同的解析后端
+    """
+    return parse_selectors(
+        args.selectors,
+        backend=args.parser_backend,
+        field_rules=[
+            *PaiAppParser.FIELD_RULES,
+            *parse_field_rules(args.extra_fields),
+        ],
+    )
+
+
+def create_image_optimizer(
+    args: RunConfig,
+) -> tuple[PaiImageOptimizer | None, ProcessPoolExecutor | None]:
+    """
+    启用图片优化时创建优化器及其专用进程池
+    """
+    if not args.optimize_images:
+        return None, None
+    executor = ProcessPoolExecutor(max_workers=args.image_workers or None)
+    optimizer = PaiImageOptimizer(
+        output_dir=args.output_dir,
+        executor=executor,
+        max_dimension=args.image_max_dimension,
+        image_format=args.image_format,
+        quality=args.image_quality,
+        thumbnail_size=args.thumbnail_size,
+    )
+    return optimizer, executor
+
+
+def create_fetcher(
+    args: RunConfig,
+    metrics: PaiMetrics,
+    cache: PaiResponseCache | None = None,
+    limiter: PaiAdaptiveLimiter | None = None,
+    archive: PaiRawArchive | None = None,
+) -> PaiArticleFetcher:
+    return PaiArticleFetcher(
+        request_timeout=args.request_timeout,
+        max_retries=args.max_retries,
+        retry_base_delay=args.retry_base_delay,
+        cache=cache,
+        limiter=limiter,
+        archive=archive,
+        image_timeout=args.image_timeout,
+        connection_limit=args.connection_limit,
+        connection_limit_per_host=args.connection_limit_per_host,
+        dns_cache_ttl=args.dns_cache_ttl,
+        keepalive_timeout=args.keepalive_timeout,
+        metrics=metrics,
+    )
+
+
+def create_image_queue(args: RunConfig) -> PaiImageQueue:
+    return PaiImageQueue(
+        args.output_dir,
+        max_attempts=args.image_queue_attempts,
+        retry_base_delay=args.image_queue_retry_delay,
+    )
+
+
+def finish_image_queue(image_queue: PaiImageQueue, stats: dict):
+    stats["image_queue"] = {**image_queue.stats, **image_queue.counts()}
+    image_queue.close()
+
+
+def create_app_index(args: RunConfig) -> PaiAppIndex | None:
+    """
+    app_dedup 为 alias 或 skip 时启用跨文章的 app 去重
+    """
+    if not args.app_dedup:
+        return None
+    return PaiAppIndex(args.output_dir, action=args.app_dedup)
+
+
+def finish_app_index(app_index: PaiAppIndex | None, stats: dict):
+    if app_index is None:
+        return
+    stats["app_index"] = app_index.stats
+    app_index.close()
+
+
+def create_article_timings(args: RunConfig) -> PaiArticleTimings | None:
+    return PaiArticleTimings(args.profile_dir) if args.profile else None
+
+
+def finish_article_timings(article_timings: PaiArticleTimings | None):
+    if article_timings is None:
+        return
+    article_timings.close()
+    for record in article_timings.slowest_articles():
+        logging.info(f"Profiler: 慢文章 {json.dumps(record, ensure_ascii=False)}")
+    logging.info(f"Profiler: 文章耗时记录已保存到 {article_timings.path}")
+
+
 async def async_main(args: RunConfig):
     setup_logging(args.log_file)
 
@@ -116,148 +428,577 @@ async def async_main(args: RunConfig):
 
     logging.info(f"main: 详细配置: {json.dumps(final_cfg)}")
 
-    fetcher = PaiArticleFetcher(
-        request_timeout=args.request_timeout,
-        max_retries=args.max_retries,
-        retry_base_delay=args.retry_base_delay,
+    await run_pipeline(args, lambda pipeline: pipeline.run(start, end))
+
+
+async def run_pipeline(
+    args: RunConfig, work: Callable[[PaiCrawlPipeline], Awaitable[dict]]
+):
+    """
+    创建抓取所需的各组件并执行 work, 结束后释放资源并输出统计
+    """
+    cache = None
+    if args.cache_path:
+        cache = PaiResponseCache(
+            path=args.cache_path,
+            ttl=args.cache_ttl,
+            max_bytes=args.cache_max_mb * 1024 * 1024,
+        )
+
+    limiter = None
+    if args.adaptive_concurrency:
+        limiter = PaiAdaptiveLimiter(
+            initial=args.article_concurrency,
+            min_limit=args.min_concurrency,
+            max_limit=args.max_concurrency,
+        )
+
+    archive = PaiRawArchive(args.archive_path) if args.archive_path else None
+    metrics = PaiMetrics()
+    article_timings = create_article_timings(args)
+    writer = PaiFileWriter(
+        fsync=args.fsync, batch_size=args.write_batch_size, metrics=metrics
     )
-    parser = PaiAppParser()
-    saver = PaiAppSaver(output_dir=args.output_dir)
-
-    article_semaphore = asyncio.Semaphore(args.article_concurrency)
-    image_semaphore = asyncio.Semaphore(args.image_concurrency)
-
-    offset = 0
-    keep_going = True
-    article_tasks: list[asyncio.Task[tuple[int, int, int, bool]]] = []
-    stats = {
-        "articles_scanned": 0,
-        "articles_matched": 0,
-        "articles_succeeded": 0,
-        "articles_failed": 0,
-        "images_succeeded": 0,
-        "images_failed": 0,
-    }
 
-    async with aiohttp.ClientSession(headers=PaiArticleFetcher.HEADERS) as image_session:
-        await fetcher.start()
-        try:
-            while keep_going:
-                articles = await fetcher.fetch_feed_articles(
-                    limit=args.page_size, offset=offset
-                )
-                if not articles:
-                    logging.info("main: 没有更多文章，结束抓取")
-                    break
-
-                for article in articles:
-                    stats["articles_scanned"] += 1
-                    released_time = article.get("released_time", 0)
-                    article_date = dt.datetime.fromtimestamp(released_time)
-
-                    if article_date < start or article_date > end:
-                        logging.info(
-                            f"main: 文章发布时间 {article_date} 超出时间范围, 结束文章抓取"
-                        )
-                        keep_going = False
-                        break
-
-                    title = str(article.get("title", ""))
-                    aid = int(article["id"])
-                    if "派评" in title and "近期值得关注" in title:
-                        stats["articles_matched"] += 1
-                        logging.info(f"main: 抓取目标文章: {aid} {title} ({article_date})")
-                        article_tasks.append(
-                            asyncio.create_task(
-                                process_article(
-                                    aid=aid,
-                                    fetcher=fetcher,
-                                    parser=parser,
-                                    saver=saver,
-                                    article_semaphore=article_semaphore,
-                                    image_semaphore=image_semaphore,
-                                    image_session=image_session,
-                                    request_timeout=args.request_timeout,
-                                )
-                            )
-                        )
-
-                offset += args.page_size
-                if keep_going and args.sleep_time > 0:
-                    await asyncio.sleep(args.sleep_time)
-
-            if article_tasks:
-                results = await asyncio.gather(*article_tasks, return_exceptions=True)
-                for result in results:
-                    if isinstance(result, Exception):
-                        stats["articles_failed"] += 1
-                        logging.error(f"main: 文章任务异常: {result}")
-                        continue
-
-                    app_count, img_success, img_failed, ok = result
-                    if ok:
-                        stats["articles_succeeded"] += 1
-                    else:
-                        stats["articles_failed"] += 1
-                    stats["images_succeeded"] += img_success
-                    stats["images_failed"] += img_failed
-                    logging.info(f"main: 文章中发现 {app_count} 个 app 推荐")
-        finally:
-            await fetcher.close()
+    fetcher = create_fetcher(
+        args, metrics, cache=cache, limiter=limiter, archive=archive
+    )
+    manifest = PaiCrawlManifest(args.output_dir) if args.use_manifest else None
+    parser = create_parser(args)
+    image_store = PaiImageStore(args.output_dir) if args.image_store else None
+    image_optimizer, image_executor = create_image_optimizer(args)
+    # 文字优先: markdown 立即写入, 图片加入队列后在后台或 fetch-images 模式中下载
+    image_queue = create_image_queue(args) if args.defer_images else None
+    app_index = create_app_index(args)
+    saver = PaiAppSaver(
+        output_dir=args.output_dir,
+        manifest=manifest,
+        image_store=image_store,
+        image_chunk_size=args.image_chunk_kb * 1024,
+        image_max_bytes=args.image_max_mb * 1024 * 1024,
+        fetcher=fetcher,
+        metrics=metrics,
+        writer=writer,
+        sinks=create_sinks(args, writer, manifest),
+        image_optimizer=image_optimizer,
+        image_queue=image_queue,
+        app_index=app_index,
+    )
+    parse_executor = (
+        ProcessPoolExecutor(max_workers=args.parse_workers)
+        if args.parse_workers > 0
+        else None
+    )
+
+    await fetcher.start()
+    pipeline = PaiCrawlPipeline(
+        fetcher=fetcher,
+        parser=parser,
+        saver=saver,
+        page_size=args.page_size,
+        # 自适应限流时由限流器控制请求节奏与并发, 不再固定等待;
+        # 详情 worker 与图片并发按窗口上限创建, 使窗口可以增长到 max_concurrency
+        sleep_time=0 if limiter is not None else args.sleep_time,
+        article_concurrency=(
+            args.article_concurrency if limiter is None else args.max_concurrency
+        ),
+        image_concurrency=(
+            args.image_concurrency if limiter is None else args.max_concurrency
+        ),
+        queue_size=args.queue_size,
+        parse_executor=parse_executor,
+        feed_seek=args.feed_seek,
+        manifest=manifest,
+        metrics=metrics,
+        selectors=create_selectors(args),
+        article_timings=article_timings,
+        record_batch_size=args.sink_batch_size,
+    )
+    stats = pipeline.stats
+    exporter = start_metrics_export(args, metrics)
+    image_stop = asyncio.Event()
+    image_task = None
+    if image_queue is not None and args.background_images:
+        image_task = asyncio.create_task(
+            saver.process_image_queue(pipeline.image_semaphore, image_stop)
+        )
+    try:
+        await work(pipeline)
+        if image_task is not None:
+            logging.info("main: 文章已全部写入, 等待后台图片下载完成")
+            image_stop.set()
+            img_success, img_failed = await image_task
+            stats["images_succeeded"] += img_success
+            stats["images_failed"] += img_failed
+    finally:
+        if image_task is not None and not image_task.done():
+            image_task.cancel()
+        await fetcher.close()
+        if await saver.close():
+            # 各输出目标关闭后才持久化的记录 (如 parquet), 此时再记入抓取清单
+            await pipeline.commit_records()
+        await asyncio.to_thread(writer.close)
+        if parse_executor is not None:
+            parse_executor.shutdown(cancel_futures=True)
+        if cache is not None:
+            stats["cache"] = cache.stats
+            cache.close()
+        if manifest is not None:
+            manifest.close()
+        if image_store is not None:
+            stats["image_store"] = image_store.stats
+        if image_executor is not None:
+            image_executor.shutdown(cancel_futures=True)
+            stats["image_optimizer"] = image_optimizer.stats
+        if limiter is not None:
+            stats["limiter"] = limiter.stats
+        if image_queue is not None:
+            finish_image_queue(image_queue, stats)
+        finish_app_index(app_index, stats)
+        await finish_metrics(args, metrics, exporter)
+        finish_article_timings(article_timings)
 
     logging.info(f"完成. 统计: {json.dumps(stats, ensure_ascii=False)}")
 
 
-async def process_article(
-    aid: int,
-    fetcher: PaiArticleFetcher,
-    parser: PaiAppParser,
-    saver: PaiAppSaver,
-    article_semaphore: asyncio.Semaphore,
-    image_semaphore: asyncio.Semaphore,
-    image_session: aiohttp.ClientSession,
-    request_timeout: int,
-) -> tuple[int, int, int, bool]:
-    async with article_semaphore:
-        detail = await fetcher.fetch_article_detail(aid)
-        if detail is None:
-            logging.error(f"main: 获取文章详情失败 article_id={aid}")
-            return (0, 0, 0, False)
+WATCH_STATE_FILENAME = ".watch_state.json"
+
 
+def load_watch_state(args: RunConfig) -> tuple[int | None, dict[int, int]]:
+    """
+    watch 模式的高水位 (已处理的最大文章 id) 与高水位之上各文章已失败的轮数,
+    没有记录时高水位取抓取清单中的最大文章 id
+    """
+    path = os.path.join(args.output_dir, WATCH_STATE_FILENAME)
+    if os.path.exists(path):
         try:
-            apps = list(parser.parse_apps(detail))
-        except Exception as e:
-            logging.error(f"main: 解析文章失败 article_id={aid} error={e}")
-            return (0, 0, 0, False)
-
-        if not apps:
-            return (0, 0, 0, True)
-
-        save_tasks = [
-            asyncio.create_task(
-                saver.save_app_async(
-                    app_data=app,
-                    session=image_session,
-                    image_semaphore=image_semaphore,
-                    timeout=request_timeout,
-                )
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            failures = {int(k): int(v) for k, v in state.get("failures", {}).items()}
+            return int(state["high_water"]), failures
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logging.warning(f"main: 读取 watch 状态失败 error={e}")
+    if os.path.exists(os.path.join(args.output_dir, PaiCrawlManifest.FILENAME)):
+        manifest = PaiCrawlManifest(args.output_dir)
+        latest = manifest.latest_article_id()
+        manifest.close()
+        return latest, {}
+    return None, {}
+
+
+def save_watch_state(args: RunConfig, high_water: int, failures: dict[int, int]):
+    path = os.path.join(args.output_dir, WATCH_STATE_FILENAME)
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"high_water": high_water, "failures": failures}, f)
+    os.replace(tmp_path, path)
+
+
+async def watch_main(args: RunConfig):
+    """
+    常驻运行: 保持连接与已加载的模块, 定期轮询文章列表首页并处理新发布的文章
+    收到 SIGINT / SIGTERM 后完成当前一轮再退出
+    """
+    setup_logging(args.log_file)
+    os.makedirs(args.output_dir, exist_ok=True)
+    if not args.page_size > 0:
+        logging.error(f"main: 分页大小 {args.page_size} 不合法")
+        return
+
+    high_water, failures = load_watch_state(args)
+    logging.info(
+        f"main: 启动 watch 模式, 高水位 {high_water}, 轮询间隔 {args.watch_interval}s"
+    )
+    logging.info(f"main: 详细配置: {json.dumps(asdict(args))}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows 不支持, 由 KeyboardInterrupt 取消任务
+            pass
+
+    async def on_state(value: int, failed: dict[int, int]):
+        logging.info(f"main: 高水位 {value}, 待重试的失败文章 {failed}")
+        await asyncio.to_thread(save_watch_state, args, value, failed)
+
+    await run_pipeline(
+        args,
+        lambda pipeline: pipeline.watch(
+            high_water,
+            interval=args.watch_interval,
+            jitter=args.watch_jitter,
+            max_pages=args.watch_max_pages,
+            max_failures=args.watch_max_failures,
+            failures=failures,
+            on_state=on_state,
+            stop=stop,
+        ),
+    )
+
+
+def work_queue_path(args: RunConfig) -> str:
+    return args.work_queue_path or os.path.join(
+        args.output_dir, PaiWorkQueue.FILENAME
+    )
+
+
+def check_shard_sinks(args: RunConfig) -> bool:
+    """
+    分片抓取的 worker 进程同时写入输出目录, 只允许可多进程写入的输出目标
+    """
+    names = {n.strip() for n in args.sinks.split(",") if n.strip()}
+    unsupported = sorted(n for n in names if n in SINKS and not SINKS[n].multi_process)
+    if unsupported:
+        logging.error(
+            f"main: 输出目标 {unsupported} 不支持多个 worker 同时写入, 分片抓取时请去掉"
+        )
+        return False
+    return True
+
+
+async def coordinator_main(args: RunConfig):
+    """
+    分片抓取的 coordinator: 扫描时间范围内的目标文章并切分为分片写入共享任务队列,
+    shard_workers 大于 0 时在本机启动对应数量的 worker 进程并等待其完成
+    """
+    setup_logging(args.log_file)
+    os.makedirs(args.output_dir, exist_ok=True)
+    if not args.page_size > 0:
+        logging.error(f"main: 分页大小 {args.page_size} 不合法")
+        return
+    if not check_shard_sinks(args):
+        return
+
+    start, end = calculate_time_range(args)
+    logging.info(
+        f"main: 规划分片抓取 {date_format(start)} ~ {date_format(end)}, 每个分片 {args.shard_size} 篇文章"
+    )
+
+    metrics = PaiMetrics()
+    fetcher = create_fetcher(args, metrics)
+    manifest = PaiCrawlManifest(args.output_dir) if args.use_manifest else None
+    pipeline = PaiCrawlPipeline(
+        fetcher=fetcher,
+        parser=create_parser(args),
+        saver=PaiAppSaver(output_dir=args.output_dir, metrics=metrics, sinks=[]),
+        page_size=args.page_size,
+        sleep_time=args.sleep_time,
+        feed_seek=args.feed_seek,
+        manifest=manifest,
+        metrics=metrics,
+        selectors=create_selectors(args),
+    )
+    await fetcher.start()
+    try:
+        jobs = await pipeline.scan(start, end)
+    finally:
+        await fetcher.close()
+        if manifest is not None:
+            manifest.close()
+
+    queue = PaiWorkQueue(work_queue_path(args), lease_seconds=args.shard_lease)
+    try:
+        shards = await asyncio.to_thread(queue.plan, jobs, args.shard_size)
+        logging.info(f"main: {len(jobs)} 篇文章切分为 {shards} 个分片 {queue.path}")
+        if args.shard_workers <= 0:
+            logging.info(
+                "main: 在本机使用 --mode worker 并指定相同的 output_dir / work_queue_path 开始处理"
+            )
+            return
+
+        # worker 进程沿用 coordinator 的命令行参数, 后出现的 --mode 覆盖前者
+        workers = [
+            await asyncio.create_subprocess_exec(
+                sys.executable,
+                sys.argv[0],
+                *sys.argv[1:],
+                "--mode",
+                "worker",
+                "--worker_id",
+                f"{socket.gethostname()}-{i}",
             )
-            for app in apps
+            for i in range(args.shard_workers)
         ]
-        save_results = await asyncio.gather(*save_tasks, return_exceptions=True)
-        img_success = 0
-        img_failed = 0
-        ok = True
-        for save_result in save_results:
-            if isinstance(save_result, Exception):
-                ok = False
+        codes = await asyncio.gather(*(w.wait() for w in workers))
+        if any(codes):
+            logging.error(f"main: worker 进程异常退出 exit_codes={codes}")
+        summary = await asyncio.to_thread(queue.summary)
+        logging.info(f"完成. 统计: {json.dumps(summary, ensure_ascii=False)}")
+    finally:
+        queue.close()
+
+
+async def worker_main(args: RunConfig):
+    """
+    分片抓取的 worker: 从共享任务队列领取分片, 按常规流程抓取、解析与保存,
+    将统计与失败的文章报告回队列; 所有分片完成后退出
+    """
+    setup_logging(args.log_file)
+    path = work_queue_path(args)
+    if not os.path.exists(path):
+        logging.error(f"main: 任务队列 {path} 不存在, 请先运行 --mode coordinator")
+        return
+    if not check_shard_sinks(args):
+        return
+
+    worker = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    if args.archive_path:
+        # 多个进程不能追加写同一个压缩归档, 每个 worker 使用单独的归档文件
+        root, ext = os.path.splitext(args.archive_path)
+        if root.endswith(".jsonl"):
+            root, inner = os.path.splitext(root)
+            ext = inner + ext
+        args = replace(args, archive_path=f"{root}.{worker}{ext}")
+    queue = PaiWorkQueue(path, lease_seconds=args.shard_lease)
+    logging.info(f"main: worker {worker} 启动, 任务队列 {path}")
+
+    async def keep_lease(shard):
+        while True:
+            await asyncio.sleep(args.shard_lease / 3)
+            if not await asyncio.to_thread(queue.renew, shard, worker):
+                logging.warning(f"main: 分片 {shard.id} 的租约已被其他 worker 接管")
+
+    async def process_shards(pipeline: PaiCrawlPipeline) -> dict:
+        while True:
+            shard = await asyncio.to_thread(queue.claim, worker)
+            if shard is None:
+                expiry = await asyncio.to_thread(queue.next_lease_expiry)
+                if expiry is None:
+                    return pipeline.stats
+                # 其他 worker 仍在处理, 等待其完成或租约过期后接管
+                await asyncio.sleep(min(2.0, max(0.5, expiry - time.time())))
                 continue
-            success, failed = save_result
-            img_success += success
-            img_failed += failed
-        return (len(apps), img_success, img_failed, ok)
+
+            logging.info(f"main: 领取分片 {shard.id}, {len(shard.articles)} 篇文章")
+            before = {k: v for k, v in pipeline.stats.items() if isinstance(v, int)}
+            renewer = asyncio.create_task(keep_lease(shard))
+            try:
+                await pipeline.run_jobs(shard.articles)
+            finally:
+                renewer.cancel()
+            result = {k: pipeline.stats[k] - v for k, v in before.items()}
+            owned = await asyncio.to_thread(
+                queue.complete,
+                shard,
+                worker,
+                result,
+                set(pipeline.failed_article_ids),
+            )
+            if not owned:
+                logging.warning(
+                    f"main: 分片 {shard.id} 已由其他 worker 接管, 本次结果不记录"
+                )
+
+    try:
+        await run_pipeline(args, process_shards)
+    finally:
+        queue.close()
+
+
+async def reparse_main(args: RunConfig):
+    """
+    从原始响应归档离线重新生成输出目录, 不发出任何网络请求
+    """
+    setup_logging(args.log_file)
+
+    if not args.archive_path or not os.path.exists(args.archive_path):
+        logging.error(f"main: 归档文件 {args.archive_path} 不存在")
+        return
+
+    logging.info(f"main: 从归档 {args.archive_path} 重新生成 {args.output_dir}")
+    archive = PaiRawArchive(args.archive_path)
+    metrics = PaiMetrics()
+    article_timings = create_article_timings(args)
+    writer = PaiFileWriter(
+        fsync=args.fsync, batch_size=args.write_batch_size, metrics=metrics
+    )
+    manifest = PaiCrawlManifest(args.output_dir) if args.use_manifest else None
+    image_store = PaiImageStore(args.output_dir) if args.image_store else None
+    image_optimizer, image_executor = create_image_optimizer(args)
+    app_index = create_app_index(args)
+    # 没有 fetcher, 图片只能从图片存储中链接
+    saver = PaiAppSaver(
+        output_dir=args.output_dir,
+        manifest=manifest,
+        image_store=image_store,
+        metrics=metrics,
+        writer=writer,
+        sinks=create_sinks(args, writer, manifest),
+        image_optimizer=image_optimizer,
+        app_index=app_index,
+    )
+    parse_workers = args.parse_workers or os.cpu_count() or 1
+    parse_executor = ProcessPoolExecutor(max_workers=parse_workers)
+    pipeline = PaiCrawlPipeline(
+        fetcher=PaiArticleFetcher(),
+        parser=create_parser(args),
+        saver=saver,
+        article_concurrency=max(args.article_concurrency, parse_workers),
+        image_concurrency=args.image_concurrency,
+        queue_size=args.queue_size,
+        parse_executor=parse_executor,
+        manifest=manifest,
+        metrics=metrics,
+        selectors=create_selectors(args),
+        article_timings=article_timings,
+        record_batch_size=args.sink_batch_size,
+    )
+
+    def iter_details():
+        for record in archive.iter_records("detail"):
+            try:
+                yield json.loads(record.body)["data"]
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                logging.error(f"main: 归档记录无效 key={record.key} error={e}")
+
+    stats = pipeline.stats
+    exporter = start_metrics_export(args, metrics)
+    try:
+        await pipeline.reparse(iter_details())
+    finally:
+        parse_executor.shutdown(cancel_futures=True)
+        if await saver.close():
+            await pipeline.commit_records()
+        await asyncio.to_thread(writer.close)
+        if manifest is not None:
+            manifest.close()
+        if image_store is not None:
+            stats["image_store"] = image_store.stats
+        if image_executor is not None:
+            image_executor.shutdown(cancel_futures=True)
+            stats["image_optimizer"] = image_optimizer.stats
+        finish_app_index(app_index, stats)
+        await finish_metrics(args, metrics, exporter)
+        finish_article_timings(article_timings)
+
+    logging.info(f"完成. 统计: {json.dumps(stats, ensure_ascii=False)}")
+
+
+async def fetch_images_main(args: RunConfig):
+    """
+    下载文字优先模式中排队的图片, 已到重试时间的图片处理完后退出
+    """
+    setup_logging(args.log_file)
+
+    if not os.path.exists(os.path.join(args.output_dir, PaiImageQueue.FILENAME)):
+        logging.error(f"main: {args.output_dir} 中没有待下载图片队列")
+        return
+
+    metrics = PaiMetrics()
+    writer = PaiFileWriter(
+        fsync=args.fsync, batch_size=args.write_batch_size, metrics=metrics
+    )
+    fetcher = create_fetcher(args, metrics)
+    image_store = PaiImageStore(args.output_dir) if args.image_store else None
+    image_optimizer, image_executor = create_image_optimizer(args)
+    image_queue = create_image_queue(args)
+    saver = PaiAppSaver(
+        output_dir=args.output_dir,
+        image_store=image_store,
+        image_chunk_size=args.image_chunk_kb * 1024,
+        image_max_bytes=args.image_max_mb * 1024 * 1024,
+        fetcher=fetcher,
+        metrics=metrics,
+        writer=writer,
+        sinks=[],
+        image_optimizer=image_optimizer,
+        image_queue=image_queue,
+    )
+
+    stats: dict = {}
+    if args.retry_failed_images:
+        reset = await asyncio.to_thread(image_queue.reset_failed)
+        logging.info(f"main: {reset} 张已放弃的图片重新加入队列")
+    exporter = start_metrics_export(args, metrics)
+    await fetcher.start()
+    try:
+        img_success, img_failed = await saver.process_image_queue(
+            asyncio.Semaphore(args.image_concurrency)
+        )
+        stats["images_succeeded"] = img_success
+        stats["images_failed"] = img_failed
+    finally:
+        await fetcher.close()
+        await asyncio.to_thread(writer.close)
+        if image_store is not None:
+            stats["image_store"] = image_store.stats
+        if image_executor is not None:
+            image_executor.shutdown(cancel_futures=True)
+            stats["image_optimizer"] = image_optimizer.stats
+        finish_image_queue(image_queue, stats)
+        await finish_metrics(args, metrics, exporter)
+
+    logging.info(f"完成. 统计: {json.dumps(stats, ensure_ascii=False)}")
+
+
+async def search_main(args: RunConfig):
+    """
+    查询全文索引, platform / keyword 可用逗号分隔多个值, 日期范围为 start_date ~ end_date
+    """
+    path = search_index_path(args)
+    if not os.path.exists(path):
+        logging.error(f"main: 全文索引 {path} 不存在, 请先抓取或使用 reparse 模式生成")
+        return
+
+    index = PaiSearchIndex(path)
+    try:
+        results = index.search(
+            query=args.query,
+            platforms=[p for p in args.platform.split(",") if p],
+            keywords=[k for k in args.keyword.split(",") if k],
+            start_date=args.start_date,
+            end_date=args.end_date,
+            limit=args.limit,
+        )
+    finally:
+        index.close()
+
+    for r in results:
+        print(
+            f"{r['released_date']}  {r['app_name']}  [{','.join(r['platforms'])}]"
+            f"  {r['article_title']}"
+        )
+        print(f"    {os.path.join(args.output_dir, r['path'])}")
+        if r["snippet"]:
+            print(f"    {' '.join(r['snippet'].split())}")
+    logging.info(f"main: 共找到 {len(results)} 个 app")
+
+
+ENTRYPOINTS = {
+    "crawl": async_main,
+    "watch": watch_main,
+    "coordinator": coordinator_main,
+    "worker": worker_main,
+    "reparse": reparse_main,
+    "fetch-images": fetch_images_main,
+    "search": search_main,
+}
+
+
+async def run(args: RunConfig):
+    """
+    执行所选模式, 开启 profile 时在整个运行期间进行性能分析
+    """
+    setup_logging(args.log_file)
+    if not args.profile:
+        await ENTRYPOINTS[args.mode](args)
+        return
+
+    if args.parse_workers > 0 or args.mode == "reparse":
+        logging.warning("main: 解析在子进程中进行, 性能分析结果不包含解析函数")
+    profiler = PaiProfiler(args.profile_dir, clock=args.profile_clock)
+    profiler.start()
+    try:
+        await ENTRYPOINTS[args.mode](args)
+    finally:
+        profiler.stop()
 
 
 if __name__ == "__main__":
     cfg = argparsing.parse(config_class=RunConfig)
-    asyncio.run(async_main(cfg))
+    if cfg.mode not in ENTRYPOINTS:
+        sys.exit(f"未知运行模式 {cfg.mode}, 可选 {list(ENTRYPOINTS)}")
+    asyncio.run(run(cfg))
@@ -0,0 +1,3 @@
+# /bin/zsh
+source ./venv/bin/activate
+python ./main.py --mode watch
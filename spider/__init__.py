@@ -1,12 +1,58 @@
+from .appindex import PaiAppIndex
+from .archive import PaiRawArchive
+from .cache import PaiResponseCache
 from .data import PaiAppData, PaiAppRawData
 from .fetcher import PaiArticleFetcher
+from .imageopt import PaiImageOptimizer
+from .imagequeue import PaiImageQueue
+from .imagestore import PaiImageStore
+from .limiter import PaiAdaptiveLimiter
+from .manifest import PaiCrawlManifest
+from .metrics import PaiMetrics
 from .parser import PaiAppParser
+from .pipeline import PaiCrawlPipeline
+from .profiling import PaiArticleTimings, PaiProfiler
 from .saver import PaiAppSaver
+from .search import PaiSearchIndex
+from .selector import PaiArticleSelector
+from .sinks import (
+    PaiAppSink,
+    PaiJsonlSink,
+    PaiMarkdownSink,
+    PaiParquetSink,
+    PaiSearchSink,
+    PaiSQLiteSink,
+)
+from .workqueue import PaiShard, PaiWorkQueue
+from .writer import PaiFileWriter
 
 __all__ = [
+    "PaiAdaptiveLimiter",
+    "PaiAppIndex",
     "PaiAppSaver",
+    "PaiAppSink",
+    "PaiMarkdownSink",
+    "PaiSQLiteSink",
+    "PaiJsonlSink",
+    "PaiParquetSink",
+    "PaiSearchSink",
+    "PaiSearchIndex",
+    "PaiFileWriter",
+    "PaiWorkQueue",
+    "PaiShard",
     "PaiArticleFetcher",
     "PaiAppParser",
+    "PaiCrawlManifest",
+    "PaiMetrics",
+    "PaiImageStore",
+    "PaiImageOptimizer",
+    "PaiImageQueue",
+    "PaiCrawlPipeline",
+    "PaiArticleSelector",
+    "PaiProfiler",
+    "PaiArticleTimings",
     "PaiAppData",
     "PaiAppRawData",
+    "PaiRawArchive",
+    "PaiResponseCache",
 ]
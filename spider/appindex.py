@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from .data import PaiAppData
+
+
+class PaiAppIndex:
+    """
+    跨文章的 app 索引, 以 SQLite 保存在输出目录中
+    以规范化的 app 名称与正文指纹识别同一个 app, 记录其首次保存的 markdown 文件,
+    之后的文章再次出现同一 app 时跳过, 或只写入指向首次保存文件的引用 (alias)
+    """
+
+    FILENAME = ".app_index.sqlite3"
+    ACTIONS = ("alias", "skip")
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS apps (
+        app_key TEXT NOT NULL,
+        fingerprint TEXT NOT NULL,
+        path TEXT NOT NULL,
+        article_id INTEGER NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (app_key, fingerprint)
+    );
+    """
+
+    def __init__(self, output_dir: str, action: str = "alias"):
+        if action not in self.ACTIONS:
+            raise ValueError(f"不支持的重复 app 处理方式 {action}, 可选 {self.ACTIONS}")
+        self.output_dir = output_dir
+        self.action = action
+        self.path = os.path.join(output_dir, self.FILENAME)
+        self.stats = {"recorded": 0, "aliased": 0, "skipped": 0}
+        os.makedirs(output_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        # 查询在解析过程中同步进行, 全部条目常驻内存
+        # 正在保存的 app 先占用条目 (_reserved), 保存完成后写入数据库
+        self._reserved: dict[tuple[str, str], tuple[str, int]] = {}
+        self._apps: dict[tuple[str, str], tuple[str, int]] = {
+            (key, fingerprint): (path, article_id)
+            for key, fingerprint, path, article_id in self._conn.execute(
+                "SELECT app_key, fingerprint, path, article_id FROM apps"
+            )
+        }
+
+    @staticmethod
+    def app_key(app_name: str) -> str:
+        """
+        规范化 app 名称: 全半角统一、忽略大小写与空白
+        """
+        return "".join(unicodedata.normalize("NFKC", app_name).casefold().split())
+
+    def _entry(
+        self, app_data: PaiAppData, filepath: str
+    ) -> tuple[tuple[str, str], tuple[str, int]] | None:
+        if app_data.frontmatter is None or not app_data.fingerprint:
+            return None
+        key = (self.app_key(app_data.frontmatter.app_name), app_data.fingerprint)
+        return key, (os.path.relpath(filepath, self.output_dir), app_data.article.id)
+
+    def canonical(self, app_name: str, fingerprint: str, article_id: int) -> str | None:
+        """
+        其他文章中已保存过或正在保存的同一 app 的文件路径 (相对输出目录),
+        文件已被删除时视为未保存
+        """
+        with self._lock:
+            return self._lookup((self.app_key(app_name), fingerprint), article_id)
+
+    def _lookup(self, key: tuple[str, str], article_id: int) -> str | None:
+        reserved = self._reserved.get(key)
+        if reserved is not None and reserved[1] != article_id:
+            return reserved[0]
+        entry = self._apps.get(key)
+        if entry is None:
+            return None
+        path, canonical_article_id = entry
+        if canonical_article_id == article_id:
+            return None
+        if not os.path.exists(os.path.join(self.output_dir, path)):
+            return None
+        return path
+
+    def reserve(self, app_data: PaiAppData, filepath: str) -> str | None:
+        """
+        app 在其他文章中已保存或正在保存时返回其文件路径,
+        否则占用索引条目, 由 record 在保存完成后写入或由 release 释放
+        """
+        entry = self._entry(app_data, filepath)
+        if entry is None:
+            return None
+        key, value = entry
+        with self._lock:
+            path = self._lookup(key, value[1])
+            if path is None:
+                self._reserved.setdefault(key, value)
+        return path
+
+    def release(self, app_data: PaiAppData, filepath: str):
+        """
+        释放保存失败的 app 占用的索引条目
+        """
+        entry = self._entry(app_data, filepath)
+        if entry is None:
+            return
+        key, value = entry
+        with self._lock:
+            if self._reserved.get(key) == value:
+                del self._reserved[key]
+
+    def record(self, app_data: PaiAppData, filepath: str):
+        """
+        记录已完整保存的 app, 同一 app 已有有效记录时保留原记录
+        """
+        entry = self._entry(app_data, filepath)
+        if entry is None:
+            return
+        key, (path, article_id) = entry
+        with self._lock:
+            if self._reserved.get(key) == (path, article_id):
+                del self._reserved[key]
+            if self._apps.get(key) == (path, article_id):
+                return
+            if self._lookup(key, article_id) is not None:
+                return
+            self._insert(key, path, article_id)
+        self.stats["recorded"] += 1
+
+    def _insert(self, key: tuple[str, str], path: str, article_id: int):
+        with self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO apps (app_key, fingerprint, path, article_id, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (app_key, fingerprint) DO UPDATE SET
+                    path = excluded.path,
+                    article_id = excluded.article_id,
+                    updated_at = excluded.updated_at
+                """,
+                (*key, path, article_id, time.time()),
+            )
+        self._apps[key] = (path, article_id)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,136 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterator
+
+
+@dataclass
+class PaiArchiveRecord:
+    kind: str
+    key: str
+    url: str
+    params: dict[str, str | int]
+    time: float
+    body: str
+
+
+class PaiRawArchive:
+    """
+    只追加的原始响应归档, 保存文章列表与文章详情接口返回的原始内容
+    每条记录单独压缩为一帧 (gzip member 或 zstd frame) 追加到数据文件,
+    并在 .idx 索引文件中记录其偏移和长度, 可按 key 随机读取
+    数据文件以 .zst 结尾时使用 zstd 压缩 (需安装 zstandard), 否则使用 gzip
+    """
+
+    INDEX_SUFFIX = ".idx"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = f"{path}{self.INDEX_SUFFIX}"
+        archive_dir = os.path.dirname(path)
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+
+        self._compress, self._decompress = self._load_codec(path)
+        self._lock = threading.Lock()
+        # (kind, key) -> (offset, length), 同一 key 只保留最新一条
+        self._index: dict[tuple[str, str], tuple[int, int]] = self._load_index()
+
+    @staticmethod
+    def _load_codec(path: str):
+        if not path.endswith(".zst"):
+            return gzip.compress, gzip.decompress
+        try:
+            import zstandard
+        except ImportError as e:
+            raise RuntimeError("使用 .zst 归档需要安装 zstandard") from e
+        return (
+            zstandard.ZstdCompressor().compress,
+            zstandard.ZstdDecompressor().decompress,
+        )
+
+    def _load_index(self) -> dict[tuple[str, str], tuple[int, int]]:
+        index: dict[tuple[str, str], tuple[int, int]] = {}
+        if not os.path.exists(self.index_path):
+            return index
+        data_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        with open(self.index_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                # 数据未完整写入的记录直接忽略
+                if entry["offset"] + entry["length"] > data_size:
+                    continue
+                index[(entry["kind"], entry["key"])] = (
+                    entry["offset"],
+                    entry["length"],
+                )
+        return index
+
+    def has(self, kind: str, key: str) -> bool:
+        return (kind, key) in self._index
+
+    def append(
+        self,
+        kind: str,
+        key: str,
+        url: str,
+        params: dict[str, str | int],
+        body: str,
+    ) -> None:
+        record = {
+            "kind": kind,
+            "key": key,
+            "url": url,
+            "params": params,
+            "time": time.time(),
+            "body": body,
+        }
+        frame = self._compress(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            with open(self.path, "ab") as f:
+                offset = f.tell()
+                f.write(frame)
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                entry = {
+                    "kind": kind,
+                    "key": key,
+                    "offset": offset,
+                    "length": len(frame),
+                }
+                f.write(json.dumps(entry) + "\n")
+            self._index[(kind, key)] = (offset, len(frame))
+
+    def _read_frame(self, f, offset: int, length: int) -> PaiArchiveRecord:
+        f.seek(offset)
+        record = json.loads(self._decompress(f.read(length)))
+        return PaiArchiveRecord(**record)
+
+    def get(self, kind: str, key: str) -> PaiArchiveRecord | None:
+        location = self._index.get((kind, key))
+        if location is None:
+            return None
+        with open(self.path, "rb") as f:
+            return self._read_frame(f, *location)
+
+    def iter_records(self, kind: str) -> Iterator[PaiArchiveRecord]:
+        """
+        按写入顺序遍历某类记录, 每个 key 只返回最新一条
+        """
+        locations = sorted(
+            location for (k, _), location in self._index.items() if k == kind
+        )
+        if not locations:
+            return
+        with open(self.path, "rb") as f:
+            for offset, length in locations:
+                try:
+                    yield self._read_frame(f, offset, length)
+                except (OSError, EOFError, ValueError) as e:
+                    logging.error(f"Archive: 读取记录失败 offset={offset} error={e}")
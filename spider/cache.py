@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+
+@dataclass
+class PaiCachedResponse:
+    body: str
+    etag: str | None
+    last_modified: str | None
+    fetched_at: float
+
+    def is_fresh(self, ttl: int) -> bool:
+        return ttl > 0 and time.time() - self.fetched_at < ttl
+
+
+class PaiResponseCache:
+    """
+    基于 SQLite 的接口响应缓存, 以 url + params 为键
+    保存响应体及 ETag / Last-Modified, 过期后使用条件请求重新验证
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS responses (
+        key TEXT PRIMARY KEY,
+        body TEXT NOT NULL,
+        etag TEXT,
+        last_modified TEXT,
+        fetched_at REAL NOT NULL,
+        accessed_at REAL NOT NULL,
+        size INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at);
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: int = 7 * 24 * 3600,
+        max_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "evicted": 0}
+
+        cache_dir = os.path.dirname(path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+
+    @staticmethod
+    def make_key(url: str, params: dict[str, str | int]) -> str:
+        raw = json.dumps([url, sorted((k, str(v)) for k, v in params.items())])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> PaiCachedResponse | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        return PaiCachedResponse(
+            body=row[0], etag=row[1], last_modified=row[2], fetched_at=row[3]
+        )
+
+    def put(
+        self, key: str, body: str, etag: str | None, last_modified: str | None
+    ) -> None:
+        now = time.time()
+        size = len(body.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, body, etag, last_modified, now, now, size),
+            )
+            self._conn.commit()
+            self._evict()
+
+    def touch(self, key: str) -> None:
+        """
+        304 重新验证成功, 刷新缓存时间
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now, key),
+            )
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """
+        缓存总体积超出上限时, 按最近访问时间淘汰至上限的 90%
+        """
+        if self.max_bytes <= 0:
+            return
+        (total,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at"
+        ).fetchall():
+            if total <= target:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self._conn.commit()
+        self.stats["evicted"] += evicted
+        logging.info(f"Cache: 缓存超出上限, 淘汰 {evicted} 条响应")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,4 +1,5 @@
-from dataclasses import asdict, dataclass
+import io
+from dataclasses import asdict, dataclass, field
 from typing import Any
 
 import yaml
@@ -23,13 +24,61 @@ class PaiArticleData:
     released_date: str
 
 
-@dataclass
-class PaiAppData:
-    article: PaiArticleData
-    file_title: str
-    platforms: list[str]
-    content: str
-    img_list: list[str]
+# 与 yaml.safe_dump 默认参数一致的行宽与类型解析
+_YAML_WIDTH = 80
+_YAML_STR_TAG = "tag:yaml.org,2002:str"
+_YAML_RESOLVER = yaml.resolver.Resolver()
+_YAML_ANALYZER = yaml.emitter.Emitter(io.StringIO(), allow_unicode=True)
+
+
+def _yaml_scalar(value: Any) -> str | None:
+    """
+    按 PyYAML 的规则选择 plain 或单引号风格, 需要双引号或多行的值返回 None
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None
+    if isinstance(value, int):
+        return str(value)
+    analysis = _YAML_ANALYZER.analyze_scalar(value)
+    if analysis.multiline:
+        return None
+    plain = _YAML_RESOLVER.resolve(yaml.ScalarNode, value, (True, False))
+    if plain == _YAML_STR_TAG and analysis.allow_block_plain:
+        return value
+    if analysis.allow_single_quoted:
+        return "'" + value.replace("'", "''") + "'"
+    return None
+
+
+def dump_yaml_mapping(data: dict[str, Any]) -> str | None:
+    """
+    快速输出只含字符串、整数及其列表的 mapping, 结果与
+    yaml.safe_dump(data, sort_keys=False, allow_unicode=True).rstrip() 一致;
+    可能触发折行或需要其他风格时返回 None, 由调用方回退到 yaml.safe_dump
+    """
+    lines: list[str] = []
+    for key, value in data.items():
+        if _yaml_scalar(key) != key:
+            return None
+        if isinstance(value, list):
+            if not value:
+                lines.append(f"{key}: []")
+                continue
+            lines.append(f"{key}:")
+            for item in value:
+                text = _yaml_scalar(item)
+                if text is None:
+                    return None
+                lines.append(f"- {text}")
+            continue
+        text = _yaml_scalar(value)
+        if text is None:
+            return None
+        lines.append(f"{key}: {text}")
+    if any(len(line) > _YAML_WIDTH for line in lines):
+        return None
+    # 与 rstrip() 后的 safe_dump 输出一致, 末尾值结尾的 unicode 空白 (如 NBSP) 同样去掉
+    return "\n".join(lines).rstrip()
 
 
 @dataclass
@@ -43,16 +92,43 @@ class PaiAppMdFrontmatter:
     article_id: int
     article_url: str
     released_time: str
+    # 重复出现的 app 指向首次保存的 markdown 文件 (相对输出目录)
+    alias_of: str | None = None
+    # 平台、关键词以外的字段规则提取的元数据, 按规则顺序写在固定字段之后
+    extra: dict[str, list[str]] = field(default_factory=dict)
 
     def __yaml__(self) -> str:
-        return yaml.safe_dump(
-            {k: v for k, v in asdict(self).items() if v is not None},
-            sort_keys=False,
-            allow_unicode=True,
-        ).rstrip()
+        data = {
+            k: v
+            for k, v in asdict(self).items()
+            if v is not None and k != "extra"
+        }
+        data.update(self.extra)
+        fast = dump_yaml_mapping(data)
+        if fast is not None:
+            return fast
+        return yaml.safe_dump(data, sort_keys=False, allow_unicode=True).rstrip()
 
     def __frontmatter__(self) -> str:
         return f"---\n{self.__yaml__()}\n---"
 
     def __str__(self) -> str:
         return self.__frontmatter__()
+
+
+@dataclass
+class PaiAppData:
+    article: PaiArticleData
+    file_title: str
+    platforms: list[str]
+    content: str
+    img_list: list[str]
+    frontmatter: PaiAppMdFrontmatter | None = None
+    # app 正文 html 的指纹, 与 app 名称一起识别在其他文章中重复出现的 app
+    fingerprint: str = ""
+    alias_of: str | None = None
+    # 所属选择器的输出子目录, 空字符串表示直接保存在输出目录下
+    subdir: str = ""
+    # 图片链接到 images/ 下实际保存的文件名, 由 saver 写入输出目标前设置,
+    # 不在其中的图片使用 image_filename 的结果
+    image_names: dict[str, str] = field(default_factory=dict)
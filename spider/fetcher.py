@@ -1,10 +1,17 @@
 import asyncio
 import json
 import logging
+import os
+from contextlib import AbstractAsyncContextManager, nullcontext
 
 import aiohttp
 
+from .archive import PaiRawArchive
+from .cache import PaiCachedResponse, PaiResponseCache
 from .data import JSONObjdctType
+from .limiter import PaiAdaptiveLimiter
+from .metrics import PaiMetrics
+from .util import download_image_async, parse_retry_after
 
 
 class PaiArticleFetcher:
@@ -22,32 +29,144 @@ class PaiArticleFetcher:
         request_timeout: int = 15,
         max_retries: int = 3,
         retry_base_delay: float = 0.5,
+        cache: PaiResponseCache | None = None,
+        limiter: PaiAdaptiveLimiter | None = None,
+        archive: PaiRawArchive | None = None,
+        image_timeout: int = 30,
+        connection_limit: int = 64,
+        connection_limit_per_host: int = 16,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: int = 30,
+        metrics: PaiMetrics | None = None,
     ):
         self.request_timeout = request_timeout
         self.max_retries = max_retries
         self.retry_base_delay = retry_base_delay
+        self.cache = cache
+        self.limiter = limiter
+        self.archive = archive
+        self.image_timeout = image_timeout
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.metrics = metrics if metrics is not None else PaiMetrics()
         self.session: aiohttp.ClientSession | None = None
 
     async def start(self):
-        timeout = aiohttp.ClientTimeout(total=self.request_timeout)
-        self.session = aiohttp.ClientSession(headers=self.HEADERS, timeout=timeout)
+        """
+        创建接口与图片请求共用的会话, 复用同一连接池
+        """
+        connector = aiohttp.TCPConnector(
+            limit=self.connection_limit,
+            limit_per_host=self.connection_limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=self.request_timeout, sock_connect=self.request_timeout
+        )
+        self.session = aiohttp.ClientSession(
+            headers=self.HEADERS, timeout=timeout, connector=connector
+        )
 
     async def close(self):
         if self.session is not None and not self.session.closed:
             await self.session.close()
 
+    def track_request(self, measure_latency: bool = True) -> AbstractAsyncContextManager:
+        """
+        所有请求都经由自适应限流器, 未启用时不做限制
+        """
+        if self.limiter is None:
+            return nullcontext()
+        return self.limiter.track(measure_latency)
+
+    async def _retry_sleep(self, retry_count: int, retry_after: float | None):
+        """
+        指数退避, 服务端给出 Retry-After 时至少等待该时长
+        """
+        delay = self.retry_base_delay * (2**retry_count)
+        await asyncio.sleep(max(delay, retry_after or 0))
+
+    async def _archive_body(
+        self,
+        archive_key: tuple[str, str] | None,
+        url: str,
+        params: dict[str, str | int],
+        body: str,
+        from_network: bool,
+    ):
+        """
+        归档原始响应, 来自缓存的响应仅在归档中没有时写入
+        """
+        if self.archive is None or archive_key is None:
+            return
+        kind, key = archive_key
+        if not from_network and self.archive.has(kind, key):
+            return
+        await asyncio.to_thread(self.archive.append, kind, key, url, params, body)
+
     async def _request_json(
-        self, url: str, params: dict[str, str | int], context: str
+        self,
+        url: str,
+        params: dict[str, str | int],
+        context: str,
+        stage: str,
+        cacheable: bool = False,
+        archive_key: tuple[str, str] | None = None,
     ) -> JSONObjdctType | None:
         if self.session is None:
             raise RuntimeError("Fetcher session 未初始化，请先调用 start()")
 
+        cache_key: str | None = None
+        cached: PaiCachedResponse | None = None
+        headers: dict[str, str] = {}
+        if cacheable and self.cache is not None:
+            cache_key = self.cache.make_key(url, params)
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                if cached.is_fresh(self.cache.ttl):
+                    self.cache.stats["hits"] += 1
+                    await self._archive_body(
+                        archive_key, url, params, cached.body, from_network=False
+                    )
+                    return json.loads(cached.body)
+                if cached.etag:
+                    headers["If-None-Match"] = cached.etag
+                if cached.last_modified:
+                    headers["If-Modified-Since"] = cached.last_modified
+
         for retry_count in range(self.max_retries):
+            retry_after = None
             try:
-                async with self.session.get(url, params=params) as response:
+                async with self.track_request(), self.session.get(
+                    url, params=params, headers=headers
+                ) as response:
+                    if response.status == 304 and cached is not None:
+                        await asyncio.to_thread(self.cache.touch, cache_key)
+                        self.cache.stats["revalidated"] += 1
+                        await self._archive_body(
+                            archive_key, url, params, cached.body, from_network=False
+                        )
+                        return json.loads(cached.body)
                     response.raise_for_status()
                     body = await response.text()
-                    return json.loads(body)
+                    self.metrics.add_bytes(stage, len(body.encode("utf-8")))
+                    data = json.loads(body)
+                    if data.get("error") == 0:
+                        await self._archive_body(
+                            archive_key, url, params, body, from_network=True
+                        )
+                    if cache_key is not None and data.get("error") == 0:
+                        await asyncio.to_thread(
+                            self.cache.put,
+                            cache_key,
+                            body,
+                            response.headers.get("ETag"),
+                            response.headers.get("Last-Modified"),
+                        )
+                    return data
             except asyncio.TimeoutError:
                 logging.warning(
                     f"Fetcher: 请求超时 context={context} retry_count={retry_count + 1}"
@@ -56,17 +175,34 @@ class PaiArticleFetcher:
                 logging.error(
                     f"Fetcher: HTTP错误 context={context} status={e.status} retry_count={retry_count + 1}"
                 )
+                if e.headers is not None:
+                    retry_after = parse_retry_after(e.headers.get("Retry-After"))
             except (aiohttp.ClientError, json.JSONDecodeError) as e:
                 logging.error(
                     f"Fetcher: 请求/解析错误 context={context} error={e} retry_count={retry_count + 1}"
                 )
 
             if retry_count < self.max_retries - 1:
-                await asyncio.sleep(self.retry_base_delay * (2**retry_count))
+                self.metrics.add_retry(stage)
+                await self._retry_sleep(retry_count, retry_after)
 
+        if cached is not None:
+            logging.warning(f"Fetcher: 请求失败, 使用过期缓存 context={context}")
+            return json.loads(cached.body)
         return None
 
-    async def fetch_feed_articles(self, limit=20, offset=0) -> list[JSONObjdctType]:
+    async def fetch_feed_articles(
+        self, limit=20, offset=0, archive: bool = True
+    ) -> list[JSONObjdctType]:
+        articles = await self._fetch_feed_page(limit, offset, archive)
+        return articles if articles is not None else []
+
+    async def _fetch_feed_page(
+        self, limit: int, offset: int, archive: bool
+    ) -> list[JSONObjdctType] | None:
+        """
+        请求一页文章列表, 重试后仍失败或服务返回错误时返回 None
+        """
         url = f"{self.BASE_URL}/article/index/page/get"
         params = {
             "limit": limit,
@@ -75,29 +211,48 @@ class PaiArticleFetcher:
         }
 
         logging.info(f"Fetcher: 抓取文章列表, offset={offset} limit={limit}")
-        data = await self._request_json(
-            url=url,
-            params=params,
-            context=f"feed offset={offset}",
-        )
+        with self.metrics.timer("feed"):
+            data = await self._request_json(
+                url=url,
+                params=params,
+                context=f"feed offset={offset}",
+                stage="feed",
+                archive_key=("feed", f"{offset}:{limit}") if archive else None,
+            )
         if data is None:
-            return []
+            return None
         if data.get("error") == 0:
             return data.get("data", [])
 
         logging.error(
             f"Fetcher: 服务返回错误 context=feed offset={offset} error={data.get('error')}"
         )
-        return []
+        return None
+
+    async def fetch_feed_released_time(self, offset: int) -> int | None:
+        """
+        探测列表中 offset 处文章的发布时间, 超出列表末尾时返回 None
+        探测结果不写入原始响应归档; 请求失败时抛出 RuntimeError, 不能当作列表末尾
+        """
+        articles = await self._fetch_feed_page(limit=1, offset=offset, archive=False)
+        if articles is None:
+            raise RuntimeError(f"探测文章列表失败 offset={offset}")
+        if not articles:
+            return None
+        return int(articles[0].get("released_time", 0))
 
     async def fetch_article_detail(self, article_id: int) -> JSONObjdctType | None:
         url = f"{self.BASE_URL}/article/info/get"
         params = {"id": article_id, "view": "second"}
-        data = await self._request_json(
-            url=url,
-            params=params,
-            context=f"detail article_id={article_id}",
-        )
+        with self.metrics.timer("detail"):
+            data = await self._request_json(
+                url=url,
+                params=params,
+                context=f"detail article_id={article_id}",
+                stage="detail",
+                cacheable=True,
+                archive_key=("detail", str(article_id)),
+            )
         if data is None:
             return None
         if data.get("error") == 0:
@@ -107,3 +262,50 @@ class PaiArticleFetcher:
             f"Fetcher: 服务返回错误 context=detail article_id={article_id} error={data.get('error')}"
         )
         return None
+
+    async def download_image(
+        self,
+        url: str,
+        path: str,
+        chunk_size: int = 64 * 1024,
+        max_bytes: int = 50 * 1024 * 1024,
+    ) -> str:
+        """
+        流式下载图片到 path 并返回内容 sha256, 与接口请求共用连接池和重试策略
+        """
+        if self.session is None:
+            raise RuntimeError("Fetcher session 未初始化，请先调用 start()")
+
+        timeout = aiohttp.ClientTimeout(
+            total=self.image_timeout, sock_connect=self.request_timeout
+        )
+        last_error: Exception | None = None
+        for retry_count in range(self.max_retries):
+            retry_after = None
+            try:
+                with self.metrics.timer("image"):
+                    # 图片耗时主要取决于大小, 只以错误和超时作为退避信号
+                    async with self.track_request(measure_latency=False):
+                        digest = await download_image_async(
+                            session=self.session,
+                            url=url,
+                            path=path,
+                            timeout=timeout,
+                            chunk_size=chunk_size,
+                            max_bytes=max_bytes,
+                        )
+                self.metrics.add_bytes("image", os.path.getsize(path))
+                return digest
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                last_error = e
+                if isinstance(e, aiohttp.ClientResponseError) and e.headers is not None:
+                    retry_after = parse_retry_after(e.headers.get("Retry-After"))
+                logging.warning(
+                    f"Fetcher: 图片下载失败 url={url} error={e!r} retry_count={retry_count + 1}"
+                )
+
+            if retry_count < self.max_retries - 1:
+                self.metrics.add_retry("image")
+                await self._retry_sleep(retry_count, retry_after)
+
+        raise last_error or RuntimeError(f"图片下载失败: {url}")
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import os
+import shutil
+import uuid
+from concurrent.futures import Executor
+
+
+def _save_image(image, path: str, fmt: str, quality: int):
+    """
+    先写临时文件再替换, 动图在目标格式支持时保留全部帧
+    """
+    params: dict = {"optimize": True}
+    if fmt in ("jpeg", "webp"):
+        params["quality"] = quality
+    if getattr(image, "is_animated", False) and fmt in ("webp", "gif", "png"):
+        params["save_all"] = True
+    if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    elif fmt in ("webp", "png") and image.mode == "P":
+        image = image.convert("RGBA")
+
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        image.save(tmp_path, format=fmt.upper(), **params)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def optimize_image_file(
+    src: str,
+    dst: str,
+    thumb_dst: str | None,
+    max_dimension: int,
+    thumbnail_size: int,
+    fmt: str,
+    quality: int,
+) -> tuple[int, int]:
+    """
+    在进程池中执行: 缩放并重新编码图片, 可选生成缩略图, 返回 (原始字节数, 输出字节数)
+    fmt 为空时保持原格式; 同格式重新编码后反而变大时保留原图; 动图不缩放以保留全部帧
+    """
+    from PIL import Image
+
+    src_size = os.path.getsize(src)
+    with Image.open(src) as image:
+        target_fmt = fmt or (image.format or "png").lower()
+        resized = image
+        animated = getattr(image, "is_animated", False)
+        if not animated and max_dimension > 0 and max(image.size) > max_dimension:
+            resized = image.copy()
+            resized.thumbnail((max_dimension, max_dimension))
+        _save_image(resized, dst, target_fmt, quality)
+
+        if thumb_dst is not None:
+            thumb = image.copy()
+            thumb.thumbnail((thumbnail_size, thumbnail_size))
+            _save_image(thumb, thumb_dst, target_fmt, quality)
+
+    if not fmt and os.path.getsize(dst) >= src_size and resized is image:
+        tmp_path = f"{dst}.{uuid.uuid4().hex[:8]}.tmp"
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    return src_size, os.path.getsize(dst)
+
+
+class PaiImageOptimizer:
+    """
+    下载后的图片优化: 在进程池中按最大边长缩放、转换格式并生成缩略图 (需安装 Pillow)
+    结果按原图内容哈希与优化参数缓存在 .images/optimized 下, 同一张图片不会重复编码
+    """
+
+    DIRNAME = os.path.join(".images", "optimized")
+    FORMATS = ("", "webp", "jpeg", "png")
+    THUMBS_DIRNAME = "thumbs"
+
+    def __init__(
+        self,
+        output_dir: str,
+        executor: Executor,
+        max_dimension: int = 1600,
+        image_format: str = "",
+        quality: int = 80,
+        thumbnail_size: int = 0,
+    ):
+        if image_format not in self.FORMATS:
+            raise ValueError(f"不支持的图片格式 {image_format}, 可选 {self.FORMATS}")
+        try:
+            import PIL  # noqa: F401
+        except ImportError as e:
+            raise RuntimeError("图片优化需要安装 Pillow") from e
+
+        self.root = os.path.join(output_dir, self.DIRNAME)
+        os.makedirs(self.root, exist_ok=True)
+        self.executor = executor
+        self.max_dimension = max_dimension
+        self.image_format = image_format
+        self.quality = quality
+        self.thumbnail_size = thumbnail_size
+        self.stats = {
+            "optimized": 0,
+            "cached": 0,
+            "failed": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+        }
+        self._inflight: dict[str, asyncio.Task[tuple[str, str | None]]] = {}
+
+    def local_name(self, filename: str) -> str:
+        """
+        优化后图片在日期目录 images/ 下的文件名, 指定了格式时替换扩展名
+        """
+        if not self.image_format:
+            return filename
+        ext = "jpg" if self.image_format == "jpeg" else self.image_format
+        return f"{os.path.splitext(filename)[0]}.{ext}"
+
+    def _variant_paths(self, digest: str, filename: str) -> tuple[str, str | None]:
+        ext = os.path.splitext(self.local_name(filename))[1].lstrip(".") or "img"
+        directory = os.path.join(self.root, digest[:2])
+        variant = f"{self.max_dimension}q{self.quality}"
+        path = os.path.join(directory, f"{digest}-{variant}.{ext}")
+        thumb_path = None
+        if self.thumbnail_size > 0:
+            thumb_path = os.path.join(
+                directory, f"{digest}-thumb{self.thumbnail_size}q{self.quality}.{ext}"
+            )
+        return path, thumb_path
+
+    async def optimize(
+        self, src_path: str, digest: str, filename: str
+    ) -> tuple[str, str | None]:
+        """
+        返回 (优化后图片路径, 缩略图路径), 已缓存时直接返回
+        digest 为原图内容哈希, filename 为原图文件名; 同一张图片的并发请求共享同一次编码
+        """
+        path, thumb_path = self._variant_paths(digest, filename)
+        if os.path.exists(path) and (thumb_path is None or os.path.exists(thumb_path)):
+            self.stats["cached"] += 1
+            return path, thumb_path
+
+        task = self._inflight.get(path)
+        if task is None:
+            task = asyncio.create_task(self._optimize(src_path, path, thumb_path))
+            self._inflight[path] = task
+            task.add_done_callback(lambda _: self._inflight.pop(path, None))
+        else:
+            self.stats["cached"] += 1
+        return await asyncio.shield(task)
+
+    async def _optimize(
+        self, src_path: str, path: str, thumb_path: str | None
+    ) -> tuple[str, str | None]:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        loop = asyncio.get_running_loop()
+        try:
+            bytes_in, bytes_out = await loop.run_in_executor(
+                self.executor,
+                optimize_image_file,
+                src_path,
+                path,
+                thumb_path,
+                self.max_dimension,
+                self.thumbnail_size,
+                self.image_format,
+                self.quality,
+            )
+        except Exception as e:
+            self.stats["failed"] += 1
+            logging.error(f"ImageOptimizer: 图片优化失败 {src_path}: {e!r}")
+            raise
+        self.stats["optimized"] += 1
+        self.stats["bytes_in"] += bytes_in
+        self.stats["bytes_out"] += bytes_out
+        return path, thumb_path
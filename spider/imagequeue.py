@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class PaiImageQueue:
+    """
+    待下载图片队列, 以 SQLite 保存在输出目录中
+    文字优先模式下 markdown 先写入, 图片在后台或之后的 fetch-images 模式中补齐,
+    每张图片的重试次数与下次重试时间都会持久化, 中断后可继续
+    """
+
+    FILENAME = ".pending_images.sqlite3"
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS images (
+        url TEXT NOT NULL,
+        img_dir TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        last_error TEXT,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (url, img_dir)
+    );
+    CREATE INDEX IF NOT EXISTS images_due ON images (status, next_attempt_at);
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        max_attempts: int = 5,
+        retry_base_delay: float = 60,
+    ):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, self.FILENAME)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_delay = retry_base_delay
+        self.stats = {"enqueued": 0, "succeeded": 0, "retried": 0, "gave_up": 0}
+        os.makedirs(output_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def enqueue(self, items: list[tuple[str, str]]):
+        """
+        加入 (图片 url, 相对输出目录的图片目录), 已在队列中等待重试的保留其重试状态,
+        已完成或已放弃的重新开始计数
+        """
+        if not items:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO images (url, img_dir, status, next_attempt_at, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (url, img_dir) DO UPDATE SET
+                    status = excluded.status,
+                    attempts = 0,
+                    next_attempt_at = excluded.next_attempt_at,
+                    last_error = NULL,
+                    updated_at = excluded.updated_at
+                WHERE images.status != excluded.status
+                """,
+                [(url, img_dir, self.PENDING, now, now) for url, img_dir in items],
+            )
+        self.stats["enqueued"] += len(items)
+
+    def due(self, limit: int) -> list[tuple[str, str]]:
+        """
+        已到重试时间的图片, 按到期先后排序
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, img_dir FROM images"
+                " WHERE status = ? AND next_attempt_at <= ?"
+                " ORDER BY next_attempt_at LIMIT ?",
+                (self.PENDING, time.time(), limit),
+            ).fetchall()
+        return [(url, img_dir) for url, img_dir in rows]
+
+    def next_attempt_at(self) -> float | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT min(next_attempt_at) FROM images WHERE status = ?",
+                (self.PENDING,),
+            ).fetchone()
+        return row[0]
+
+    def mark_done(self, url: str, img_dir: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE images SET status = ?, last_error = NULL, updated_at = ?"
+                " WHERE url = ? AND img_dir = ?",
+                (self.DONE, time.time(), url, img_dir),
+            )
+        self.stats["succeeded"] += 1
+
+    def mark_failed(self, url: str, img_dir: str, error: str) -> bool:
+        """
+        记录一次失败, 按指数退避安排下次重试; 达到最大次数后放弃并返回 False
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT attempts FROM images WHERE url = ? AND img_dir = ?",
+                (url, img_dir),
+            ).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            retry = attempts < self.max_attempts
+            self._conn.execute(
+                "UPDATE images SET status = ?, attempts = ?, next_attempt_at = ?,"
+                " last_error = ?, updated_at = ? WHERE url = ? AND img_dir = ?",
+                (
+                    self.PENDING if retry else self.FAILED,
+                    attempts,
+                    now + self.retry_base_delay * 2 ** (attempts - 1),
+                    error,
+                    now,
+                    url,
+                    img_dir,
+                ),
+            )
+        self.stats["retried" if retry else "gave_up"] += 1
+        return retry
+
+    def reset_failed(self) -> int:
+        """
+        已放弃的图片重新开始计数并立即到期, 返回重新入队的数量
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE images SET status = ?, attempts = 0, next_attempt_at = ?,"
+                " updated_at = ? WHERE status = ?",
+                (self.PENDING, now, now, self.FAILED),
+            )
+        return cursor.rowcount
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, count(*) FROM images GROUP BY status"
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
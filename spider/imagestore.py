@@ -0,0 +1,121 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import uuid
+from typing import Awaitable, Callable
+
+from .util import link_or_copy
+
+
+class PaiImageStore:
+    """
+    内容寻址的图片存储: 每张图片按内容哈希在 .images 下只保存一份,
+    各日期目录中的 images/ 以硬链接引用 (不支持硬链接时复制)
+    同一 url 在一次运行中只下载一次, 并发请求共享同一次下载
+    """
+
+    DIRNAME = ".images"
+    INDEX_FILENAME = "index.jsonl"
+
+    def __init__(self, output_dir: str):
+        self.root = os.path.join(output_dir, self.DIRNAME)
+        self.index_path = os.path.join(self.root, self.INDEX_FILENAME)
+        os.makedirs(self.root, exist_ok=True)
+        self.stats = {"downloaded": 0, "reused": 0, "deduplicated": 0}
+
+        self._index_lock = threading.Lock()
+        self._index = self._load_index()
+        self._inflight: dict[str, asyncio.Task[str]] = {}
+
+    def _load_index(self) -> dict[str, str]:
+        """
+        index.jsonl 每行记录一个 url 对应的 blob 相对路径, 后写入的覆盖先写入的
+        """
+        index: dict[str, str] = {}
+        if not os.path.exists(self.index_path):
+            return index
+        with open(self.index_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    index[record["url"]] = record["blob"]
+                except (json.JSONDecodeError, KeyError):
+                    continue
+        return index
+
+    def _append_index(self, url: str, blob: str) -> None:
+        with self._index_lock:
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"url": url, "blob": blob}, ensure_ascii=False))
+                f.write("\n")
+
+    def blob_path(self, digest: str, url: str) -> str:
+        ext = os.path.splitext(url.split("?")[0])[1].lower()
+        if len(ext) > 6 or "/" in ext:
+            ext = ""
+        return os.path.join(self.root, digest[:2], f"{digest}{ext}")
+
+    def lookup(self, url: str) -> str | None:
+        blob = self._index.get(url)
+        if blob is None:
+            return None
+        path = os.path.join(self.root, blob)
+        return path if os.path.exists(path) else None
+
+    async def fetch(
+        self, url: str, download: Callable[[str], Awaitable[str]]
+    ) -> str:
+        """
+        返回 url 对应的 blob 路径, 本地已有时不再下载
+        download 将图片写入给定路径并返回内容 sha256
+        """
+        path = await asyncio.to_thread(self.lookup, url)
+        if path is not None:
+            self.stats["reused"] += 1
+            return path
+
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.create_task(self._download(url, download))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
+        else:
+            self.stats["reused"] += 1
+        # 单个调用方被取消时不影响其他等待同一下载的调用方
+        return await asyncio.shield(task)
+
+    async def _download(
+        self, url: str, download: Callable[[str], Awaitable[str]]
+    ) -> str:
+        staging_path = os.path.join(self.root, f"{uuid.uuid4().hex}.download")
+        digest = await download(staging_path)
+        path = self.blob_path(digest, url)
+        if await asyncio.to_thread(self._commit_blob, staging_path, path):
+            self.stats["downloaded"] += 1
+        else:
+            self.stats["deduplicated"] += 1
+            logging.info(f"ImageStore: 图片内容已存在 {url}")
+
+        blob = os.path.relpath(path, self.root)
+        self._index[url] = blob
+        await asyncio.to_thread(self._append_index, url, blob)
+        return path
+
+    def _commit_blob(self, staging_path: str, path: str) -> bool:
+        """
+        将下载完成的文件移入 blob 路径, 内容已存在时丢弃并返回 False
+        """
+        if os.path.exists(path):
+            os.remove(staging_path)
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(staging_path, path)
+        return True
+
+    def link(self, blob_path: str, local_path: str) -> None:
+        """
+        在日期目录中引用 blob, 优先硬链接
+        """
+        link_or_copy(blob_path, local_path)
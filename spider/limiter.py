@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import aiohttp
+
+from .util import parse_retry_after
+
+
+class PaiAdaptiveLimiter:
+    """
+    AIMD 自适应并发控制, 文章列表、文章详情和图片请求共用
+    请求延迟正常时并发窗口加性增长, 遇到 429/503/超时时乘性减小,
+    并在 Retry-After 指定的时间内暂停发出新请求
+    """
+
+    BACKOFF_STATUS = (429, 503)
+    # 同一批并发请求的失败在该时间内只退避一次
+    BACKOFF_INTERVAL = 1.0
+
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        decrease_factor: float = 0.5,
+        latency_threshold: float = 3.0,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.window = float(min(max(initial, self.min_limit), self.max_limit))
+        self.decrease_factor = decrease_factor
+        self.latency_threshold = latency_threshold
+        self.stats = {
+            "window": self.window,
+            "in_flight": 0,
+            "backoffs": 0,
+            "retry_after_waits": 0,
+        }
+
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_backoff = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            async with self._cond:
+                await self._cond.wait_for(lambda: self._in_flight < int(self.window))
+                if self._paused_until > time.monotonic():
+                    continue
+                self._in_flight += 1
+                self.stats["in_flight"] = self._in_flight
+                return
+
+    async def release(self):
+        async with self._cond:
+            self._in_flight -= 1
+            self.stats["in_flight"] = self._in_flight
+            self._cond.notify_all()
+
+    def on_success(self, latency: float):
+        """
+        延迟正常时每个窗口的请求完成后窗口增加 1
+        """
+        if latency < self.latency_threshold and self.window < self.max_limit:
+            self.window = min(self.max_limit, self.window + 1 / self.window)
+            self.stats["window"] = round(self.window, 2)
+
+    def on_backoff(self, retry_after: float | None = None):
+        """
+        窗口减半, 同一批并发请求的失败只计一次
+        """
+        now = time.monotonic()
+        if retry_after is not None and retry_after > 0:
+            self._paused_until = max(self._paused_until, now + retry_after)
+            self.stats["retry_after_waits"] += 1
+
+        if now - self._last_backoff < self.BACKOFF_INTERVAL:
+            return
+        self._last_backoff = now
+        self.window = max(self.min_limit, self.window * self.decrease_factor)
+        self.stats["window"] = round(self.window, 2)
+        self.stats["backoffs"] += 1
+        logging.warning(f"Limiter: 触发退避, 并发窗口降至 {self.stats['window']}")
+
+    @asynccontextmanager
+    async def track(self, measure_latency: bool = True) -> AsyncIterator[None]:
+        """
+        占用一个并发名额, 并根据请求耗时和结果调整窗口
+        measure_latency 为 False 时 (如大图片下载) 耗时不作为拥塞信号, 成功即视为正常
+        """
+        await self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except aiohttp.ClientResponseError as e:
+            if e.status in self.BACKOFF_STATUS:
+                retry_after = None
+                if e.headers is not None:
+                    retry_after = parse_retry_after(e.headers.get("Retry-After"))
+                self.on_backoff(retry_after)
+            raise
+        except (asyncio.TimeoutError, TimeoutError):
+            self.on_backoff()
+            raise
+        else:
+            self.on_success(time.monotonic() - start if measure_latency else 0.0)
+        finally:
+            await self.release()
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .data import JSONObjdctType
+
+
+class PaiCrawlManifest:
+    """
+    抓取清单, 以 SQLite 保存在输出目录中
+    记录每篇文章的 modify_time / 正文哈希 / 解析配置哈希及其 app 文件, 以及每个文件的内容哈希,
+    重复抓取时据此跳过未变化的文章详情请求、解析与写入; 解析配置变化的文章重新处理
+    """
+
+    FILENAME = ".manifest.sqlite3"
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS articles (
+        id INTEGER PRIMARY KEY,
+        modified_time INTEGER,
+        body_hash TEXT,
+        released_date TEXT,
+        app_files TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        config_hash TEXT
+    );
+    CREATE TABLE IF NOT EXISTS files (
+        path TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        article_id INTEGER,
+        updated_at REAL NOT NULL
+    );
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, self.FILENAME)
+        os.makedirs(output_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(articles)")}
+        if "config_hash" not in columns:
+            # 旧版清单没有解析配置哈希, 其中的文章在下次抓取时重新解析一次
+            self._conn.execute("ALTER TABLE articles ADD COLUMN config_hash TEXT")
+            self._conn.commit()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def hash_article(cls, article_raw: JSONObjdctType) -> str:
+        """
+        文章详情中参与解析的字段的哈希
+        """
+        fields = {
+            k: article_raw.get(k)
+            for k in ("id", "title", "released_time", "body", "body_extends")
+        }
+        return cls.hash_text(json.dumps(fields, sort_keys=True, ensure_ascii=False))
+
+    def _files_exist(self, app_files: str) -> bool:
+        return all(
+            os.path.exists(os.path.join(self.output_dir, path))
+            for path in json.loads(app_files)
+        )
+
+    def is_article_unchanged(
+        self, article_id: int, modified_time: int | None, config_hash: str = ""
+    ) -> bool:
+        """
+        文章列表中的 modify_time 与解析配置都与上次一致, 且上次生成的文件都还在
+        """
+        if modified_time is None:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT modified_time, config_hash, app_files FROM articles WHERE id = ?",
+                (article_id,),
+            ).fetchone()
+        return (
+            row is not None
+            and row[0] == modified_time
+            and row[1] == config_hash
+            and self._files_exist(row[2])
+        )
+
+    def is_body_unchanged(
+        self, article_id: int, body_hash: str, config_hash: str = ""
+    ) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body_hash, config_hash, app_files FROM articles WHERE id = ?",
+                (article_id,),
+            ).fetchone()
+        return (
+            row is not None
+            and row[0] == body_hash
+            and row[1] == config_hash
+            and self._files_exist(row[2])
+        )
+
+    def record_article(
+        self,
+        article_id: int,
+        modified_time: int | None,
+        body_hash: str,
+        released_date: str,
+        app_files: list[str],
+        config_hash: str = "",
+    ) -> None:
+        self.record_articles(
+            [
+                (
+                    article_id,
+                    modified_time,
+                    body_hash,
+                    released_date,
+                    app_files,
+                    config_hash,
+                )
+            ]
+        )
+
+    def record_articles(
+        self, records: list[tuple[int, int | None, str, str, list[str], str]]
+    ) -> None:
+        """
+        在一个事务中记录多篇文章, 每条为 record_article 的参数
+        """
+        now = time.time()
+        rows = [
+            (
+                article_id,
+                modified_time,
+                body_hash,
+                released_date,
+                json.dumps(
+                    [os.path.relpath(p, self.output_dir) for p in app_files],
+                    ensure_ascii=False,
+                ),
+                now,
+                config_hash,
+            )
+            for (
+                article_id,
+                modified_time,
+                body_hash,
+                released_date,
+                app_files,
+                config_hash,
+            ) in records
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO articles (id, modified_time, body_hash,"
+                " released_date, app_files, updated_at, config_hash)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def touch_article(self, article_id: int, modified_time: int | None) -> None:
+        """
+        正文未变化时仅更新 modified_time
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE articles SET modified_time = ?, updated_at = ? WHERE id = ?",
+                (modified_time, time.time(), article_id),
+            )
+            self._conn.commit()
+
+    def is_file_unchanged(self, path: str, content_hash: str) -> bool:
+        rel_path = os.path.relpath(path, self.output_dir)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash FROM files WHERE path = ?", (rel_path,)
+            ).fetchone()
+        return row is not None and row[0] == content_hash and os.path.exists(path)
+
+    def record_file(self, path: str, content_hash: str, article_id: int) -> None:
+        rel_path = os.path.relpath(path, self.output_dir)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                (rel_path, content_hash, article_id, time.time()),
+            )
+            self._conn.commit()
+
+    def latest_released_date(self) -> str | None:
+        with self._lock:
+            (date,) = self._conn.execute(
+                "SELECT MAX(released_date) FROM articles"
+            ).fetchone()
+        return date
+
+    def latest_article_id(self) -> int | None:
+        with self._lock:
+            (article_id,) = self._conn.execute(
+                "SELECT MAX(id) FROM articles"
+            ).fetchone()
+        return article_id
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class PaiStageStats:
+    """
+    单个阶段的延迟直方图、字节数、重试与错误计数
+    """
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.bytes = 0
+        self.retries = 0
+        self.errors = 0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def cumulative_buckets(self) -> list[int]:
+        result, total = [], 0
+        for n in self.bucket_counts:
+            total += n
+            result.append(total)
+        return result
+
+    def quantile(self, q: float) -> float | None:
+        """
+        按直方图估计分位数, 取所在桶的上界 (不超过最大值)
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        for bound, n in zip(self.buckets, self.cumulative_buckets()):
+            if n >= rank:
+                return min(bound, self.max_seconds)
+        return self.max_seconds
+
+
+class PaiMetrics:
+    """
+    各阶段的延迟与吞吐指标: 文章列表、文章详情、解析、markdown 渲染、图片下载、文件写入
+    运行结束时导出 JSON, 长时间运行时可定期写出 Prometheus 文本格式
+    """
+
+    STAGES = ("feed", "detail", "parse", "render", "image", "write")
+    BUCKETS = (
+        0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+    )
+    PREFIX = "paiping"
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.stages = {stage: PaiStageStats(self.BUCKETS) for stage in self.STAGES}
+        # 队列名 -> [当前长度, 最大长度, 采样次数, 长度累计]
+        self.queues: dict[str, list[int]] = {}
+        # 文件写入在 asyncio.to_thread 的线程中记录, 统一加锁
+        self._lock = threading.Lock()
+
+    def stage(self, stage: str) -> PaiStageStats:
+        if stage not in self.stages:
+            self.stages[stage] = PaiStageStats(self.BUCKETS)
+        return self.stages[stage]
+
+    def observe(self, stage: str, seconds: float, nbytes: int = 0):
+        with self._lock:
+            stats = self.stage(stage)
+            stats.observe(seconds)
+            stats.bytes += nbytes
+
+    def add_bytes(self, stage: str, nbytes: int):
+        with self._lock:
+            self.stage(stage).bytes += nbytes
+
+    def add_retry(self, stage: str):
+        with self._lock:
+            self.stage(stage).retries += 1
+
+    def add_error(self, stage: str):
+        with self._lock:
+            self.stage(stage).errors += 1
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """
+        记录代码块耗时, 抛出异常时同时计一次错误
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.add_error(stage)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe_queue(self, name: str, depth: int):
+        with self._lock:
+            current = self.queues.setdefault(name, [0, 0, 0, 0])
+            current[0] = depth
+            current[1] = max(current[1], depth)
+            current[2] += 1
+            current[3] += depth
+
+    def snapshot(self) -> dict:
+        elapsed = time.monotonic() - self.started_at
+        with self._lock:
+            stages = {}
+            for name, s in self.stages.items():
+                p50, p95 = s.quantile(0.5), s.quantile(0.95)
+                stages[name] = {
+                    "count": s.count,
+                    "seconds": round(s.seconds, 4),
+                    "mean_ms": (
+                        round(s.seconds / s.count * 1000, 2) if s.count else None
+                    ),
+                    "p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+                    "p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+                    "max_ms": round(s.max_seconds * 1000, 2),
+                    "per_sec": round(s.count / elapsed, 2) if elapsed else None,
+                    "bytes": s.bytes,
+                    "bytes_per_sec": round(s.bytes / elapsed) if elapsed else None,
+                    "retries": s.retries,
+                    "errors": s.errors,
+                }
+            queues = {
+                name: {
+                    "depth": q[0],
+                    "max_depth": q[1],
+                    "mean_depth": round(q[3] / q[2], 2) if q[2] else 0,
+                }
+                for name, q in self.queues.items()
+            }
+        return {"elapsed": round(elapsed, 3), "stages": stages, "queues": queues}
+
+    def to_prometheus(self) -> str:
+        p = self.PREFIX
+        lines = [
+            f"# HELP {p}_stage_seconds 各阶段耗时",
+            f"# TYPE {p}_stage_seconds histogram",
+        ]
+        with self._lock:
+            for name, s in self.stages.items():
+                bucket = f'{p}_stage_seconds_bucket{{stage="{name}"'
+                for bound, n in zip(s.buckets, s.cumulative_buckets()):
+                    lines.append(f'{bucket},le="{bound}"}} {n}')
+                lines.append(f'{bucket},le="+Inf"}} {s.count}')
+                lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {s.seconds}')
+                lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {s.count}')
+            for metric, attr, help_text in (
+                ("stage_bytes_total", "bytes", "各阶段传输或写入的字节数"),
+                ("stage_retries_total", "retries", "各阶段重试次数"),
+                ("stage_errors_total", "errors", "各阶段错误次数"),
+            ):
+                lines.append(f"# HELP {p}_{metric} {help_text}")
+                lines.append(f"# TYPE {p}_{metric} counter")
+                for name, s in self.stages.items():
+                    lines.append(f'{p}_{metric}{{stage="{name}"}} {getattr(s, attr)}')
+            lines.append(f"# HELP {p}_queue_depth 流水线队列当前长度")
+            lines.append(f"# TYPE {p}_queue_depth gauge")
+            for name, q in self.queues.items():
+                lines.append(f'{p}_queue_depth{{queue="{name}"}} {q[0]}')
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path: str):
+        self._write_atomic(
+            path, json.dumps(self.snapshot(), ensure_ascii=False, indent=2) + "\n"
+        )
+
+    def write_prometheus(self, path: str):
+        self._write_atomic(path, self.to_prometheus())
+
+    def _write_atomic(self, path: str, text: str):
+        """
+        先写临时文件再替换, 避免采集端读到写了一半的文件
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    async def export_periodically(self, path: str, interval: float):
+        """
+        每隔 interval 秒写出一次 Prometheus 文本格式, 直到任务被取消
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.write_prometheus, path)
+            except OSError as e:
+                logging.error(f"Metrics: 写出指标失败 path={path} error={e}")
@@ -1,11 +1,15 @@
+import dataclasses
 import datetime
+import hashlib
 import logging
 import re
-from typing import Iterator
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
 
 from bs4 import BeautifulSoup
-from bs4.element import Tag
-from markdownify import markdownify as md
+from bs4.element import PageElement, Tag
+from markdownify import MarkdownConverter
 
 from .data import (
     JSONObjdctType,
@@ -14,18 +18,155 @@ from .data import (
     PaiAppRawData,
     PaiArticleData,
 )
-from .util import date_format, datetime_format
+from .util import date_format, datetime_format, image_filename
+
+# 所有 app 共用的 markdown 转换器, 每个进程一个
+_MD_CONVERTER = MarkdownConverter(heading_style="ATX")
+
+# (app 名称, 正文指纹, 文章 id) -> 其他文章中已保存的同一 app 的文件路径
+type PaiKnownApps = Callable[[str, str, int], str | None]
+
+
+@dataclass(frozen=True)
+class PaiFieldRule:
+    """
+    app 元数据字段提取规则: 取首个形如 `<li>标签：值1, 值2</li>` 的列表项, 按分隔符切分
+    """
+
+    name: str
+    label: str
+    splitter: str = r"[,，/、]"
+
+
+class _CompiledFieldRule:
+    def __init__(self, rule: PaiFieldRule):
+        self.name = rule.name
+        self.label = rule.label
+        self.pattern = re.compile(rf"{re.escape(rule.label)}[：:]\s*(.*)")
+        self.splitter = re.compile(rule.splitter)
+
+    def extract(self, text: str) -> list[str] | None:
+        if self.label not in text:
+            return None
+        match = self.pattern.search(text)
+        if not match:
+            return None
+        parts = self.splitter.split(match.group(1))
+        return [p.strip() for p in parts if p.strip()]
+
+
+def parse_field_rules(spec: str, sep: str = ",") -> list[PaiFieldRule]:
+    """
+    解析以 sep 分隔的附加字段规则, 每条写为 字段名=标签, 如 price=价格
+    """
+    rules: list[PaiFieldRule] = []
+    for item in (s.strip() for s in spec.split(sep)):
+        if not item:
+            continue
+        name, _, label = (s.strip() for s in item.partition("="))
+        if not name or not label:
+            raise ValueError(f"字段规则 {item} 格式错误, 应为 字段名=标签")
+        rules.append(PaiFieldRule(name=name, label=label))
+    return rules
 
 
 class PaiAppParser:
     SSPAI_ARTICLE_BASE_URL = "https://sspai.com/post"
     SPECIAL_IMAGE_SUFFIX = (".png", ".jpg", ".jpeg", "PNG", ".JPG", ".JPEG")
+    BACKENDS = ("auto", "lxml", "html.parser")
+    # Pattern: <li>平台：iOS</li> or <li>平台：iOS, Android</li>
+    # 平台与关键词为 frontmatter 固定字段, 其他规则的结果写入 frontmatter.extra
+    FIELD_RULES = (
+        PaiFieldRule(name="platforms", label="平台"),
+        PaiFieldRule(name="keywords", label="关键词"),
+    )
+
+    def __init__(
+        self,
+        backend: str = "html.parser",
+        field_rules: Iterable[PaiFieldRule] | None = None,
+    ):
+        self.backend = self._resolve_backend(backend)
+        rules = list(self.FIELD_RULES if field_rules is None else field_rules)
+        reserved = {f.name for f in dataclasses.fields(PaiAppMdFrontmatter)} - {
+            "platforms",
+            "keywords",
+        }
+        names = [rule.name for rule in rules]
+        if len(set(names)) != len(names) or reserved & set(names):
+            raise ValueError(f"字段规则名称重复或与 frontmatter 固定字段冲突 {names}")
+        # 规则在构造时编译一次, 所有字段在一次遍历列表项时同时提取
+        self._field_rules = [_CompiledFieldRule(rule) for rule in rules]
+
+    def fingerprint(self) -> list:
+        """
+        影响解析输出的配置: 解析后端与字段规则, 抓取清单据此判断已处理的文章是否需要重新解析
+        """
+        return [
+            self.backend,
+            [[rule.name, rule.label, rule.splitter.pattern] for rule in self._field_rules],
+        ]
+
+    @classmethod
+    def _resolve_backend(cls, backend: str) -> str:
+        """
+        auto 与 lxml 在安装了 lxml 时使用 lxml, 否则回退到 html.parser
+        lxml 对不规范 html 的修复方式与 html.parser 不同, 输出可能不一致, 因此默认使用 html.parser
+        """
+        if backend not in cls.BACKENDS:
+            raise ValueError(f"不支持的解析后端 {backend}, 可选 {cls.BACKENDS}")
+        if backend == "html.parser":
+            return backend
+        try:
+            import lxml  # noqa: F401
+        except ImportError:
+            if backend == "lxml":
+                logging.warning("Parser: 未安装 lxml, 回退到 html.parser")
+            return "html.parser"
+        return "lxml"
 
-    def parse_apps(self, article_raw: JSONObjdctType | None) -> Iterator[PaiAppData]:
+    def parse_apps(
+        self,
+        article_raw: JSONObjdctType | None,
+        timings: dict[str, float] | None = None,
+        known_apps: PaiKnownApps | None = None,
+    ) -> Iterator[PaiAppData]:
+        """
+        逐个解析 app, 传入 timings ({"parse": 0.0, "render": 0.0}) 时累计
+        解析总耗时 (不含调用方处理 yield 结果的时间) 与其中 markdown 渲染的耗时, 单位为秒
+        known_apps 查到已在其他文章中保存过的 app 不渲染 markdown, 只设置 alias_of
+        """
         if article_raw is None:
             logging.info("文章内容不存在")
             return
 
+        start = time.perf_counter()
+        article_data = self.parse_article(article_raw)
+        for app in self.split_apps(article_raw):
+            app_data = self._finalize_app(app, article_data, timings, known_apps)
+            if timings is not None:
+                timings["parse"] += time.perf_counter() - start
+            yield app_data
+            start = time.perf_counter()
+        if timings is not None:
+            timings["parse"] += time.perf_counter() - start
+
+    def parse_app_list(self, article_raw: JSONObjdctType | None) -> list[PaiAppData]:
+        """
+        一次性解析全部 app, 供进程池调用: 输入纯 JSON, 返回可 pickle 的结果
+        """
+        return list(self.parse_apps(article_raw))
+
+    def parse_app_list_timed(
+        self, article_raw: JSONObjdctType | None
+    ) -> tuple[list[PaiAppData], dict[str, float]]:
+        """
+        同 parse_app_list, 同时返回子进程内的解析与渲染耗时
+        """
+        timings = {"parse": 0.0, "render": 0.0}
+        return list(self.parse_apps(article_raw, timings)), timings
+
+    def parse_article(self, article_raw: JSONObjdctType) -> PaiArticleData:
         date = "1970-01-01"
         time = "1970-01-01 00:00:00"
         if "released_time" in article_raw:
@@ -33,7 +174,7 @@ class PaiAppParser:
             date = date_format(d)
             time = datetime_format(d)
 
-        article_data = PaiArticleData(
+        return PaiArticleData(
             id=article_raw["id"],
             title=article_raw["title"],
             url=f"{self.SSPAI_ARTICLE_BASE_URL}/{article_raw['id']}",
@@ -41,19 +182,23 @@ class PaiAppParser:
             released_date=date,
         )
 
+    def split_apps(self, article_raw: JSONObjdctType) -> Iterator[PaiAppRawData]:
+        """
+        按 app 切分文章正文, 尚未提取元数据和生成 markdown
+        """
         # 新返回格式
         if "body_extends" in article_raw and len(article_raw["body_extends"]) > 2:
-            yield from self._parse_apps_new(article_raw, article_data)
+            yield from self._split_apps_new(article_raw)
             return
 
         html_content: str = article_raw.get("body", "")
-        soup = BeautifulSoup(html_content, "html.parser")
+        soup = BeautifulSoup(html_content, self.backend)
         current_app = None
-        h2_els = soup.find_all("h2")
+        h2_els = soup.find_all("h2", limit=2)
 
         # 新返回格式
         if len(h2_els) == 0:
-            yield from self._parse_apps_new(article_raw, article_data)
+            yield from self._split_apps_new(article_raw)
             return
 
         # IMPORTANT: 只取第一个和第二个h2之间的元素
@@ -65,7 +210,7 @@ class PaiAppParser:
                 break
             if element.name == "h3":
                 if current_app:
-                    yield self._finalize_app(current_app, article_data)
+                    yield current_app
                 current_app = PaiAppRawData(
                     title=element.get_text().strip(),
                     html_elements=[],
@@ -76,11 +221,9 @@ class PaiAppParser:
                     current_app.html_elements.append(element)
 
         if current_app:
-            yield self._finalize_app(current_app, article_data)
+            yield current_app
 
-    def _parse_apps_new(
-        self, article: JSONObjdctType, article_data: PaiArticleData
-    ) -> Iterator[PaiAppData]:
+    def _split_apps_new(self, article: JSONObjdctType) -> Iterator[PaiAppRawData]:
         """
         新文章 api 返回格式, app html 在 data.body_extends[].body中
         """
@@ -93,22 +236,31 @@ class PaiAppParser:
         for app_raw in raw_list:
             title = str(app_raw.get("title", ""))
             html_elements = str(app_raw.get("body", ""))
-            app = PaiAppRawData(title=title, html_elements=html_elements)
-            yield self._finalize_app(app, article_data)
+            yield PaiAppRawData(title=title, html_elements=html_elements)
 
     def _finalize_app(
-        self, app_data: PaiAppRawData, article_data: PaiArticleData
+        self,
+        app_data: PaiAppRawData,
+        article_data: PaiArticleData,
+        timings: dict[str, float] | None = None,
+        known_apps: PaiKnownApps | None = None,
     ) -> PaiAppData:
+        container: BeautifulSoup | None = None
         if isinstance(app_data.html_elements, str):
-            html_frag = app_data.html_elements
+            html = app_data.html_elements
+            container = self._parse_fragment(html)
+            nodes = list(container.contents)
         else:
-            html_frag = "".join([str(e) for e in app_data.html_elements])
+            # 旧格式直接使用正文树中的元素, 不再序列化后重新解析
+            nodes = app_data.html_elements
+            html = "".join(str(n) for n in nodes)
+        # 在图片链接被改写为本地路径之前计算, 忽略空白差异
+        fingerprint = hashlib.sha256(" ".join(html.split()).encode("utf-8")).hexdigest()
 
-        soup_frag = BeautifulSoup(html_frag, "html.parser")
-
-        img_list, soup_frag = self._extract_and_transform_imgs(soup_frag)
-        platforms = self._extract_platforms(soup_frag)
-        keywords = self._extract_keywords(soup_frag)
+        img_list, li_els = self._scan_fragment(nodes)
+        extra = self._extract_fields(li_els)
+        platforms = extra.pop("platforms", [])
+        keywords = extra.pop("keywords", [])
         app_name = re.split(r"[：:]", app_data.title)[0].strip()
 
         frontmatter = PaiAppMdFrontmatter(
@@ -120,80 +272,123 @@ class PaiAppParser:
             platforms=platforms,
             keywords=keywords,
             released_time=article_data.release_time,
+            extra=extra,
         )
 
         safe_title = self._clean_filename(app_data.title)
-        content_md = self._construct_content(frontmatter, soup_frag)
+        alias_of = (
+            known_apps(app_name, fingerprint, article_data.id)
+            if known_apps is not None
+            else None
+        )
+        if alias_of is not None:
+            return PaiAppData(
+                article=article_data,
+                file_title=safe_title,
+                platforms=platforms,
+                content="",
+                img_list=[],
+                frontmatter=frontmatter,
+                fingerprint=fingerprint,
+                alias_of=alias_of,
+            )
+
+        render_start = time.perf_counter()
+        content_md = self._construct_content(frontmatter, nodes, container)
+        if timings is not None:
+            timings["render"] += time.perf_counter() - render_start
         return PaiAppData(
             article=article_data,
             file_title=safe_title,
             platforms=platforms,
             content=content_md,
             img_list=img_list,
+            frontmatter=frontmatter,
+            fingerprint=fingerprint,
         )
 
+    def _parse_fragment(self, html_frag: str) -> BeautifulSoup:
+        """
+        解析 app html 片段, 返回只包含片段顶层节点的文档
+        lxml 会补全 html/head/body, 只保留 body 下的节点以保持与 html.parser 一致
+        """
+        soup = BeautifulSoup(html_frag, self.backend)
+        if self.backend != "html.parser" and soup.body is not None:
+            nodes = list(soup.body.contents)
+            soup.clear()
+            soup.extend(nodes)
+        return soup
+
     def _construct_content(
-        self, frontmatter: PaiAppMdFrontmatter, soup: BeautifulSoup
+        self,
+        frontmatter: PaiAppMdFrontmatter,
+        nodes: list[PageElement],
+        container: BeautifulSoup | None = None,
     ) -> str:
         """
         拼接 app markdown 文档内容
+        container 为只包含 nodes 的文档时直接转换已解析的树, 不再序列化为 html 后重新解析;
+        旧格式的 nodes 位于整篇文章的正文树中, 仍需序列化
         """
-        return f"{str(frontmatter)}\n{self._md_title(1, frontmatter.title)}\n{md(str(soup), heading_style='ATX')}"
+        if container is not None:
+            body = _MD_CONVERTER.convert_soup(container)
+        else:
+            body = _MD_CONVERTER.convert("".join(str(n) for n in nodes))
+        return f"{str(frontmatter)}\n{self._md_title(1, frontmatter.title)}\n{body}"
+
+    def _iter_tags(self, nodes: Iterable[PageElement], names: list[str]) -> Iterator[Tag]:
+        """
+        按文档顺序遍历片段中指定名称的元素, 包含顶层元素自身
+        """
+        for node in nodes:
+            if not isinstance(node, Tag):
+                continue
+            if node.name in names:
+                yield node
+            yield from node.find_all(names)
 
-    def _extract_and_transform_imgs(
-        self, soup: BeautifulSoup
-    ) -> tuple[list[str], BeautifulSoup]:
+    def _scan_fragment(
+        self, nodes: list[PageElement]
+    ) -> tuple[list[str], list[Tag]]:
         """
-        提取可供下载的图片链接列表
-        并将 html 内 img.src 转换为本地图片相对路径
+        单次遍历片段:
+        提取可供下载的图片链接列表, 并将 img.src 转换为本地图片相对路径;
+        同时收集所有 li 元素供提取平台、关键词
         """
         img_list = []
-        for img in soup.find_all("img"):
-            img_src = str(img.get("src"))
+        li_els = []
+        for tag in self._iter_tags(nodes, ["img", "li"]):
+            if tag.name == "li":
+                li_els.append(tag)
+                continue
+            img_src = str(tag.get("src"))
             if not img_src:
                 continue
             # IMPORTANT: 特殊格式需要特殊路径处理
             if img_src.split("?")[0].endswith(self.SPECIAL_IMAGE_SUFFIX):
                 img_src = f"{img_src}/format/webp"
             logging.info(f"Parser: 获取图片下载链接 {img_src}")
-            # TODO: 尝试请求图片
             img_list.append(img_src)
-            filename = img_src.split("?")[0].split("/")[-1]
-            img["src"] = f"images/{filename}"
-        return img_list, soup
+            filename = image_filename(img_src)
+            tag["src"] = f"images/{filename}"
+        return img_list, li_els
 
-    def _extract_platforms(self, soup: BeautifulSoup) -> list[str]:
+    def _extract_fields(self, li_els: list[Tag]) -> dict[str, list[str]]:
         """
-        提取 app 平台列表
+        单次遍历列表项提取全部元数据字段, 每个字段取首个匹配的列表项
         """
-        platforms = []
-        # Pattern: <li>平台：iOS</li> or <li>平台：iOS, Android</li>
-        for li in soup.find_all("li"):
-            text = li.get_text()
-            if "平台" in text:
-                match = re.search(r"平台[：:]\s*(.*)", text)
-                if match:
-                    p_str = match.group(1)
-                    parts = re.split(r"[,，/、]", p_str)
-                    platforms = [p.strip() for p in parts if p.strip()]
-                    break
-        return platforms
-
-    def _extract_keywords(self, soup: BeautifulSoup) -> list[str]:
-        """
-        提取 app 关键词列表
-        """
-        keywords = []
-        for li in soup.find_all("li"):
+        fields: dict[str, list[str]] = {rule.name: [] for rule in self._field_rules}
+        pending = list(self._field_rules)
+        for li in li_els:
+            if not pending:
+                break
             text = li.get_text()
-            if "关键词" in text:
-                match = re.search(r"关键词[：:]\s*(.*)", text)
-                if match:
-                    p_str = match.group(1)
-                    parts = re.split(r"[,，/、]", p_str)
-                    keywords = [p.strip() for p in parts if p.strip()]
-                    break
-        return keywords
+            for rule in list(pending):
+                values = rule.extract(text)
+                if values is not None:
+                    fields[rule.name] = values
+                    pending.remove(rule)
+        return fields
 
     def _clean_filename(self, text: str) -> str:
         text = text.replace("：", "-").replace(":", "-")
@@ -0,0 +1,636 @@
+import asyncio
+import datetime as dt
+import logging
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Iterable
+
+from .data import JSONObjdctType, PaiAppData
+from .fetcher import PaiArticleFetcher
+from .manifest import PaiCrawlManifest
+from .metrics import PaiMetrics
+from .parser import PaiAppParser
+from .profiling import PaiArticleTimings
+from .saver import PaiAppSaver
+from .selector import PAIPING_SELECTOR, PaiArticleSelector, parse_config_hash
+from .util import article_modify_time
+
+# (文章 id, 文章列表中的 modify_time)
+type PaiArticleJob = tuple[int, int | None]
+# (文章 id, 文章列表中的 modify_time, 文章详情)
+type PaiDetailJob = tuple[int, int | None, JSONObjdctType]
+
+
+class PaiCrawlPipeline:
+    """
+    流式抓取流水线: 文章列表 -> 文章详情 -> 解析 -> 保存
+    各阶段之间以有界队列连接, 下游处理不过来时上游自动等待
+    """
+
+    def __init__(
+        self,
+        fetcher: PaiArticleFetcher,
+        parser: PaiAppParser,
+        saver: PaiAppSaver,
+        page_size: int = 20,
+        sleep_time: int = 1,
+        article_concurrency: int = 8,
+        image_concurrency: int = 16,
+        queue_size: int = 16,
+        parse_executor: ProcessPoolExecutor | None = None,
+        feed_seek: bool = False,
+        manifest: PaiCrawlManifest | None = None,
+        metrics: PaiMetrics | None = None,
+        article_timings: PaiArticleTimings | None = None,
+        selectors: list[PaiArticleSelector] | None = None,
+        record_batch_size: int = 256,
+    ):
+        self.fetcher = fetcher
+        self.parser = parser
+        # 各选择器共用同一次文章列表扫描, 默认只抓取派评
+        self.selectors = selectors if selectors else [PAIPING_SELECTOR]
+        # 解析配置变化后, 抓取清单中的文章需要重新解析
+        self.config_hash = (
+            parse_config_hash(parser, self.selectors) if parser is not None else ""
+        )
+        self.saver = saver
+        self.page_size = page_size
+        self.sleep_time = sleep_time
+        self.article_concurrency = max(1, article_concurrency)
+        self.queue_size = max(1, queue_size)
+        self.parse_executor = parse_executor
+        self.feed_seek = feed_seek
+        self.manifest = manifest
+        self.metrics = metrics if metrics is not None else PaiMetrics()
+        self.article_timings = article_timings
+        self.image_semaphore = asyncio.Semaphore(image_concurrency)
+        self.stats = {
+            "articles_scanned": 0,
+            "articles_matched": 0,
+            "articles_succeeded": 0,
+            "articles_failed": 0,
+            "articles_unchanged": 0,
+            "images_succeeded": 0,
+            "images_failed": 0,
+            "feed_probes": 0,
+            "watch_polls": 0,
+            "watch_gave_up": 0,
+        }
+        # 本次运行中处理失败的文章, watch 模式据此决定高水位
+        self.failed_article_ids: set[int] = set()
+        # 已处理完成、等待记入抓取清单的文章; 汇总输出目标写出缓存之后才记录,
+        # 避免进程中断时清单已记录而缓存中的 app 丢失, 下次运行又跳过该文章
+        self.record_batch_size = max(1, record_batch_size)
+        self._pending_records: list[tuple] = []
+        self._pending_apps = 0
+
+    async def run(self, start: dt.datetime, end: dt.datetime) -> dict:
+        await self._run_stages(
+            lambda article_queue: self._feed_stage(start, end, article_queue)
+        )
+        return self.stats
+
+    async def scan(
+        self, start: dt.datetime, end: dt.datetime
+    ) -> list[PaiArticleJob]:
+        """
+        只扫描文章列表, 返回时间范围内需要处理的目标文章, 供分片抓取规划任务
+        """
+        article_queue: asyncio.Queue[PaiArticleJob | None] = asyncio.Queue()
+        await self._feed_stage(start, end, article_queue)
+        jobs: list[PaiArticleJob] = []
+        while not article_queue.empty():
+            job = article_queue.get_nowait()
+            if job is not None:
+                jobs.append(job)
+        return jobs
+
+    async def run_jobs(self, jobs: list[PaiArticleJob]) -> dict:
+        """
+        处理给定的文章, 之后 failed_article_ids 为其中处理失败的文章
+        """
+        self.failed_article_ids.clear()
+        await self._run_stages(lambda q: self._put_jobs(jobs, q))
+        return self.stats
+
+    async def watch(
+        self,
+        high_water: int | None,
+        interval: float = 30,
+        jitter: float = 0.2,
+        max_pages: int = 5,
+        max_failures: int = 3,
+        failures: dict[int, int] | None = None,
+        on_state: Callable[[int, dict[int, int]], Awaitable[None]] | None = None,
+        stop: asyncio.Event | None = None,
+    ) -> dict:
+        """
+        常驻运行, 按带抖动的间隔轮询文章列表首页, 处理 id 高于高水位的新文章
+        有文章失败时高水位停在失败文章之前, 下一轮重新处理; 同一篇文章连续失败
+        max_failures 轮后放弃, 高水位越过该文章. failures 为各文章已失败的轮数,
+        高水位或失败轮数变化时回调 on_state 保存. high_water 为 None 时以首页为基线
+        """
+        stop = stop if stop is not None else asyncio.Event()
+        failures = dict(failures) if failures else {}
+        while not stop.is_set():
+            self.stats["watch_polls"] += 1
+            try:
+                jobs, latest = await self._poll_head(high_water, max_pages)
+                changed = False
+                if jobs:
+                    await self.run_jobs(jobs)
+                    latest = self._retry_failed(jobs, latest, failures, max_failures)
+                    changed = True
+                if latest > (high_water or 0):
+                    high_water = latest
+                    changed = True
+                if high_water is not None:
+                    failures = {a: n for a, n in failures.items() if a > high_water}
+                if changed and high_water is not None and on_state is not None:
+                    await on_state(high_water, failures)
+            except Exception as e:
+                logging.error(f"Pipeline: 轮询文章列表失败 error={e}")
+
+            delay = max(0.0, interval * random.uniform(1 - jitter, 1 + jitter))
+            try:
+                await asyncio.wait_for(stop.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+        return self.stats
+
+    def _retry_failed(
+        self,
+        jobs: list[PaiArticleJob],
+        latest: int,
+        failures: dict[int, int],
+        max_failures: int,
+    ) -> int:
+        """
+        更新各文章的失败轮数, 返回本轮可推进到的高水位:
+        停在仍需重试的最早失败文章之前, 已达 max_failures 的文章不再阻挡
+        """
+        retry = []
+        for aid, _ in jobs:
+            if aid not in self.failed_article_ids:
+                failures.pop(aid, None)
+                continue
+            failures[aid] = failures.get(aid, 0) + 1
+            if failures[aid] < max_failures:
+                retry.append(aid)
+                continue
+            self.stats["watch_gave_up"] += 1
+            logging.error(
+                f"Pipeline: 文章 {aid} 连续 {failures[aid]} 轮处理失败, 放弃重试"
+            )
+        if retry:
+            latest = min(latest, min(retry) - 1)
+        return latest
+
+    async def _poll_head(
+        self, high_water: int | None, max_pages: int
+    ) -> tuple[list[PaiArticleJob], int]:
+        """
+        从文章列表首页开始读取, 直到遇到不高于高水位的文章 (至多 max_pages 页),
+        返回 (新的目标文章, 读到的最大文章 id)
+        """
+        jobs: list[PaiArticleJob] = []
+        latest = high_water or 0
+        offset = 0
+        for _ in range(max(1, max_pages)):
+            # 轮询的列表页不写入归档, 避免归档随轮询次数增长
+            articles = await self.fetcher.fetch_feed_articles(
+                limit=self.page_size, offset=offset, archive=False
+            )
+            reached = high_water is None or not articles
+            for article in articles:
+                self.stats["articles_scanned"] += 1
+                aid = int(article["id"])
+                latest = max(latest, aid)
+                if high_water is not None and aid <= high_water:
+                    # 列表按发布时间排序, id 不严格递减, 仍检查本页其余文章
+                    reached = True
+                    continue
+                if self._is_target(article) and not await self._is_unchanged(article):
+                    logging.info(
+                        f"Pipeline: 发现新文章: {aid} {article.get('title', '')}"
+                    )
+                    jobs.append((aid, article_modify_time(article)))
+            if reached:
+                break
+            offset += self.page_size
+        else:
+            logging.warning(
+                f"Pipeline: 轮询 {max_pages} 页仍未到达高水位 {high_water}, 更早的文章需使用 crawl 模式补抓"
+            )
+        self.stats["articles_matched"] += len(jobs)
+        return jobs, latest
+
+    async def _put_jobs(
+        self,
+        jobs: list[PaiArticleJob],
+        article_queue: asyncio.Queue[PaiArticleJob | None],
+    ):
+        for job in jobs:
+            await article_queue.put(job)
+
+    async def _run_stages(
+        self,
+        produce: Callable[[asyncio.Queue[PaiArticleJob | None]], Awaitable[None]],
+    ):
+        """
+        启动详情与解析保存阶段, produce 向文章队列放入任务, 返回时所有任务已处理完
+        """
+        article_queue: asyncio.Queue[PaiArticleJob | None] = asyncio.Queue(
+            self.queue_size
+        )
+        detail_queue: asyncio.Queue[PaiDetailJob | None] = asyncio.Queue(
+            self.queue_size
+        )
+
+        fetch_workers = [
+            asyncio.create_task(self._detail_stage(article_queue, detail_queue))
+            for _ in range(self.article_concurrency)
+        ]
+        save_workers = [
+            asyncio.create_task(self._parse_save_stage(detail_queue))
+            for _ in range(self.article_concurrency)
+        ]
+        try:
+            await produce(article_queue)
+            for _ in fetch_workers:
+                await article_queue.put(None)
+            await asyncio.gather(*fetch_workers)
+            for _ in save_workers:
+                await detail_queue.put(None)
+            await asyncio.gather(*save_workers)
+            if self._pending_records and self.saver.flush_is_durable:
+                await self.commit_records()
+        finally:
+            for task in fetch_workers + save_workers:
+                task.cancel()
+
+    async def reparse(self, details: Iterable[JSONObjdctType]) -> dict:
+        """
+        离线重新解析已归档的文章详情并保存, 跳过文章列表与详情请求
+        """
+        detail_queue: asyncio.Queue[PaiDetailJob | None] = asyncio.Queue(
+            self.queue_size
+        )
+        save_workers = [
+            asyncio.create_task(self._parse_save_stage(detail_queue))
+            for _ in range(self.article_concurrency)
+        ]
+        try:
+            for detail in details:
+                self.stats["articles_matched"] += 1
+                await detail_queue.put(
+                    (int(detail["id"]), article_modify_time(detail), detail)
+                )
+                self.metrics.observe_queue("detail", detail_queue.qsize())
+            for _ in save_workers:
+                await detail_queue.put(None)
+            await asyncio.gather(*save_workers)
+            if self._pending_records and self.saver.flush_is_durable:
+                await self.commit_records()
+        finally:
+            for task in save_workers:
+                task.cancel()
+
+        return self.stats
+
+    async def commit_records(self):
+        """
+        先写出各输出目标缓存的记录, 再将对应的文章记入抓取清单
+        输出目标不能在 flush 时持久化 (如 parquet) 时, 需在 saver.close() 之后调用
+        """
+        records, self._pending_records = self._pending_records, []
+        self._pending_apps = 0
+        if not records or self.manifest is None:
+            return
+        try:
+            await self.saver.flush()
+        except Exception as e:
+            # 缓存的记录已丢失, 不记入清单, 这些文章在下次运行时重新处理
+            logging.error(
+                f"Pipeline: 写出输出目标失败, {len(records)} 篇文章下次运行时重新处理 error={e}"
+            )
+            return
+        await asyncio.to_thread(self.manifest.record_articles, records)
+
+    async def _record_article(self, record: tuple, apps: int):
+        self._pending_records.append(record)
+        self._pending_apps += apps
+        if self._pending_apps >= self.record_batch_size and self.saver.flush_is_durable:
+            await self.commit_records()
+
+    async def _feed_stage(
+        self,
+        start: dt.datetime,
+        end: dt.datetime,
+        article_queue: asyncio.Queue[PaiArticleJob | None],
+    ):
+        offset = 0
+        stop_offset: int | None = None
+        if self.feed_seek:
+            # 仅抓取定位到的分页, 不再从最新文章逐页扫描
+            try:
+                offset, stop_offset = await self._seek_feed_range(start, end)
+                logging.info(
+                    f"Pipeline: 定位到时间范围内的文章列表 offset={offset} stop_offset={stop_offset}"
+                )
+            except RuntimeError as e:
+                # 探测失败时定位结果不可信, 回退到从最新文章逐页扫描, 避免缩短抓取范围
+                logging.warning(f"Pipeline: 定位文章列表失败, 改为逐页扫描 error={e}")
+
+        while stop_offset is None or offset < stop_offset:
+            articles = await self.fetcher.fetch_feed_articles(
+                limit=self.page_size, offset=offset
+            )
+            if not articles:
+                logging.info("Pipeline: 没有更多文章，结束抓取")
+                return
+
+            for article in articles:
+                self.stats["articles_scanned"] += 1
+                released_time = article.get("released_time", 0)
+                article_date = dt.datetime.fromtimestamp(released_time)
+
+                if article_date > end:
+                    continue
+                if article_date < start:
+                    logging.info(
+                        f"Pipeline: 文章发布时间 {article_date} 超出时间范围, 结束文章抓取"
+                    )
+                    return
+
+                title = str(article.get("title", ""))
+                aid = int(article["id"])
+                if self._is_target(article):
+                    self.stats["articles_matched"] += 1
+                    modified_time = article_modify_time(article)
+                    if await self._is_unchanged(article):
+                        continue
+                    logging.info(
+                        f"Pipeline: 抓取目标文章: {aid} {title} ({article_date})"
+                    )
+                    await article_queue.put((aid, modified_time))
+                    self.metrics.observe_queue("article", article_queue.qsize())
+
+            offset += self.page_size
+            if self.sleep_time > 0:
+                await asyncio.sleep(self.sleep_time)
+
+    def _is_target(self, article: JSONObjdctType) -> bool:
+        return any(selector.matches(article) for selector in self.selectors)
+
+    def _article_selectors(self, detail: JSONObjdctType) -> list[PaiArticleSelector]:
+        """
+        文章详情匹配的选择器, 都不匹配时 (如标题已修改或离线重新解析) 使用第一个选择器
+        """
+        return [s for s in self.selectors if s.matches(detail)] or self.selectors[:1]
+
+    async def _is_unchanged(self, article: JSONObjdctType) -> bool:
+        """
+        抓取清单中记录的 modify_time 未变化, 计入统计并跳过
+        """
+        aid = int(article["id"])
+        if self.manifest is None or not await asyncio.to_thread(
+            self.manifest.is_article_unchanged,
+            aid,
+            article_modify_time(article),
+            self.config_hash,
+        ):
+            return False
+        self.stats["articles_unchanged"] += 1
+        logging.info(f"Pipeline: 文章未变化, 跳过: {aid} {article.get('title', '')}")
+        return True
+
+    async def _seek_feed_range(
+        self, start: dt.datetime, end: dt.datetime
+    ) -> tuple[int, int]:
+        """
+        文章列表按发布时间倒序, 先指数步长探测再二分,
+        以分页大小为精度定位时间范围对应的 offset 区间 [begin, stop)
+        """
+        probes: dict[int, int | None] = {}
+
+        async def released_at(offset: int) -> int | None:
+            if offset not in probes:
+                self.stats["feed_probes"] += 1
+                probes[offset] = await self.fetcher.fetch_feed_released_time(offset)
+            return probes[offset]
+
+        async def seek(lower: int, before: float) -> int:
+            """
+            返回 offset, 使 (offset - page_size, offset] 中包含首个
+            发布时间早于 before 的文章, 列表末尾视为满足条件
+            """
+            t = await released_at(lower)
+            if t is None or t < before:
+                return lower
+            low, step = lower, self.page_size
+            high = low + step
+            while (t := await released_at(high)) is not None and t >= before:
+                low, step = high, step * 2
+                high = low + step
+            while high - low > self.page_size:
+                mid = (low + high) // 2
+                t = await released_at(mid)
+                if t is None or t < before:
+                    high = mid
+                else:
+                    low = mid
+            return high
+
+        first = await seek(0, end.timestamp() + 1)
+        begin = max(0, first - self.page_size)
+        stop = await seek(begin, start.timestamp())
+        return begin, stop
+
+    async def _detail_stage(
+        self,
+        article_queue: asyncio.Queue[PaiArticleJob | None],
+        detail_queue: asyncio.Queue[PaiDetailJob | None],
+    ):
+        while (item := await article_queue.get()) is not None:
+            aid, modified_time = item
+            try:
+                detail = await self.fetcher.fetch_article_detail(aid)
+                if detail is not None and await self._skip_unchanged_body(
+                    aid, modified_time, detail
+                ):
+                    continue
+            except Exception as e:
+                # 异常不能结束 worker, 否则所有 worker 退出后列表阶段会阻塞在已满的队列上
+                logging.error(f"Pipeline: 文章任务异常 article_id={aid} error={e}")
+                self._article_failed(aid)
+                continue
+            if detail is None:
+                logging.error(f"Pipeline: 获取文章详情失败 article_id={aid}")
+                self._article_failed(aid)
+                continue
+            await detail_queue.put((aid, modified_time, detail))
+            self.metrics.observe_queue("detail", detail_queue.qsize())
+
+    async def _skip_unchanged_body(
+        self, aid: int, modified_time: int | None, detail: JSONObjdctType
+    ) -> bool:
+        """
+        正文与抓取清单中的记录一致时更新修改时间并返回 True
+        """
+        if self.manifest is None or not await asyncio.to_thread(
+            self.manifest.is_body_unchanged,
+            aid,
+            self.manifest.hash_article(detail),
+            self.config_hash,
+        ):
+            return False
+        await asyncio.to_thread(self.manifest.touch_article, aid, modified_time)
+        self.stats["articles_unchanged"] += 1
+        logging.info(f"Pipeline: 文章正文未变化, 跳过解析 article_id={aid}")
+        return True
+
+    async def _parse_save_stage(
+        self, detail_queue: asyncio.Queue[PaiDetailJob | None]
+    ):
+        while (item := await detail_queue.get()) is not None:
+            aid, modified_time, detail = item
+            try:
+                app_count, img_success, img_failed, ok = await self.process_article(
+                    aid, detail, modified_time
+                )
+            except Exception as e:
+                self._article_failed(aid)
+                logging.error(f"Pipeline: 文章任务异常 article_id={aid} error={e}")
+                continue
+
+            if ok:
+                self.stats["articles_succeeded"] += 1
+            else:
+                self._article_failed(aid)
+            self.stats["images_succeeded"] += img_success
+            self.stats["images_failed"] += img_failed
+            logging.info(f"Pipeline: 文章 {aid} 中发现 {app_count} 个 app 推荐")
+
+    def _article_failed(self, aid: int):
+        self.stats["articles_failed"] += 1
+        self.failed_article_ids.add(aid)
+
+    async def process_article(
+        self, aid: int, detail: JSONObjdctType, modified_time: int | None = None
+    ) -> tuple[int, int, int, bool]:
+        """
+        解析文章并保存其中的 app, 每个 app 解析完成后立即开始下载图片和写入
+        """
+        save_tasks: list[asyncio.Task[tuple[int, int, float]]] = []
+        app_files: list[str] = []
+        released_date = ""
+        timings = {"parse": 0.0, "render": 0.0}
+        start = time.perf_counter()
+        try:
+            for selector in self._article_selectors(detail):
+                parser = selector.parser or self.parser
+                if self.parse_executor is not None:
+                    loop = asyncio.get_running_loop()
+                    apps, parse_timings = await loop.run_in_executor(
+                        self.parse_executor, parser.parse_app_list_timed, detail
+                    )
+                    timings["parse"] += parse_timings["parse"]
+                    timings["render"] += parse_timings["render"]
+                    for app in apps:
+                        app.subdir = selector.subdir
+                        self._add_save(app, save_tasks, app_files)
+                        released_date = app.article.released_date
+                    continue
+
+                # 在事件循环内解析时, 已保存过的 app 在渲染之前即可识别
+                known_apps = (
+                    self.saver.app_index.canonical
+                    if self.saver.app_index is not None
+                    else None
+                )
+                for app in parser.parse_apps(detail, timings, known_apps):
+                    app.subdir = selector.subdir
+                    self._add_save(app, save_tasks, app_files)
+                    released_date = app.article.released_date
+                    # 让出事件循环, 使已解析 app 的图片下载尽快开始
+                    await asyncio.sleep(0)
+        except Exception as e:
+            logging.error(f"Pipeline: 解析文章失败 article_id={aid} error={e}")
+            self.metrics.add_error("parse")
+            await asyncio.gather(*save_tasks, return_exceptions=True)
+            return (0, 0, 0, False)
+        self.metrics.observe("parse", timings["parse"] - timings["render"])
+        self.metrics.observe("render", timings["render"])
+
+        save_results = await asyncio.gather(*save_tasks, return_exceptions=True)
+        img_success = 0
+        img_failed = 0
+        image_seconds = 0.0
+        ok = True
+        for save_result in save_results:
+            if isinstance(save_result, Exception):
+                ok = False
+                continue
+            success, failed, seconds = save_result
+            img_success += success
+            img_failed += failed
+            # app 之间并发下载图片, 取最慢的一个
+            image_seconds = max(image_seconds, seconds)
+
+        # 有图片下载失败的文章不记入清单, 下次运行时重新处理以补齐图片
+        if ok and img_failed and self.manifest is not None:
+            logging.warning(
+                f"Pipeline: 文章 {aid} 有 {img_failed} 张图片下载失败, 下次运行时重试"
+            )
+        if ok and not img_failed and self.manifest is not None:
+            await self._record_article(
+                (
+                    aid,
+                    modified_time,
+                    self.manifest.hash_article(detail),
+                    released_date,
+                    app_files,
+                    self.config_hash,
+                ),
+                len(app_files),
+            )
+
+        if self.article_timings is not None:
+            self.article_timings.record(
+                {
+                    "article_id": aid,
+                    "apps": len(save_tasks),
+                    "images": img_success + img_failed,
+                    "parse_ms": round(timings["parse"] * 1000, 2),
+                    "render_ms": round(timings["render"] * 1000, 2),
+                    "image_ms": round(image_seconds * 1000, 2),
+                    "total_ms": round((time.perf_counter() - start) * 1000, 2),
+                    "ok": ok,
+                }
+            )
+        return (len(save_tasks), img_success, img_failed, ok)
+
+    def _add_save(
+        self,
+        app: PaiAppData,
+        save_tasks: list[asyncio.Task[tuple[int, int, float]]],
+        app_files: list[str],
+    ):
+        """
+        开始保存 app, 在其他文章中保存过而被跳过的 app 不计入文章的文件列表
+        """
+        resolved = self.saver.resolve_duplicate(app)
+        if resolved is None:
+            return
+        save_tasks.append(self._start_save(resolved))
+        app_files.append(self.saver.app_filepath(resolved))
+
+    def _start_save(self, app: PaiAppData) -> asyncio.Task[tuple[int, int, float]]:
+        return asyncio.create_task(
+            self.saver.save_app_async(
+                app_data=app,
+                image_semaphore=self.image_semaphore,
+            )
+        )
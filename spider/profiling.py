@@ -0,0 +1,95 @@
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+
+
+class PaiProfiler:
+    """
+    运行期性能分析 (需安装 yappi): yappi 按协程统计 await 前后的耗时,
+    cProfile 会把协程挂起的时间算到事件循环上, 结果具有误导性, 因此不作为回退.
+    结果保存为 pstats 格式, 并按累计耗时输出文本报告
+    """
+
+    CLOCKS = ("wall", "cpu")
+    STATS_FILENAME = "functions.pstats"
+    REPORT_FILENAME = "functions.txt"
+
+    def __init__(self, output_dir: str, clock: str = "wall", top: int = 40):
+        if clock not in self.CLOCKS:
+            raise ValueError(f"不支持的计时方式 {clock}, 可选 {self.CLOCKS}")
+        try:
+            import yappi
+        except ImportError as e:
+            raise RuntimeError("性能分析需要安装 yappi") from e
+        self._yappi = yappi
+        self.output_dir = output_dir
+        self.clock = clock
+        self.top = top
+        os.makedirs(output_dir, exist_ok=True)
+
+    def start(self):
+        self._yappi.set_clock_type(self.clock)
+        self._yappi.start()
+
+    def stop(self) -> str:
+        """
+        停止分析并写出结果, 返回 pstats 文件路径
+        """
+        stats_path = os.path.join(self.output_dir, self.STATS_FILENAME)
+        self._yappi.stop()
+        self._yappi.get_func_stats().save(stats_path, type="pstat")
+        self._yappi.clear_stats()
+
+        report_path = os.path.join(self.output_dir, self.REPORT_FILENAME)
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(self.report(stats_path))
+        logging.info(f"Profiler: 分析结果已保存到 {stats_path}")
+        return stats_path
+
+    def report(self, stats_path: str) -> str:
+        """
+        按累计耗时排序的全部函数, 以及 spider 包内的函数
+        """
+        stream = io.StringIO()
+        stats = pstats.Stats(stats_path, stream=stream)
+        stream.write(f"clock={self.clock}\n\n")
+        stats.sort_stats("cumulative").print_stats(self.top)
+        stream.write("\n===== spider =====\n")
+        stats.sort_stats("tottime").print_stats(r"spider[\\/]", self.top)
+        return stream.getvalue()
+
+
+class PaiArticleTimings:
+    """
+    每篇文章的处理耗时记录, 以 JSONL 格式追加写入, 运行结束时输出最慢的文章
+    """
+
+    FILENAME = "articles.jsonl"
+
+    def __init__(self, output_dir: str, slowest: int = 10):
+        os.makedirs(output_dir, exist_ok=True)
+        self.path = os.path.join(output_dir, self.FILENAME)
+        self.slowest = slowest
+        self._records: list[dict] = []
+        self._lock = threading.Lock()
+        self._file = open(self.path, "w", encoding="utf-8")
+
+    def record(self, record: dict):
+        with self._lock:
+            self._records.append(record)
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def slowest_articles(self) -> list[dict]:
+        with self._lock:
+            records = list(self._records)
+        return sorted(records, key=lambda r: r["total_ms"], reverse=True)[
+            : self.slowest
+        ]
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -1,17 +1,62 @@
 import asyncio
+import dataclasses
 import logging
 import os
+import time
+import uuid
+from typing import Awaitable, Callable
 
-import aiohttp
-
+from .appindex import PaiAppIndex
 from .data import PaiAppData
+from .fetcher import PaiArticleFetcher
+from .imagequeue import PaiImageQueue
+from .imageopt import PaiImageOptimizer
+from .imagestore import PaiImageStore
+from .manifest import PaiCrawlManifest
+from .metrics import PaiMetrics
+from .sinks import PaiAppSink, PaiMarkdownSink
+from .writer import PaiFileWriter
 
-from .util import fetch_image_bytes, fetch_image_bytes_async
+from .util import fetch_image_bytes, image_filename, link_or_copy
 
 
 class PaiAppSaver:
-    def __init__(self, output_dir="data"):
+    # 图片队列为空时检查新图片与到期重试的间隔
+    IMAGE_QUEUE_POLL_SECONDS = 1.0
+
+    def __init__(
+        self,
+        output_dir="data",
+        manifest: PaiCrawlManifest | None = None,
+        image_store: PaiImageStore | None = None,
+        image_chunk_size: int = 64 * 1024,
+        image_max_bytes: int = 50 * 1024 * 1024,
+        fetcher: PaiArticleFetcher | None = None,
+        metrics: PaiMetrics | None = None,
+        writer: PaiFileWriter | None = None,
+        sinks: list[PaiAppSink] | None = None,
+        image_optimizer: PaiImageOptimizer | None = None,
+        image_queue: PaiImageQueue | None = None,
+        app_index: PaiAppIndex | None = None,
+    ):
         self.output_dir = output_dir
+        self.manifest = manifest
+        self.image_store = image_store
+        self.image_chunk_size = image_chunk_size
+        self.image_max_bytes = image_max_bytes
+        self.fetcher = fetcher
+        self.image_optimizer = image_optimizer
+        # 设置后 markdown 立即写入, 图片加入待下载队列
+        self.image_queue = image_queue
+        self.app_index = app_index
+        self.metrics = metrics if metrics is not None else PaiMetrics()
+        self.writer = (
+            writer if writer is not None else PaiFileWriter(metrics=self.metrics)
+        )
+        # 默认只输出 markdown 文件
+        self.sinks = (
+            sinks if sinks is not None else [PaiMarkdownSink(self.writer, manifest)]
+        )
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
@@ -43,47 +88,278 @@ class PaiAppSaver:
         except Exception as e:
             logging.error(f"Saver: 保存失败 {filename}: {e}")
 
+    def app_filepath(self, app_data: PaiAppData) -> str:
+        """
+        app markdown 文件的保存路径
+        """
+        platforms_str = ",".join(app_data.platforms)
+        filename = f"{app_data.file_title}-[{platforms_str}].md"
+        filename = filename.replace("/", "-").replace("\\", "-")
+        return os.path.join(
+            self.output_dir, app_data.subdir, app_data.article.released_date, filename
+        )
+
+    def resolve_duplicate(self, app_data: PaiAppData) -> PaiAppData | None:
+        """
+        检查 app 是否已在其他文章中保存过: 跳过时返回 None,
+        否则返回只引用首次保存文件的 app (不含正文与图片)
+        """
+        if self.app_index is None or app_data.frontmatter is None:
+            return app_data
+        filepath = self.app_filepath(app_data)
+        # 首次出现时立即占用索引条目, 同时处理的其他文章中的同一 app 也能识别为重复
+        alias_of = app_data.alias_of or self.app_index.reserve(app_data, filepath)
+        if alias_of is None:
+            return app_data
+
+        if self.app_index.action == "skip":
+            self.app_index.stats["skipped"] += 1
+            logging.info(
+                f"Saver: app 已保存在 {alias_of}, 跳过 {os.path.basename(filepath)}"
+            )
+            return None
+
+        self.app_index.stats["aliased"] += 1
+        frontmatter = dataclasses.replace(app_data.frontmatter, alias_of=alias_of)
+        link = os.path.relpath(
+            os.path.join(self.output_dir, alias_of), os.path.dirname(filepath)
+        ).replace(os.sep, "/")
+        content = (
+            f"{frontmatter}\n# {frontmatter.title}\n\n"
+            f"已在其他文章中介绍过, 见 [{frontmatter.app_name}](<{link}>)\n"
+        )
+        return dataclasses.replace(
+            app_data,
+            frontmatter=frontmatter,
+            content=content,
+            img_list=[],
+            alias_of=alias_of,
+        )
+
     async def save_app_async(
         self,
         app_data: PaiAppData,
-        session: aiohttp.ClientSession,
         image_semaphore: asyncio.Semaphore,
-        timeout: int = 15,
-    ) -> tuple[int, int]:
-        platforms_str = ",".join(app_data.platforms)
-        filename = f"{app_data.file_title}-[{platforms_str}].md"
-        filename = filename.replace("/", "-").replace("\\", "-")
+    ) -> tuple[int, int, float]:
+        """
+        下载图片并写入所有输出目标, 返回 (图片成功数, 图片失败数, 图片下载耗时秒数)
+        设置了图片队列时图片只入队, 不计入成功或失败
+        """
+        filepath = self.app_filepath(app_data)
+        indexed = self.app_index is not None and app_data.alias_of is None
+        try:
+            result, saved = await self._save_app(app_data, filepath, image_semaphore)
+        except BaseException:
+            if indexed:
+                self.app_index.release(app_data, filepath)
+            raise
+        if indexed:
+            if saved:
+                await asyncio.to_thread(self.app_index.record, app_data, filepath)
+            else:
+                # 保存失败时释放占用的索引条目, 之后出现的同一 app 重新保存
+                self.app_index.release(app_data, filepath)
+        return result
 
-        date_dir = os.path.join(self.output_dir, app_data.article.released_date)
+    async def _save_app(
+        self,
+        app_data: PaiAppData,
+        filepath: str,
+        image_semaphore: asyncio.Semaphore,
+    ) -> tuple[tuple[int, int, float], bool]:
+        """
+        返回 save_app_async 的结果, 以及是否所有输出目标都写入成功
+        """
+        date_dir = os.path.dirname(filepath)
         app_img_dir = os.path.join(date_dir, "images")
-        await asyncio.to_thread(os.makedirs, date_dir, exist_ok=True)
-        await asyncio.to_thread(os.makedirs, app_img_dir, exist_ok=True)
-
-        img_success, img_failed = await self._download_images_async(
-            app_data.img_list,
-            app_img_dir,
-            session=session,
-            image_semaphore=image_semaphore,
-            timeout=timeout,
-        )
+        await self.writer.makedirs(app_img_dir)
+
+        image_start = time.perf_counter()
+        if self.image_queue is not None:
+            await self._enqueue_images(app_data.img_list, app_img_dir)
+            img_success, img_failed = 0, 0
+        else:
+            img_success, img_failed = await self._download_images_async(
+                app_data.img_list,
+                app_img_dir,
+                image_semaphore=image_semaphore,
+            )
+        image_seconds = time.perf_counter() - image_start
+
+        app_data = self._rewrite_image_links(app_data, app_img_dir)
+        saved = True
+        for sink in self.sinks:
+            try:
+                await sink.write(app_data, filepath)
+            except Exception as e:
+                saved = False
+                logging.error(
+                    f"Saver: 保存失败 sink={sink.name} {os.path.basename(filepath)}: {e}"
+                )
+        return (img_success, img_failed, image_seconds), saved
 
+    def _rewrite_image_links(self, app_data: PaiAppData, img_dir: str) -> PaiAppData:
+        """
+        图片优化转换了格式时, 将正文中的图片链接替换为转换后的文件名;
+        优化失败而保留原文件名的图片不替换
+        """
+        if self.image_optimizer is None or not self.image_optimizer.image_format:
+            return app_data
         content = app_data.content
-        filepath = os.path.join(date_dir, filename)
+        image_names = {}
+        for img_src in app_data.img_list:
+            filename = image_filename(img_src)
+            local_name = self._saved_image_name(img_src, img_dir)
+            image_names[img_src] = local_name
+            if local_name != filename:
+                content = content.replace(
+                    f"(images/{filename}", f"(images/{local_name}"
+                )
+        return dataclasses.replace(
+            app_data, content=content, image_names=image_names
+        )
 
-        if os.path.exists(filepath):
-            logging.info(f"Saver: 文件 {filepath} 将被覆盖")
+    def _local_image_path(self, img_src: str, img_dir: str) -> str:
+        filename = image_filename(img_src)
+        if self.image_optimizer is not None:
+            filename = self.image_optimizer.local_name(filename)
+        return os.path.join(img_dir, filename)
+
+    def _saved_image_name(self, img_src: str, img_dir: str) -> str:
+        """
+        图片在 img_dir 中的文件名: 只有原文件名的图片存在时 (优化失败) 为原文件名,
+        否则为优化后的文件名 (图片尚未下载时按优化成功处理)
+        """
+        filename = image_filename(img_src)
+        local_name = os.path.basename(self._local_image_path(img_src, img_dir))
+        if (
+            local_name != filename
+            and not os.path.exists(os.path.join(img_dir, local_name))
+            and os.path.exists(os.path.join(img_dir, filename))
+        ):
+            return filename
+        return local_name
+
+    async def _restore_image_links(self, img_dir: str, local_name: str, filename: str):
+        """
+        图片入队时正文已按优化后的文件名写入, 优化失败后将日期目录中
+        markdown 的链接改回原文件名
+        """
+        date_dir = os.path.dirname(img_dir)
+        old, new = f"(images/{local_name}", f"(images/{filename}"
+        for name in await asyncio.to_thread(os.listdir, date_dir):
+            if not name.endswith(".md"):
+                continue
+            path = os.path.join(date_dir, name)
+            with open(path, encoding="utf-8") as f:
+                content = f.read()
+            if old in content:
+                await self.writer.write_text(path, content.replace(old, new))
+
+    async def _enqueue_images(self, imgs: list[str], img_dir: str):
+        assert self.image_queue is not None
+        rel_dir = os.path.relpath(img_dir, self.output_dir)
+        items = [
+            (img_src, rel_dir)
+            for img_src in imgs
+            if not os.path.exists(
+                os.path.join(img_dir, self._saved_image_name(img_src, img_dir))
+            )
+        ]
+        await asyncio.to_thread(self.image_queue.enqueue, items)
 
+    async def process_image_queue(
+        self,
+        image_semaphore: asyncio.Semaphore,
+        stop: asyncio.Event | None = None,
+        batch_size: int = 64,
+    ) -> tuple[int, int]:
+        """
+        下载队列中已到期的图片, 返回 (成功数, 失败数)
+        stop 为 None 或已设置时处理完到期的图片即返回, 否则持续等待新入队的图片;
+        仍在退避等待中的图片留给之后的运行
+        """
+        assert self.image_queue is not None
+        success, failed = 0, 0
+        while True:
+            items = await asyncio.to_thread(self.image_queue.due, batch_size)
+            if items:
+                results = await asyncio.gather(
+                    *(
+                        self._process_queued_image(img_src, img_dir, image_semaphore)
+                        for img_src, img_dir in items
+                    )
+                )
+                success += sum(1 for ok in results if ok)
+                failed += sum(1 for ok in results if not ok)
+                continue
+            if stop is None or stop.is_set():
+                return success, failed
+
+            delay = self.IMAGE_QUEUE_POLL_SECONDS
+            next_attempt_at = await asyncio.to_thread(
+                self.image_queue.next_attempt_at
+            )
+            if next_attempt_at is not None:
+                delay = min(delay, max(0.0, next_attempt_at - time.time()))
+            try:
+                await asyncio.wait_for(stop.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process_queued_image(
+        self, img_src: str, rel_dir: str, image_semaphore: asyncio.Semaphore
+    ) -> bool:
+        assert self.image_queue is not None
+        img_dir = os.path.join(self.output_dir, rel_dir)
         try:
-            await asyncio.to_thread(self._write_text_file, filepath, content)
-            logging.info(f"Saver: 保存文章 {filename}")
+            await self.writer.makedirs(img_dir)
+            saved_name = await self._fetch_image(img_src, img_dir, image_semaphore)
+            local_name = os.path.basename(self._local_image_path(img_src, img_dir))
+            if saved_name != local_name:
+                await self._restore_image_links(img_dir, local_name, saved_name)
         except Exception as e:
-            logging.error(f"Saver: 保存失败 {filename}: {e}")
+            retry = await asyncio.to_thread(
+                self.image_queue.mark_failed, img_src, rel_dir, repr(e)
+            )
+            logging.error(
+                f"Saver: 下载图片失败 {img_src}: {e}"
+                + (", 稍后重试" if retry else ", 已达最大重试次数")
+            )
+            return False
+        await asyncio.to_thread(self.image_queue.mark_done, img_src, rel_dir)
+        return True
+
+    @property
+    def flush_is_durable(self) -> bool:
+        """
+        所有输出目标在 flush 之后都已持久化, 否则要等到 close 之后
+        """
+        return all(sink.durable_flush for sink in self.sinks)
+
+    async def flush(self):
+        """
+        写出各输出目标中缓存的记录
+        """
+        for sink in self.sinks:
+            await sink.flush()
 
-        return img_success, img_failed
+    async def close(self) -> bool:
+        """
+        写出各输出目标中缓存的记录并关闭, 全部成功时返回 True
+        """
+        ok = True
+        for sink in self.sinks:
+            try:
+                await sink.close()
+            except Exception as e:
+                ok = False
+                logging.error(f"Saver: 关闭输出目标失败 sink={sink.name}: {e}")
+        return ok
 
     def _download_images(self, imgs: list[str], img_dir: str):
         for img_src in imgs:
-            filename = img_src.split("?")[0].split("/")[-1]
+            filename = image_filename(img_src)
             local_path = os.path.join(img_dir, filename)
 
             if os.path.exists(local_path):
@@ -105,18 +381,14 @@ class PaiAppSaver:
         self,
         imgs: list[str],
         img_dir: str,
-        session: aiohttp.ClientSession,
         image_semaphore: asyncio.Semaphore,
-        timeout: int = 15,
     ) -> tuple[int, int]:
         tasks = [
             asyncio.create_task(
                 self._download_one_image(
                     img_src=img_src,
                     img_dir=img_dir,
-                    session=session,
                     image_semaphore=image_semaphore,
-                    timeout=timeout,
                 )
             )
             for img_src in imgs
@@ -133,35 +405,97 @@ class PaiAppSaver:
         self,
         img_src: str,
         img_dir: str,
-        session: aiohttp.ClientSession,
         image_semaphore: asyncio.Semaphore,
-        timeout: int = 15,
     ) -> bool:
-        filename = img_src.split("?")[0].split("/")[-1]
-        local_path = os.path.join(img_dir, filename)
+        try:
+            await self._fetch_image(img_src, img_dir, image_semaphore)
+            return True
+        except Exception as e:
+            logging.error(f"Saver: 下载图片失败 {img_src}: {e}")
+            return False
+
+    async def _fetch_image(
+        self,
+        img_src: str,
+        img_dir: str,
+        image_semaphore: asyncio.Semaphore,
+    ) -> str:
+        """
+        将图片保存到 img_dir, 返回保存的文件名, 失败时抛出异常
+        """
+        local_path = self._local_image_path(img_src, img_dir)
+        filename = self._saved_image_name(img_src, img_dir)
 
-        if os.path.exists(local_path):
+        if os.path.exists(os.path.join(img_dir, filename)):
             logging.info(f"Saver: 图片已存在, 跳过 {filename}")
-            return True
+            return filename
 
-        async with image_semaphore:
-            try:
-                image_data = await fetch_image_bytes_async(
-                    session=session,
+        async def download(path: str) -> str:
+            # 离线重新生成时没有 fetcher, 只能使用图片存储中已有的图片
+            if self.fetcher is None:
+                raise RuntimeError("Saver 未设置 fetcher, 无法下载图片")
+            async with image_semaphore:
+                return await self.fetcher.download_image(
                     url=img_src,
-                    timeout=timeout,
+                    path=path,
+                    chunk_size=self.image_chunk_size,
+                    max_bytes=self.image_max_bytes,
                 )
-                await asyncio.to_thread(self._write_binary_file, local_path, image_data)
-                logging.info(f"Saver: 下载图片成功 {img_src}")
-                return True
-            except Exception as e:
-                logging.error(f"Saver: 下载图片失败 {img_src}: {e}")
-                return False
 
-    def _write_binary_file(self, path: str, content: bytes):
-        with open(path, "wb") as f:
-            f.write(content)
+        if self.image_optimizer is not None:
+            local_path = await self._download_optimized(img_src, local_path, download)
+        elif self.image_store is not None:
+            blob_path = await self.image_store.fetch(img_src, download)
+            await asyncio.to_thread(self.image_store.link, blob_path, local_path)
+        else:
+            await download(local_path)
+        logging.info(f"Saver: 下载图片成功 {img_src}")
+        return os.path.basename(local_path)
 
-    def _write_text_file(self, path: str, content: str):
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(content)
+    async def _download_optimized(
+        self,
+        img_src: str,
+        local_path: str,
+        download: Callable[[str], Awaitable[str]],
+    ) -> str:
+        """
+        下载原图后在进程池中优化, 日期目录中引用优化结果, 返回保存的路径
+        优化失败时以原文件名引用原图, 不能以转换后的扩展名保存原图内容
+        未启用图片存储时原图只作为临时文件保留到优化完成
+        """
+        assert self.image_optimizer is not None
+        staging_path = None
+        if self.image_store is not None:
+            src_path = await self.image_store.fetch(img_src, download)
+            digest = os.path.splitext(os.path.basename(src_path))[0]
+        else:
+            staging_path = f"{local_path}.{uuid.uuid4().hex[:8]}.orig"
+            src_path = staging_path
+            digest = await download(staging_path)
+
+        try:
+            try:
+                optimized_path, thumb_path = await self.image_optimizer.optimize(
+                    src_path, digest, image_filename(img_src)
+                )
+            except Exception:
+                # 优化器已记录错误, 原图保留原文件名
+                optimized_path, thumb_path = src_path, None
+                local_path = os.path.join(
+                    os.path.dirname(local_path), image_filename(img_src)
+                )
+            await asyncio.to_thread(link_or_copy, optimized_path, local_path)
+            if thumb_path is not None:
+                thumbs_dir = os.path.join(
+                    os.path.dirname(local_path), PaiImageOptimizer.THUMBS_DIRNAME
+                )
+                await self.writer.makedirs(thumbs_dir)
+                await asyncio.to_thread(
+                    link_or_copy,
+                    thumb_path,
+                    os.path.join(thumbs_dir, os.path.basename(local_path)),
+                )
+        finally:
+            if staging_path is not None and os.path.exists(staging_path):
+                os.remove(staging_path)
+        return local_path
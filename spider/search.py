@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any
+
+
+class PaiSearchIndex:
+    """
+    app 全文索引, 基于 SQLite FTS5 (trigram 分词, 支持中文子串匹配)
+    索引 app 名称、标题、关键词、平台与正文, 只有内容变化的 app 才会更新索引
+    """
+
+    FILENAME = ".search.sqlite3"
+    # trigram 分词至少需要 3 个字符, 更短的词使用 LIKE 匹配
+    MIN_MATCH_CHARS = 3
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS apps (
+        path TEXT PRIMARY KEY,
+        article_id INTEGER NOT NULL,
+        article_title TEXT,
+        article_url TEXT,
+        released_date TEXT,
+        title TEXT,
+        app_name TEXT,
+        platforms TEXT,
+        keywords TEXT,
+        body TEXT,
+        content_hash TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS apps_released_date ON apps (released_date);
+    CREATE VIRTUAL TABLE IF NOT EXISTS apps_fts USING fts5 (
+        app_name, title, keywords, platforms, body,
+        content='apps', content_rowid='rowid', tokenize='trigram'
+    );
+    CREATE TRIGGER IF NOT EXISTS apps_ai AFTER INSERT ON apps BEGIN
+        INSERT INTO apps_fts (rowid, app_name, title, keywords, platforms, body)
+        VALUES (new.rowid, new.app_name, new.title, new.keywords, new.platforms,
+            new.body);
+    END;
+    CREATE TRIGGER IF NOT EXISTS apps_ad AFTER DELETE ON apps BEGIN
+        INSERT INTO apps_fts (apps_fts, rowid, app_name, title, keywords, platforms,
+            body)
+        VALUES ('delete', old.rowid, old.app_name, old.title, old.keywords,
+            old.platforms, old.body);
+    END;
+    CREATE TRIGGER IF NOT EXISTS apps_au AFTER UPDATE ON apps BEGIN
+        INSERT INTO apps_fts (apps_fts, rowid, app_name, title, keywords, platforms,
+            body)
+        VALUES ('delete', old.rowid, old.app_name, old.title, old.keywords,
+            old.platforms, old.body);
+        INSERT INTO apps_fts (rowid, app_name, title, keywords, platforms, body)
+        VALUES (new.rowid, new.app_name, new.title, new.keywords, new.platforms,
+            new.body);
+    END;
+    """
+    UPSERT = """
+    INSERT INTO apps (
+        path, article_id, article_title, article_url, released_date, title,
+        app_name, platforms, keywords, body, content_hash, updated_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (path) DO UPDATE SET
+        article_id = excluded.article_id,
+        article_title = excluded.article_title,
+        article_url = excluded.article_url,
+        released_date = excluded.released_date,
+        title = excluded.title,
+        app_name = excluded.app_name,
+        platforms = excluded.platforms,
+        keywords = excluded.keywords,
+        body = excluded.body,
+        content_hash = excluded.content_hash,
+        updated_at = excluded.updated_at
+    WHERE apps.content_hash != excluded.content_hash
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            self._conn.executescript(self.SCHEMA)
+        except sqlite3.OperationalError as e:
+            self._conn.close()
+            raise RuntimeError(
+                f"全文索引需要支持 FTS5 trigram 分词的 SQLite (>= 3.34): {e}"
+            ) from e
+
+    @staticmethod
+    def strip_frontmatter(content: str) -> str:
+        if content.startswith("---\n"):
+            end = content.find("\n---\n", 4)
+            if end != -1:
+                return content[end + 5 :]
+        return content
+
+    def upsert(self, records: list[dict[str, Any]]):
+        """
+        写入 sinks.app_record 生成的记录, 内容哈希未变化的 app 不更新
+        """
+        now = time.time()
+        values = [
+            (
+                r["path"],
+                r["article_id"],
+                r["article_title"],
+                r["article_url"],
+                r["released_date"],
+                r["title"],
+                r["app_name"],
+                json.dumps(r["platforms"], ensure_ascii=False),
+                json.dumps(r["keywords"], ensure_ascii=False),
+                self.strip_frontmatter(r["content"]),
+                hashlib.sha256(r["content"].encode("utf-8")).hexdigest(),
+                now,
+            )
+            for r in records
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(self.UPSERT, values)
+
+    def search(
+        self,
+        query: str = "",
+        platforms: list[str] | None = None,
+        keywords: list[str] | None = None,
+        start_date: str = "",
+        end_date: str = "",
+        limit: int = 20,
+    ) -> list[dict[str, Any]]:
+        """
+        query 中以空格分隔的词全部匹配, 按相关度排序; 无 query 时按发布日期倒序
+        platforms / keywords 中的值需全部匹配 (不区分大小写), 日期格式为 YYYY-MM-DD
+        """
+        terms = query.split()
+        fts_terms = [t for t in terms if len(t) >= self.MIN_MATCH_CHARS]
+        like_terms = [t for t in terms if len(t) < self.MIN_MATCH_CHARS]
+
+        where: list[str] = []
+        params: list[Any] = []
+        if fts_terms:
+            # 每个词加引号作为短语匹配, 避免被解析为 FTS5 查询语法
+            match = " AND ".join('"' + t.replace('"', '""') + '"' for t in fts_terms)
+            where.append("apps_fts MATCH ?")
+            params.append(match)
+        for term in like_terms:
+            where.append(
+                "(apps.app_name LIKE ? OR apps.title LIKE ? OR apps.keywords LIKE ?"
+                " OR apps.body LIKE ?)"
+            )
+            params.extend([f"%{term}%"] * 4)
+        for field, values in (("platforms", platforms), ("keywords", keywords)):
+            for value in values or []:
+                where.append(f"lower(apps.{field}) LIKE ?")
+                params.append(f"%{json.dumps(value.lower(), ensure_ascii=False)}%")
+        if start_date:
+            where.append("apps.released_date >= ?")
+            params.append(start_date)
+        if end_date:
+            where.append("apps.released_date <= ?")
+            params.append(end_date)
+
+        if fts_terms:
+            sql = (
+                "SELECT apps.*, snippet(apps_fts, 4, '[', ']', '...', 16) AS snippet"
+                " FROM apps_fts JOIN apps ON apps.rowid = apps_fts.rowid"
+            )
+            order = "bm25(apps_fts), apps.released_date DESC"
+        else:
+            sql = "SELECT apps.*, NULL AS snippet FROM apps"
+            order = "apps.released_date DESC"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {
+                "path": row["path"],
+                "app_name": row["app_name"],
+                "title": row["title"],
+                "platforms": json.loads(row["platforms"]),
+                "keywords": json.loads(row["keywords"]),
+                "released_date": row["released_date"],
+                "article_id": row["article_id"],
+                "article_title": row["article_title"],
+                "article_url": row["article_url"],
+                "snippet": row["snippet"],
+            }
+            for row in rows
+        ]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM apps").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
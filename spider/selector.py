@@ -0,0 +1,88 @@
+import hashlib
+import json
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from .data import JSONObjdctType
+from .parser import PaiAppParser, PaiFieldRule, parse_field_rules
+
+
+@dataclass(frozen=True)
+class PaiArticleSelector:
+    """
+    文章选择器: 标题包含全部关键词的文章交给 parser 解析, app 保存在输出目录的 subdir 下
+    parser 为 None 时使用流水线的 parser; 所有选择器共用同一次文章列表扫描
+    """
+
+    name: str
+    keywords: tuple[str, ...]
+    subdir: str = ""
+    parser: PaiAppParser | None = None
+
+    def matches(self, article: JSONObjdctType) -> bool:
+        title = str(article.get("title", ""))
+        return all(keyword in title for keyword in self.keywords)
+
+
+PAIPING_SELECTOR = PaiArticleSelector(name="paiping", keywords=("派评", "近期值得关注"))
+
+SELECTORS: dict[str, PaiArticleSelector] = {
+    PAIPING_SELECTOR.name: PAIPING_SELECTOR,
+}
+
+
+def parse_config_hash(
+    parser: PaiAppParser, selectors: Iterable[PaiArticleSelector]
+) -> str:
+    """
+    默认 parser 与各选择器配置的哈希, 修改字段规则、解析后端或选择器后
+    抓取清单中按旧配置处理的文章不再视为未变化
+    """
+    config = [
+        parser.fingerprint(),
+        sorted(
+            [s.name, list(s.keywords), s.subdir, (s.parser or parser).fingerprint()]
+            for s in selectors
+        ),
+    ]
+    text = json.dumps(config, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def parse_selectors(
+    spec: str,
+    backend: str = "html.parser",
+    field_rules: Iterable[PaiFieldRule] = PaiAppParser.FIELD_RULES,
+) -> list[PaiArticleSelector]:
+    """
+    解析逗号分隔的选择器: 内置选择器写名称 (如 paiping),
+    自定义选择器写为 名称=关键词1+关键词2, app 保存在输出目录下以名称命名的子目录中
+    自定义选择器可在关键词后以 @字段名=标签;字段名=标签 指定该系列的附加字段,
+    此时使用单独的 parser, 字段规则追加在 field_rules 之后
+    """
+    selectors: list[PaiArticleSelector] = []
+    for item in (s.strip() for s in spec.split(",")):
+        if not item:
+            continue
+        if "=" not in item:
+            if item not in SELECTORS:
+                raise ValueError(f"未知选择器 {item}, 可选 {list(SELECTORS)}")
+            selectors.append(SELECTORS[item])
+            continue
+        name, keywords = (s.strip() for s in item.split("=", 1))
+        keywords, _, fields = keywords.partition("@")
+        parts = tuple(k.strip() for k in keywords.split("+") if k.strip())
+        if not name or not parts:
+            raise ValueError(f"选择器 {item} 格式错误, 应为 名称=关键词1+关键词2")
+        parser = None
+        if fields.strip():
+            rules = [*field_rules, *parse_field_rules(fields, sep=";")]
+            parser = PaiAppParser(backend=backend, field_rules=rules)
+        selectors.append(
+            PaiArticleSelector(name=name, keywords=parts, subdir=name, parser=parser)
+        )
+
+    names = [s.name for s in selectors]
+    if len(set(names)) != len(names):
+        raise ValueError(f"选择器名称重复 {names}")
+    return selectors
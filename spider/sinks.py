@@ -0,0 +1,372 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any
+
+from .data import PaiAppData
+from .manifest import PaiCrawlManifest
+from .search import PaiSearchIndex
+from .util import image_filename
+from .writer import PaiFileWriter
+
+
+def app_record(app_data: PaiAppData, path: str) -> dict[str, Any]:
+    """
+    app 的扁平记录, path 为 markdown 文件相对输出目录的路径
+    """
+    article = app_data.article
+    frontmatter = app_data.frontmatter
+    # 图片与 markdown 文件保存在同一目录 (含选择器子目录) 下
+    image_dir = os.path.join(os.path.dirname(path), "images")
+    return {
+        "path": path,
+        "article_id": article.id,
+        "article_title": article.title,
+        "article_url": article.url,
+        "released_time": article.release_time,
+        "released_date": article.released_date,
+        "title": frontmatter.title if frontmatter else app_data.file_title,
+        "app_name": frontmatter.app_name if frontmatter else app_data.file_title,
+        "platforms": list(app_data.platforms),
+        "keywords": list(frontmatter.keywords) if frontmatter else [],
+        "images": [
+            {
+                "url": url,
+                "path": os.path.join(
+                    image_dir, app_data.image_names.get(url) or image_filename(url)
+                ),
+            }
+            for url in app_data.img_list
+        ],
+        "content": app_data.content,
+    }
+
+
+class PaiAppSink(ABC):
+    """
+    PaiAppSaver 的输出目标, 每个 app 在图片下载完成后写入所有输出目标
+    """
+
+    name = ""
+    # 同一台机器上的多个进程 (分片抓取的 worker) 能否同时写入同一个输出目标
+    multi_process = True
+    # flush 之后已写入的记录在进程中断时不会丢失
+    durable_flush = True
+
+    @abstractmethod
+    async def write(self, app_data: PaiAppData, filepath: str):
+        ...
+
+    async def flush(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class PaiMarkdownSink(PaiAppSink):
+    """
+    每个 app 一个 markdown 文件, 内容未变化时跳过写入
+    """
+
+    name = "markdown"
+
+    def __init__(
+        self, writer: PaiFileWriter, manifest: PaiCrawlManifest | None = None
+    ):
+        self.writer = writer
+        self.manifest = manifest
+
+    async def write(self, app_data: PaiAppData, filepath: str):
+        filename = os.path.basename(filepath)
+        content = app_data.content
+        content_hash = None
+        if self.manifest is not None:
+            content_hash = self.manifest.hash_text(content)
+            if await asyncio.to_thread(
+                self.manifest.is_file_unchanged, filepath, content_hash
+            ):
+                logging.info(f"Saver: 文件内容未变化, 跳过 {filename}")
+                return
+
+        await self.writer.write_text(filepath, content)
+        logging.info(f"Saver: 保存文章 {filename}")
+
+        if self.manifest is not None and content_hash is not None:
+            await asyncio.to_thread(
+                self.manifest.record_file, filepath, content_hash, app_data.article.id
+            )
+
+
+class PaiBufferedSink(PaiAppSink):
+    """
+    汇总输出目标的基类: 记录先缓存在内存中, 每 batch_size 条在线程中批量写入一次
+    """
+
+    def __init__(self, path: str, output_dir: str, batch_size: int = 256):
+        self.path = path
+        self.output_dir = output_dir
+        self.batch_size = max(1, batch_size)
+        self._rows: list[dict[str, Any]] = []
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    async def write(self, app_data: PaiAppData, filepath: str):
+        self._rows.append(
+            app_record(app_data, os.path.relpath(filepath, self.output_dir))
+        )
+        if len(self._rows) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        rows, self._rows = self._rows, []
+        if rows:
+            await asyncio.to_thread(self._flush_locked, rows)
+
+    async def close(self):
+        await self.flush()
+        await asyncio.to_thread(self._close_locked)
+
+    def _flush_locked(self, rows: list[dict[str, Any]]):
+        with self._lock:
+            self._write_rows(rows)
+
+    def _close_locked(self):
+        with self._lock:
+            self._close()
+
+    @abstractmethod
+    def _write_rows(self, rows: list[dict[str, Any]]):
+        ...
+
+    def _close(self):
+        pass
+
+
+class PaiSQLiteSink(PaiBufferedSink):
+    """
+    全部 app 保存在一个 SQLite 数据库中, 以 markdown 文件路径为主键, 重复抓取时覆盖
+    列表字段以 JSON 文本保存
+    """
+
+    name = "sqlite"
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS apps (
+        path TEXT PRIMARY KEY,
+        article_id INTEGER NOT NULL,
+        article_title TEXT,
+        article_url TEXT,
+        released_time TEXT,
+        released_date TEXT,
+        title TEXT,
+        app_name TEXT,
+        platforms TEXT,
+        keywords TEXT,
+        images TEXT,
+        content TEXT,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS apps_article_id ON apps (article_id);
+    CREATE INDEX IF NOT EXISTS apps_released_date ON apps (released_date);
+    """
+    COLUMNS = (
+        "path",
+        "article_id",
+        "article_title",
+        "article_url",
+        "released_time",
+        "released_date",
+        "title",
+        "app_name",
+        "platforms",
+        "keywords",
+        "images",
+        "content",
+    )
+    JSON_COLUMNS = ("platforms", "keywords", "images")
+
+    def __init__(self, path: str, output_dir: str, batch_size: int = 256):
+        super().__init__(path, output_dir, batch_size)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def _write_rows(self, rows: list[dict[str, Any]]):
+        now = time.time()
+        values = [
+            tuple(
+                json.dumps(row[c], ensure_ascii=False)
+                if c in self.JSON_COLUMNS
+                else row[c]
+                for c in self.COLUMNS
+            )
+            + (now,)
+            for row in rows
+        ]
+        columns = ", ".join(self.COLUMNS + ("updated_at",))
+        placeholders = ", ".join("?" * (len(self.COLUMNS) + 1))
+        sql = f"INSERT OR REPLACE INTO apps ({columns}) VALUES ({placeholders})"
+        with self._conn:
+            self._conn.executemany(sql, values)
+
+    def _close(self):
+        self._conn.close()
+
+
+class PaiJsonlSink(PaiBufferedSink):
+    """
+    每个 app 一行 JSON 追加写入; 运行结束时去掉同一 path 被重新抓取前的旧记录,
+    每个 path 只保留最后一条
+    """
+
+    name = "jsonl"
+    multi_process = False
+
+    def __init__(self, path: str, output_dir: str, batch_size: int = 256):
+        super().__init__(path, output_dir, batch_size)
+        self._written = 0
+
+    def _write_rows(self, rows: list[dict[str, Any]]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        self._written += len(rows)
+
+    def _close(self):
+        if self._written:
+            self._compact()
+
+    def _compact(self):
+        """
+        同一 path 只保留最后一条记录, 没有重复时不改写文件
+        """
+        with open(self.path, encoding="utf-8") as f:
+            lines = [line for line in f if line.strip()]
+        last: dict[str, int] = {}
+        for i, line in enumerate(lines):
+            last[json.loads(line)["path"]] = i
+        if len(last) == len(lines):
+            return
+        keep = set(last.values())
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(line for i, line in enumerate(lines) if i in keep)
+        os.replace(tmp_path, self.path)
+
+
+class PaiParquetSink(PaiBufferedSink):
+    """
+    列式 Parquet 文件, 每批记录写为一个 row group (需安装 pyarrow)
+    本次运行处理的 app 先写入临时文件, 结束时与已有文件按 path 合并
+    (同一 path 以本次为准, 其他记录保留), 写完后原子替换
+    """
+
+    name = "parquet"
+    multi_process = False
+    # 行组先写入临时文件, 关闭时才替换目标文件
+    durable_flush = False
+
+    def __init__(self, path: str, output_dir: str, batch_size: int = 1024):
+        super().__init__(path, output_dir, batch_size)
+        try:
+            import pyarrow as pa
+            import pyarrow.compute as pc
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("输出 Parquet 需要安装 pyarrow") from e
+        self._pa = pa
+        self._pc = pc
+        self._pq = pq
+        self._schema = pa.schema(
+            [
+                ("path", pa.string()),
+                ("article_id", pa.int64()),
+                ("article_title", pa.string()),
+                ("article_url", pa.string()),
+                ("released_time", pa.string()),
+                ("released_date", pa.string()),
+                ("title", pa.string()),
+                ("app_name", pa.string()),
+                ("platforms", pa.list_(pa.string())),
+                ("keywords", pa.list_(pa.string())),
+                (
+                    "images",
+                    pa.list_(pa.struct([("url", pa.string()), ("path", pa.string())])),
+                ),
+                ("content", pa.string()),
+            ]
+        )
+        self._tmp_path = f"{path}.tmp"
+        self._merge_path = f"{path}.merge.tmp"
+        self._writer = None
+
+    def _write_rows(self, rows: list[dict[str, Any]]):
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(
+                self._tmp_path, self._schema, compression="zstd"
+            )
+        self._writer.write_table(
+            self._pa.Table.from_pylist(rows, schema=self._schema)
+        )
+
+    def _close(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        if os.path.exists(self.path):
+            self._merge_existing()
+        os.replace(self._tmp_path, self.path)
+
+    def _merge_existing(self):
+        """
+        将已有文件中本次未处理的记录逐个 row group 追加到本次结果之后, 合并结果替换临时文件
+        """
+        current = self._pq.ParquetFile(self._tmp_path)
+        updated = self._pq.read_table(self._tmp_path, columns=["path"])[
+            "path"
+        ].combine_chunks()
+        existing = self._pq.ParquetFile(self.path)
+        with self._pq.ParquetWriter(
+            self._merge_path, self._schema, compression="zstd"
+        ) as writer:
+            for i in range(current.num_row_groups):
+                writer.write_table(current.read_row_group(i))
+            for i in range(existing.num_row_groups):
+                table = existing.read_row_group(i, columns=self._schema.names)
+                keep = self._pc.invert(
+                    self._pc.is_in(table["path"], value_set=updated)
+                )
+                writer.write_table(table.filter(keep).cast(self._schema))
+        os.replace(self._merge_path, self._tmp_path)
+
+
+class PaiSearchSink(PaiBufferedSink):
+    """
+    增量维护全文索引, 只有内容变化的 app 会更新索引
+    """
+
+    name = "search"
+
+    def __init__(self, path: str, output_dir: str, batch_size: int = 256):
+        super().__init__(path, output_dir, batch_size)
+        self.index = PaiSearchIndex(path)
+
+    def _write_rows(self, rows: list[dict[str, Any]]):
+        self.index.upsert(rows)
+
+    def _close(self):
+        self.index.close()
+
+
+SINKS: dict[str, type[PaiBufferedSink]] = {
+    PaiSearchSink.name: PaiSearchSink,
+    PaiSQLiteSink.name: PaiSQLiteSink,
+    PaiJsonlSink.name: PaiJsonlSink,
+    PaiParquetSink.name: PaiParquetSink,
+}
@@ -1,10 +1,16 @@
 import asyncio
 import datetime as dt
+import hashlib
 import logging
+import os
+import shutil
+from email.utils import parsedate_to_datetime
 
 import aiohttp
 import requests
 
+from .data import JSONObjdctType
+
 
 def date_format(d: dt.datetime) -> str:
     return d.strftime("%Y-%m-%d")
@@ -14,6 +20,54 @@ def datetime_format(d: dt.datetime) -> str:
     return d.strftime("%Y-%m-%d %H:%M:%S")
 
 
+def article_modify_time(article: JSONObjdctType) -> int | None:
+    """
+    文章列表 / 文章详情中的修改时间 (接口字段为 modify_time), 没有时返回 None
+    """
+    value = article.get("modify_time")
+    return int(value) if value is not None else None
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    解析 Retry-After 响应头, 支持秒数和 HTTP 日期两种格式
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    # -0000 时区偏移会得到 naive datetime, 按 UTC 处理
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=dt.timezone.utc)
+    return max(0.0, (retry_at - dt.datetime.now(dt.timezone.utc)).total_seconds())
+
+
+def image_filename(url: str) -> str:
+    """
+    图片在日期目录 images/ 下的文件名
+    """
+    return url.split("?")[0].split("/")[-1]
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """
+    以硬链接引用 src, 不支持硬链接时复制, dst 已存在时不做处理
+    """
+    if os.path.exists(dst):
+        return
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        return
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
 def fetch_image_bytes(url, timeout=10, headers=None) -> bytes:
     headers = headers or {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
@@ -33,18 +87,55 @@ def fetch_image_bytes(url, timeout=10, headers=None) -> bytes:
     return resp.content
 
 
-async def fetch_image_bytes_async(
+async def download_image_async(
     session: aiohttp.ClientSession,
     url: str,
-    timeout: int = 10,
-) -> bytes:
+    path: str,
+    timeout: aiohttp.ClientTimeout | int = 10,
+    chunk_size: int = 64 * 1024,
+    max_bytes: int = 50 * 1024 * 1024,
+) -> str:
+    """
+    流式下载图片, 分块写入临时文件, 校验长度后原子重命名为 path
+    返回图片内容的 sha256
+    """
+    tmp_path = f"{path}.part"
     try:
         async with session.get(url, timeout=timeout) as resp:
             resp.raise_for_status()
             content_type = resp.headers.get("Content-Type", "")
             if not content_type.startswith("image/"):
                 raise ValueError(f"url 无法指向图片: {content_type}")
-            return await resp.read()
+            expected = resp.content_length
+            if expected is not None and expected > max_bytes:
+                raise ValueError(f"图片大小 {expected} 超出上限 {max_bytes}")
+
+            digest = hashlib.sha256()
+            size = 0
+            f = await asyncio.to_thread(open, tmp_path, "wb")
+            try:
+                async for chunk in resp.content.iter_chunked(chunk_size):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"图片大小超出上限 {max_bytes}")
+                    digest.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+
+            # 压缩传输时 Content-Length 为压缩后的长度, 无法校验
+            if (
+                expected is not None
+                and "Content-Encoding" not in resp.headers
+                and size != expected
+            ):
+                raise aiohttp.ClientPayloadError(f"图片不完整: {size}/{expected}")
+
+        await asyncio.to_thread(os.replace, tmp_path, path)
+        return digest.hexdigest()
     except asyncio.TimeoutError as e:
         logging.error(f"图片下载超时: {url}")
         raise TimeoutError(url) from e
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
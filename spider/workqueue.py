@@ -0,0 +1,205 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass
+class PaiShard:
+    id: int
+    # [(文章 id, 文章列表中的 modify_time)]
+    articles: list[tuple[int, int | None]]
+    retries: int
+
+
+class PaiWorkQueue:
+    """
+    分片抓取的共享任务队列, 以 SQLite 文件保存, 由同一台机器上的 worker 进程共享
+    coordinator 将时间范围内的目标文章按 shard_size 切分为分片写入队列,
+    各 worker 以租约方式领取分片, 超过租约时间未完成的分片可被其他 worker 重新领取
+    领取与完成分片在 BEGIN IMMEDIATE 事务中进行
+    """
+
+    FILENAME = ".work_queue.sqlite3"
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS shards (
+        id INTEGER PRIMARY KEY,
+        articles TEXT NOT NULL,
+        status TEXT NOT NULL,
+        worker TEXT,
+        lease_until REAL,
+        retries INTEGER NOT NULL DEFAULT 0,
+        result TEXT,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS shards_status ON shards (status, lease_until);
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 600, max_retries: int = 2):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_retries = max_retries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.executescript(self.SCHEMA)
+
+    def plan(self, articles: list[tuple[int, int | None]], shard_size: int) -> int:
+        """
+        清空队列并按 shard_size 篇文章一个分片写入, 返回分片数
+        仍有 worker 持有有效租约时拒绝重新规划
+        """
+        shard_size = max(1, shard_size)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                (running,) = self._conn.execute(
+                    "SELECT count(*) FROM shards WHERE status = ? AND lease_until > ?",
+                    (self.RUNNING, now),
+                ).fetchone()
+                if running:
+                    raise RuntimeError(f"仍有 {running} 个分片正在处理, 无法重新规划")
+                self._conn.execute("DELETE FROM shards")
+                self._conn.executemany(
+                    "INSERT INTO shards (articles, status, updated_at) VALUES (?, ?, ?)",
+                    [
+                        (json.dumps(articles[i : i + shard_size]), self.PENDING, now)
+                        for i in range(0, len(articles), shard_size)
+                    ],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return (len(articles) + shard_size - 1) // shard_size
+
+    def claim(self, worker: str) -> PaiShard | None:
+        """
+        领取一个待处理或租约已过期的分片, 没有可领取的分片时返回 None
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, articles, retries FROM shards"
+                    " WHERE status = ? OR (status = ? AND lease_until <= ?)"
+                    " ORDER BY id LIMIT 1",
+                    (self.PENDING, self.RUNNING, now),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE shards SET status = ?, worker = ?, lease_until = ?,"
+                        " updated_at = ? WHERE id = ?",
+                        (self.RUNNING, worker, now + self.lease_seconds, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        articles = [(int(aid), modified) for aid, modified in json.loads(row[1])]
+        return PaiShard(id=row[0], articles=articles, retries=row[2])
+
+    def renew(self, shard: PaiShard, worker: str) -> bool:
+        """
+        延长租约, 分片已被其他 worker 重新领取时返回 False
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE shards SET lease_until = ?, updated_at = ?"
+                " WHERE id = ? AND worker = ? AND status = ?",
+                (now + self.lease_seconds, now, shard.id, worker, self.RUNNING),
+            )
+        return cursor.rowcount > 0
+
+    def complete(
+        self,
+        shard: PaiShard,
+        worker: str,
+        result: dict[str, Any],
+        failed_ids: set[int],
+    ) -> bool:
+        """
+        记录分片结果; 处理失败的文章在重试次数内作为新分片重新入队
+        租约已过期并被其他 worker 接管时不记录, 返回 False
+        """
+        now = time.time()
+        retry = [a for a in shard.articles if a[0] in failed_ids]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.execute(
+                    "UPDATE shards SET status = ?, result = ?, updated_at = ?"
+                    " WHERE id = ? AND worker = ? AND status = ?",
+                    (
+                        self.DONE,
+                        json.dumps(result),
+                        now,
+                        shard.id,
+                        worker,
+                        self.RUNNING,
+                    ),
+                )
+                owned = cursor.rowcount > 0
+                if owned and retry and shard.retries < self.max_retries:
+                    self._conn.execute(
+                        "INSERT INTO shards (articles, status, retries, updated_at)"
+                        " VALUES (?, ?, ?, ?)",
+                        (json.dumps(retry), self.PENDING, shard.retries + 1, now),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return owned
+
+    def next_lease_expiry(self) -> float | None:
+        """
+        其他 worker 持有的最早到期的租约, 没有进行中的分片时返回 None
+        """
+        with self._lock:
+            (lease_until,) = self._conn.execute(
+                "SELECT min(lease_until) FROM shards WHERE status = ?",
+                (self.RUNNING,),
+            ).fetchone()
+        return lease_until
+
+    def summary(self) -> dict[str, Any]:
+        """
+        各状态的分片数, 以及已完成分片的统计汇总
+        """
+        with self._lock:
+            counts = dict(
+                self._conn.execute(
+                    "SELECT status, count(*) FROM shards GROUP BY status"
+                ).fetchall()
+            )
+            results = self._conn.execute(
+                "SELECT worker, result FROM shards WHERE status = ?", (self.DONE,)
+            ).fetchall()
+        totals: dict[str, int] = {}
+        workers: set[str] = set()
+        for worker, result in results:
+            workers.add(worker)
+            for key, value in json.loads(result or "{}").items():
+                if isinstance(value, int):
+                    totals[key] = totals.get(key, 0) + value
+        return {"shards": counts, "workers": len(workers), **totals}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
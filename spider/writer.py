@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+from .metrics import PaiMetrics
+
+
+@dataclass
+class PaiWriteJob:
+    path: str
+    content: str
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future[int]
+
+
+class PaiFileWriter:
+    """
+    后台写文件线程: 写入请求经队列批量处理, 每个文件先写入同目录下的临时文件再原子替换,
+    崩溃后不会留下写了一半的目标文件, 已创建的目录会被缓存以避免重复 mkdir
+    fsync 策略: none 不刷盘; batch 文件内容刷盘, 同一批中每个目录只刷一次;
+    always 每个文件及其所在目录都单独刷盘
+    """
+
+    FSYNC_POLICIES = ("none", "batch", "always")
+    TEMP_SUFFIX = ".tmp"
+    STALE_SECONDS = 60
+
+    def __init__(
+        self,
+        fsync: str = "none",
+        batch_size: int = 64,
+        metrics: PaiMetrics | None = None,
+    ):
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f"不支持的 fsync 策略 {fsync}, 可选 {self.FSYNC_POLICIES}")
+        self.fsync = fsync
+        self.batch_size = max(1, batch_size)
+        self.metrics = metrics if metrics is not None else PaiMetrics()
+
+        self._queue: queue.Queue[PaiWriteJob | None] = queue.Queue()
+        self._dirs: set[str] = set()
+        # 写线程中已清理过残留临时文件的目录
+        self._cleaned_dirs: set[str] = set()
+        self._dirs_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._created_at = time.time()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="PaiFileWriter", daemon=True
+                )
+                self._thread.start()
+
+    async def makedirs(self, path: str):
+        """
+        创建目录, 已创建过的目录直接返回, 不再切换线程
+        """
+        if path in self._dirs:
+            return
+        await asyncio.to_thread(self._makedirs, path)
+
+    def _makedirs(self, path: str):
+        if path in self._dirs:
+            return
+        os.makedirs(path, exist_ok=True)
+        with self._dirs_lock:
+            self._dirs.add(path)
+
+    async def write_text(self, path: str, content: str) -> int:
+        """
+        提交写入请求并等待写入完成, 返回写入的字节数
+        """
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        job = PaiWriteJob(path, content, loop, loop.create_future())
+        self._queue.put(job)
+        return await job.future
+
+    def close(self):
+        """
+        写完队列中剩余的请求后停止写线程
+        """
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            jobs = [job for job in batch if job is not None]
+            if jobs:
+                self._write_batch(jobs)
+            if len(jobs) < len(batch):
+                return
+
+    def _write_batch(self, jobs: list[PaiWriteJob]):
+        staged: list[tuple[PaiWriteJob, str, int, float]] = []
+        for job in jobs:
+            start = time.perf_counter()
+            try:
+                tmp_path, nbytes = self._write_temp(job)
+            except Exception as e:
+                self.metrics.add_error("write")
+                self._resolve(job, error=e)
+                continue
+            staged.append((job, tmp_path, nbytes, time.perf_counter() - start))
+
+        synced_dirs: set[str] = set()
+        for job, tmp_path, nbytes, seconds in staged:
+            start = time.perf_counter()
+            try:
+                os.replace(tmp_path, job.path)
+                directory = os.path.dirname(job.path) or "."
+                if self.fsync == "always" or (
+                    self.fsync == "batch" and directory not in synced_dirs
+                ):
+                    self._fsync_dir(directory)
+                    synced_dirs.add(directory)
+            except Exception as e:
+                self.metrics.add_error("write")
+                self._remove_quietly(tmp_path)
+                self._resolve(job, error=e)
+                continue
+            seconds += time.perf_counter() - start
+            self.metrics.observe("write", seconds, nbytes)
+            self._resolve(job, result=nbytes)
+
+    def _write_temp(self, job: PaiWriteJob) -> tuple[str, int]:
+        directory = os.path.dirname(job.path) or "."
+        self._makedirs(directory)
+        self._clean_stale_temp(directory)
+
+        name = os.path.basename(job.path)
+        tmp_path = os.path.join(
+            directory, f".{name}.{uuid.uuid4().hex[:8]}{self.TEMP_SUFFIX}"
+        )
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(job.content)
+                nbytes = f.tell()
+                if self.fsync != "none":
+                    f.flush()
+                    os.fsync(f.fileno())
+        except BaseException:
+            self._remove_quietly(tmp_path)
+            raise
+        return tmp_path, nbytes
+
+    def _clean_stale_temp(self, directory: str):
+        """
+        每个目录首次写入时删除之前运行崩溃残留的临时文件,
+        只删除本写线程创建之前已存在一段时间的, 避免误删其他进程正在写的文件
+        """
+        if directory in self._cleaned_dirs:
+            return
+        self._cleaned_dirs.add(directory)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        for name in names:
+            if not (name.startswith(".") and name.endswith(self.TEMP_SUFFIX)):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(path) > self._created_at - self.STALE_SECONDS:
+                    continue
+            except OSError:
+                continue
+            logging.info(f"Writer: 删除残留的临时文件 {path}")
+            self._remove_quietly(path)
+
+    @staticmethod
+    def _fsync_dir(directory: str):
+        if os.name == "nt":
+            return
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _remove_quietly(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _resolve(
+        job: PaiWriteJob, result: int | None = None, error: Exception | None = None
+    ):
+        def set_result():
+            if job.future.done():
+                return
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+
+        try:
+            job.loop.call_soon_threadsafe(set_result)
+        except RuntimeError:
+            # 事件循环已关闭, 没有等待者
+            pass
@@ -0,0 +1,94 @@
+import asyncio
+import os
+
+from spider import (
+    PaiAppIndex,
+    PaiAppParser,
+    PaiAppSaver,
+    PaiAppSink,
+    PaiFileWriter,
+    PaiMarkdownSink,
+)
+
+
+class FailingSink(PaiAppSink):
+    name = "failing"
+
+    async def write(self, app_data, filepath: str):
+        raise OSError("disk full")
+
+
+def parse_app(article_id: int, day: int):
+    body = "<p>同一个 app 在多篇文章中出现</p><ul><li>平台：iOS</li></ul>"
+    (app,) = PaiAppParser().parse_apps(
+        {
+            "id": article_id,
+            "title": f"派评 | 近期值得关注的 App {article_id}",
+            "released_time": 1718841600 + day * 86400,
+            "body": "",
+            "body_extends": [
+                {"title": "", "body": "<p>编注</p>"},
+                {"title": "Ivory：效率利器", "body": body},
+                {"title": "", "body": "<p>end</p>"},
+            ],
+        }
+    )
+    return app
+
+
+def markdown_files(output_dir: str) -> list[str]:
+    return sorted(
+        os.path.relpath(os.path.join(root, name), output_dir)
+        for root, _, names in os.walk(output_dir)
+        for name in names
+        if name.endswith(".md")
+    )
+
+
+def test_concurrent_duplicates_are_skipped(tmp_path):
+    index = PaiAppIndex(str(tmp_path), action="skip")
+    writer = PaiFileWriter()
+    saver = PaiAppSaver(str(tmp_path), writer=writer, app_index=index)
+    apps = [parse_app(article_id, day) for day, article_id in enumerate((1, 2, 3))]
+
+    async def main():
+        # 与流水线相同: 所有 app 都在任何一个保存完成之前认领
+        resolved = [saver.resolve_duplicate(app) for app in apps]
+        assert resolved[0] is apps[0]
+        assert resolved[1:] == [None, None]
+        await saver.save_app_async(resolved[0], asyncio.Semaphore(4))
+
+    asyncio.run(main())
+    writer.close()
+    index.close()
+
+    assert markdown_files(str(tmp_path)) == [
+        os.path.relpath(saver.app_filepath(apps[0]), str(tmp_path))
+    ]
+    assert index.stats == {"recorded": 1, "aliased": 0, "skipped": 2}
+
+
+def test_failed_save_releases_reservation(tmp_path):
+    index = PaiAppIndex(str(tmp_path), action="skip")
+    writer = PaiFileWriter()
+    saver = PaiAppSaver(
+        str(tmp_path), writer=writer, sinks=[FailingSink()], app_index=index
+    )
+    first, second = parse_app(1, 0), parse_app(2, 1)
+
+    async def main():
+        assert saver.resolve_duplicate(first) is first
+        await saver.save_app_async(first, asyncio.Semaphore(4))
+        # 首次保存失败后, 同一 app 再次出现时重新保存
+        saver.sinks = [PaiMarkdownSink(writer)]
+        assert saver.resolve_duplicate(second) is second
+        await saver.save_app_async(second, asyncio.Semaphore(4))
+
+    asyncio.run(main())
+    writer.close()
+    index.close()
+
+    assert markdown_files(str(tmp_path)) == [
+        os.path.relpath(saver.app_filepath(second), str(tmp_path))
+    ]
+    assert index.stats["recorded"] == 1
@@ -0,0 +1,76 @@
+import random
+
+import pytest
+import yaml
+
+from spider.data import PaiAppMdFrontmatter, dump_yaml_mapping
+
+# 容易触发引号、折行或类型解析的片段
+PIECES = [
+    "a", "Z", "0", "1.5", "0x1F", "1e3", "-", "- ", "? ", ": ", ":", "#", " #", "'", '"',
+    "\\", "!", "&", "*", "%", "@", "`", "|", ">", "{", "}", "[", "]", ",", " ", "  ",
+    "\t", "\n", "\xa0", "　", " ", "﻿", "\x85", "\x07", "yes", "No",
+    "null", "~", "true", "On", "2024-01-01", "12:30", "派评", "効率", "🚀", "é",
+    "App", "iOS", "macOS", "https://sspai.com/post/1", "x" * 40,
+]
+
+
+def random_text(rng: random.Random) -> str:
+    return "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 6)))
+
+
+def random_value(rng: random.Random):
+    kind = rng.random()
+    if kind < 0.15:
+        return rng.randint(-(10**6), 10**12)
+    if kind < 0.4:
+        return [random_text(rng) for _ in range(rng.randint(0, 4))]
+    return random_text(rng)
+
+
+def safe_dump(data: dict) -> str:
+    return yaml.safe_dump(data, sort_keys=False, allow_unicode=True).rstrip()
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_dump_yaml_mapping_matches_safe_dump(seed: int):
+    rng = random.Random(seed)
+    fast_paths = 0
+    for _ in range(2000):
+        data = {
+            rng.choice(["title", "app_name", "price", "x-y", random_text(rng)]):
+            random_value(rng)
+            for _ in range(rng.randint(1, 6))
+        }
+        fast = dump_yaml_mapping(data)
+        if fast is None:
+            continue
+        fast_paths += 1
+        assert fast == safe_dump(data), data
+    # 大部分样本应走快速路径, 否则这个测试没有意义
+    assert fast_paths > 500
+
+
+@pytest.mark.parametrize(
+    "value",
+    ["Ivory\xa0", "Ivory　", "'quoted'", "a: b", "- item", "yes", "12", ""],
+)
+def test_frontmatter_edge_values(value: str):
+    frontmatter = PaiAppMdFrontmatter(
+        title=value,
+        app_name=value,
+        platforms=[value],
+        keywords=[],
+        article_title="派评 | 近期值得关注的 App",
+        article_id=1,
+        article_url="https://sspai.com/post/1",
+        released_time="2024-04-05 19:34:38",
+        extra={"price": [value]},
+    )
+    data = {
+        k: v
+        for k, v in frontmatter.__dict__.items()
+        if v is not None and k != "extra"
+    }
+    data.update(frontmatter.extra)
+    assert frontmatter.__yaml__() == safe_dump(data)
@@ -0,0 +1,30 @@
+import asyncio
+
+from spider import PaiAdaptiveLimiter
+
+
+async def slow_requests(limiter: PaiAdaptiveLimiter, count: int, measure: bool):
+    async def request():
+        async with limiter.track(measure_latency=measure):
+            await asyncio.sleep(0.02)
+
+    await asyncio.gather(*(request() for _ in range(count)))
+
+
+def test_slow_images_do_not_block_window_growth():
+    async def main():
+        limiter = PaiAdaptiveLimiter(initial=2, max_limit=8, latency_threshold=0.01)
+        await slow_requests(limiter, 40, measure=True)
+        assert limiter.window == 2
+
+        await slow_requests(limiter, 40, measure=False)
+        assert limiter.window > 4
+
+    asyncio.run(main())
+
+
+def test_window_grows_up_to_max_limit():
+    limiter = PaiAdaptiveLimiter(initial=2, max_limit=8)
+    for _ in range(200):
+        limiter.on_success(0.1)
+    assert limiter.window == 8
@@ -0,0 +1,54 @@
+import sqlite3
+
+from spider import PaiAppParser, PaiCrawlManifest
+from spider.parser import parse_field_rules
+from spider.selector import parse_config_hash, parse_selectors
+
+
+def test_config_change_invalidates_unchanged_articles(tmp_path):
+    app_file = tmp_path / "2024-06-20" / "app.md"
+    app_file.parent.mkdir()
+    app_file.write_text("x", encoding="utf-8")
+    manifest = PaiCrawlManifest(str(tmp_path))
+    manifest.record_article(1, 100, "body", "2024-06-20", [str(app_file)], "config-a")
+
+    assert manifest.is_article_unchanged(1, 100, "config-a")
+    assert manifest.is_body_unchanged(1, "body", "config-a")
+    assert not manifest.is_article_unchanged(1, 100, "config-b")
+    assert not manifest.is_body_unchanged(1, "body", "config-b")
+    manifest.close()
+
+
+def test_old_manifest_is_migrated(tmp_path):
+    conn = sqlite3.connect(tmp_path / PaiCrawlManifest.FILENAME)
+    conn.execute(
+        "CREATE TABLE articles (id INTEGER PRIMARY KEY, modified_time INTEGER,"
+        " body_hash TEXT, released_date TEXT, app_files TEXT NOT NULL,"
+        " updated_at REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO articles VALUES (1, 100, 'body', '2024-06-20', '[]', 0)")
+    conn.commit()
+    conn.close()
+
+    manifest = PaiCrawlManifest(str(tmp_path))
+    assert not manifest.is_article_unchanged(1, 100, "config-a")
+    manifest.record_article(1, 100, "body", "2024-06-20", [], "config-a")
+    assert manifest.is_article_unchanged(1, 100, "config-a")
+    manifest.close()
+
+
+def test_parse_config_hash_covers_fields_backend_and_selectors():
+    parser = PaiAppParser()
+    base = parse_config_hash(parser, parse_selectors("paiping"))
+
+    assert base == parse_config_hash(PaiAppParser(), parse_selectors("paiping"))
+    extra = PaiAppParser(
+        field_rules=[*PaiAppParser.FIELD_RULES, *parse_field_rules("price=价格")]
+    )
+    assert parse_config_hash(extra, parse_selectors("paiping")) != base
+    selectors = parse_selectors("paiping,roundup=推荐")
+    assert parse_config_hash(parser, selectors) != base
+    selectors = parse_selectors("paiping,roundup=推荐@price=价格")
+    assert parse_config_hash(parser, selectors) != parse_config_hash(
+        parser, parse_selectors("paiping,roundup=推荐")
+    )
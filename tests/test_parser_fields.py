@@ -0,0 +1,49 @@
+import pytest
+
+from spider import PaiAppParser
+from spider.parser import PaiFieldRule, parse_field_rules
+
+
+def article(li: str) -> dict:
+    return {
+        "id": 1,
+        "title": "派评 | 近期值得关注的 App",
+        "released_time": 1712345678,
+        "body": "",
+        "body_extends": [
+            {"title": "", "body": "<p>编注</p>"},
+            {"title": "Ivory：效率利器", "body": f"<p>正文</p><ul>{li}</ul>"},
+            {"title": "", "body": "<p>end</p>"},
+        ],
+    }
+
+
+def test_extra_field_written_after_fixed_fields():
+    parser = PaiAppParser(
+        field_rules=[*PaiAppParser.FIELD_RULES, PaiFieldRule(name="price", label="价格")]
+    )
+    (app,) = parser.parse_apps(
+        article("<li>平台：iOS, macOS</li><li>价格：免费 / 订阅</li>")
+    )
+
+    assert app.platforms == ["iOS", "macOS"]
+    assert app.frontmatter.extra == {"price": ["免费", "订阅"]}
+    lines = app.content.split("---\n")[1].splitlines()
+    assert lines[-4].startswith("released_time: ")
+    assert lines[-3:] == ["price:", "- 免费", "- 订阅"]
+
+
+def test_missing_extra_field_is_empty_list():
+    parser = PaiAppParser(field_rules=parse_field_rules("platforms=平台,price=价格"))
+    (app,) = parser.parse_apps(article("<li>平台：Android</li>"))
+
+    assert app.platforms == ["Android"]
+    assert app.frontmatter.keywords == []
+    assert app.content.split("---\n")[1].splitlines()[-1] == "price: []"
+
+
+def test_field_rule_conflicts_with_fixed_field():
+    with pytest.raises(ValueError):
+        PaiAppParser(field_rules=[PaiFieldRule(name="title", label="标题")])
+    with pytest.raises(ValueError):
+        parse_field_rules("price")
@@ -0,0 +1,72 @@
+import copy
+import json
+import os
+import time
+
+import pytest
+
+from spider import PaiAppParser
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "golden")
+# lxml 修复不规范 html 的方式与 html.parser 不同, 这些样本只要求 html.parser 的输出一致
+LXML_DIVERGES = {"malformed"}
+
+
+def golden_names() -> list[str]:
+    return sorted(n[:-5] for n in os.listdir(GOLDEN_DIR) if n.endswith(".json"))
+
+
+def golden_cases() -> list:
+    cases = []
+    for name in golden_names():
+        cases.append(pytest.param("html.parser", name, id=f"html.parser-{name}"))
+        marks = []
+        if name in LXML_DIVERGES:
+            marks.append(pytest.mark.xfail(reason="lxml 对不规范 html 的修复方式不同"))
+        cases.append(pytest.param("lxml", name, id=f"lxml-{name}", marks=marks))
+    return cases
+
+
+@pytest.fixture(autouse=True)
+def utc_timezone(monkeypatch):
+    """
+    frontmatter 中的发布时间按本地时区格式化, golden 文件以 UTC 生成
+    """
+    if not hasattr(time, "tzset"):
+        pytest.skip("当前平台不支持 time.tzset")
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def parse(backend: str, article: dict) -> list[dict]:
+    parser = PaiAppParser(backend=backend)
+    return [
+        {
+            "file_title": app.file_title,
+            "platforms": app.platforms,
+            "img_list": app.img_list,
+            "content": app.content,
+        }
+        for app in parser.parse_apps(copy.deepcopy(article))
+    ]
+
+
+@pytest.mark.parametrize(("backend", "name"), golden_cases())
+def test_parse_matches_golden(backend: str, name: str):
+    if backend == "lxml":
+        pytest.importorskip("lxml")
+    path = os.path.join(GOLDEN_DIR, f"{name}.json")
+    with open(path, encoding="utf-8") as f:
+        golden = json.load(f)
+
+    apps = parse(backend, golden["article"])
+    # 有意修改输出时使用 UPDATE_GOLDEN=1 重新生成
+    if os.environ.get("UPDATE_GOLDEN") and backend == "html.parser":
+        golden["apps"] = apps
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(golden, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    assert apps == golden["apps"]
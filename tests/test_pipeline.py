@@ -0,0 +1,156 @@
+import asyncio
+import datetime as dt
+import sqlite3
+import time
+
+import pytest
+
+from spider import PaiArticleFetcher, PaiCrawlPipeline
+
+
+class StubFetcher:
+    async def fetch_article_detail(self, article_id: int) -> dict:
+        return {"id": article_id, "title": "派评 | 近期值得关注的 App", "body": ""}
+
+
+class LockedManifest:
+    """
+    多个 worker 进程共用抓取清单时可能出现的锁冲突
+    """
+
+    def hash_article(self, article: dict) -> str:
+        return str(article["id"])
+
+    def is_body_unchanged(self, article_id: int, body_hash: str, config_hash: str) -> bool:
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_manifest_error_marks_article_failed_without_stalling():
+    pipeline = PaiCrawlPipeline(
+        fetcher=StubFetcher(),
+        parser=None,
+        saver=None,
+        article_concurrency=2,
+        queue_size=1,
+        manifest=LockedManifest(),
+    )
+    jobs = [(aid, None) for aid in range(1, 11)]
+
+    asyncio.run(asyncio.wait_for(pipeline.run_jobs(jobs), timeout=5))
+
+    assert pipeline.failed_article_ids == set(range(1, 11))
+    assert pipeline.stats["articles_failed"] == 10
+
+
+class StubFeedFetcher(PaiArticleFetcher):
+    """
+    文章列表来自内存, 探测 failing 中的 offset 时请求失败
+    """
+
+    def __init__(self, count: int, failing: set[int]):
+        super().__init__()
+        now = int(time.time())
+        self.feed = [
+            {
+                "id": count - i,
+                "title": "派评 | 近期值得关注的 App",
+                "released_time": now - i * 86400,
+            }
+            for i in range(count)
+        ]
+        self.failing = failing
+        self.requests: list[tuple[int, int, bool]] = []
+
+    async def _fetch_feed_page(self, limit, offset, archive):
+        self.requests.append((limit, offset, archive))
+        if limit == 1 and offset in self.failing:
+            return None
+        return self.feed[offset : offset + limit]
+
+    async def fetch_article_detail(self, article_id: int) -> dict | None:
+        return None
+
+
+def test_feed_probe_failure_raises_instead_of_ending_feed():
+    fetcher = StubFeedFetcher(30, failing={5})
+
+    assert asyncio.run(fetcher.fetch_feed_released_time(40)) is None
+    with pytest.raises(RuntimeError):
+        asyncio.run(fetcher.fetch_feed_released_time(5))
+    assert [archive for _, _, archive in fetcher.requests] == [False, False]
+
+
+def test_feed_seek_falls_back_to_scan_when_probe_fails():
+    end = dt.datetime.now()
+    start = end - dt.timedelta(days=40)
+    jobs = []
+    for failing in (set(), {10}):
+        fetcher = StubFeedFetcher(60, failing=failing)
+        pipeline = PaiCrawlPipeline(
+            fetcher=fetcher,
+            parser=None,
+            saver=None,
+            page_size=5,
+            sleep_time=0,
+            feed_seek=True,
+        )
+        asyncio.run(pipeline.run(start, end))
+        jobs.append(pipeline.stats["articles_matched"])
+
+    assert jobs == [40, 40]
+
+
+class OrderedSaver:
+    def __init__(self, events: list[str], durable: bool):
+        self.events = events
+        self.flush_is_durable = durable
+
+    async def flush(self):
+        self.events.append("flush")
+
+
+class OrderedManifest:
+    def __init__(self, events: list[str]):
+        self.events = events
+
+    def record_articles(self, records):
+        self.events.append(f"record {[r[0] for r in records]}")
+
+
+def record_pipeline(events: list[str], durable: bool) -> PaiCrawlPipeline:
+    return PaiCrawlPipeline(
+        fetcher=None,
+        parser=None,
+        saver=OrderedSaver(events, durable),
+        manifest=OrderedManifest(events),
+        record_batch_size=3,
+    )
+
+
+def test_manifest_records_wait_for_sink_flush():
+    events: list[str] = []
+    pipeline = record_pipeline(events, durable=True)
+
+    async def main():
+        await pipeline._record_article((1,), 2)
+        assert events == []
+        await pipeline._record_article((2,), 2)
+        await pipeline._record_article((3,), 1)
+        await pipeline.commit_records()
+
+    asyncio.run(main())
+    assert events == ["flush", "record [1, 2]", "flush", "record [3]"]
+
+
+def test_manifest_records_wait_for_close_when_flush_not_durable():
+    events: list[str] = []
+    pipeline = record_pipeline(events, durable=False)
+
+    async def main():
+        for aid in range(1, 5):
+            await pipeline._record_article((aid,), 2)
+
+    asyncio.run(main())
+    assert events == []
+    asyncio.run(pipeline.commit_records())
+    assert events == ["flush", "record [1, 2, 3, 4]"]
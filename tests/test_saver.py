@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from spider import (
+    PaiAppParser,
+    PaiAppSaver,
+    PaiFileWriter,
+    PaiImageOptimizer,
+    PaiImageQueue,
+    PaiJsonlSink,
+    PaiMarkdownSink,
+)
+
+PIL = pytest.importorskip("PIL.Image")
+
+GOOD = "https://cdnfile.sspai.com/2024/06/20/good.png?imageView2/2/w/1120"
+BAD = "https://cdnfile.sspai.com/2024/06/20/bad.png?imageView2/2/w/1120"
+
+
+def png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    PIL.new("RGB", (8, 8), "red").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class StubFetcher:
+    """
+    GOOD 为有效的 png, BAD 的内容无法解码, 优化时失败
+    """
+
+    IMAGES = {GOOD: png_bytes(), BAD: b"\x89PNG broken"}
+
+    async def download_image(self, url: str, path: str, **kwargs) -> str:
+        # 解析时 png 链接追加了 /format/webp
+        data = self.IMAGES[url.removesuffix("/format/webp")]
+        with open(path, "wb") as f:
+            f.write(data)
+        return hashlib.sha256(data).hexdigest()
+
+
+def parse_app():
+    body = f'<p>正文</p><img src="{GOOD}"><img src="{BAD}"><ul><li>平台：iOS</li></ul>'
+    (app,) = PaiAppParser().parse_apps(
+        {
+            "id": 1,
+            "title": "派评 | 近期值得关注的 App",
+            "released_time": 1718841600,
+            "body": "",
+            "body_extends": [
+                {"title": "", "body": "<p>编注</p>"},
+                {"title": "Ivory：效率利器", "body": body},
+                {"title": "", "body": "<p>end</p>"},
+            ],
+        }
+    )
+    return app
+
+
+def create_saver(output_dir: str, executor, image_queue=None) -> PaiAppSaver:
+    return PaiAppSaver(
+        output_dir=output_dir,
+        fetcher=StubFetcher(),
+        writer=PaiFileWriter(),
+        image_optimizer=PaiImageOptimizer(output_dir, executor, image_format="webp"),
+        image_queue=image_queue,
+    )
+
+
+def saved_markdown(saver: PaiAppSaver, app) -> tuple[str, list[str]]:
+    filepath = saver.app_filepath(app)
+    with open(filepath, encoding="utf-8") as f:
+        content = f.read()
+    images = sorted(os.listdir(os.path.join(os.path.dirname(filepath), "images")))
+    return content, images
+
+
+def test_failed_optimization_keeps_original_name(tmp_path):
+    app = parse_app()
+    with ThreadPoolExecutor(2) as executor:
+        saver = create_saver(str(tmp_path), executor)
+
+        async def main():
+            result = await saver.save_app_async(app, asyncio.Semaphore(4))
+            await saver.close()
+            return result
+
+        assert asyncio.run(main())[:2] == (2, 0)
+        saver.writer.close()
+
+    content, images = saved_markdown(saver, app)
+    assert images == ["bad.png", "good.webp"]
+    assert "(images/good.webp)" in content
+    assert "(images/bad.png)" in content
+    bad_path = os.path.join(os.path.dirname(saver.app_filepath(app)), "images", "bad.png")
+    with open(bad_path, "rb") as f:
+        assert f.read() == StubFetcher.IMAGES[BAD]
+
+
+def test_failed_optimization_restores_queued_links(tmp_path):
+    app = parse_app()
+    with ThreadPoolExecutor(2) as executor:
+        queue = PaiImageQueue(str(tmp_path))
+        saver = create_saver(str(tmp_path), executor, image_queue=queue)
+
+        async def main():
+            semaphore = asyncio.Semaphore(4)
+            await saver.save_app_async(app, semaphore)
+            content, _ = saved_markdown(saver, app)
+            assert "(images/bad.webp)" in content
+            return await saver.process_image_queue(semaphore)
+
+        assert asyncio.run(main()) == (2, 0)
+        saver.writer.close()
+        queue.close()
+
+    content, images = saved_markdown(saver, app)
+    assert images == ["bad.png", "good.webp"]
+    assert "(images/good.webp)" in content
+    assert "(images/bad.png)" in content
+
+
+def test_sink_records_point_to_saved_images(tmp_path):
+    app = parse_app()
+    app.subdir = "roundup"
+    jsonl_path = os.path.join(str(tmp_path), "apps.jsonl")
+    with ThreadPoolExecutor(2) as executor:
+        saver = create_saver(str(tmp_path), executor)
+        saver.sinks = [
+            PaiMarkdownSink(saver.writer),
+            PaiJsonlSink(jsonl_path, str(tmp_path)),
+        ]
+
+        async def main():
+            await saver.save_app_async(app, asyncio.Semaphore(4))
+            await saver.close()
+
+        asyncio.run(main())
+        saver.writer.close()
+
+    with open(jsonl_path, encoding="utf-8") as f:
+        (record,) = [json.loads(line) for line in f]
+    assert record["path"] == os.path.relpath(saver.app_filepath(app), str(tmp_path))
+    assert [image["path"] for image in record["images"]] == [
+        os.path.join("roundup", "2024-06-20", "images", name)
+        for name in ("good.webp", "bad.png")
+    ]
+    for image in record["images"]:
+        assert os.path.isfile(os.path.join(str(tmp_path), image["path"]))
@@ -0,0 +1,52 @@
+import pytest
+
+from spider import PaiAppParser
+from spider.parser import parse_field_rules
+from spider.selector import PAIPING_SELECTOR, parse_selectors
+
+
+def test_custom_selector_with_own_fields():
+    paiping, roundup = parse_selectors(
+        "paiping,roundup=App+推荐@price=价格;developer=开发者"
+    )
+
+    assert paiping is PAIPING_SELECTOR
+    assert paiping.parser is None
+    assert roundup.keywords == ("App", "推荐")
+    assert roundup.subdir == "roundup"
+    (app,) = roundup.parser.parse_apps(
+        {
+            "id": 1,
+            "title": "App 推荐",
+            "released_time": 1712345678,
+            "body": "",
+            "body_extends": [
+                {"title": "", "body": "<p>编注</p>"},
+                {
+                    "title": "Ivory：效率利器",
+                    "body": "<ul><li>平台：iOS</li><li>价格：免费</li></ul>",
+                },
+                {"title": "", "body": "<p>end</p>"},
+            ],
+        }
+    )
+    assert app.platforms == ["iOS"]
+    assert app.frontmatter.extra == {"price": ["免费"], "developer": []}
+
+
+def test_selector_fields_follow_base_rules():
+    (selector,) = parse_selectors(
+        "roundup=推荐@developer=开发者",
+        field_rules=[*PaiAppParser.FIELD_RULES, *parse_field_rules("price=价格")],
+    )
+    names = [rule.name for rule in selector.parser._field_rules]
+    assert names == ["platforms", "keywords", "price", "developer"]
+
+
+def test_selector_errors():
+    with pytest.raises(ValueError):
+        parse_selectors("unknown")
+    with pytest.raises(ValueError):
+        parse_selectors("roundup=推荐,roundup=App")
+    with pytest.raises(ValueError):
+        parse_selectors("roundup=推荐@price")
@@ -0,0 +1,59 @@
+import asyncio
+
+from spider import PaiCrawlPipeline
+
+
+class StubPipeline(PaiCrawlPipeline):
+    """
+    首页固定为 articles, failing 中的文章每轮都处理失败
+    """
+
+    def __init__(self, articles: list[int], failing: set[int], polls: int):
+        super().__init__(fetcher=None, parser=None, saver=None)
+        self.articles = articles
+        self.failing = failing
+        self.polls = polls
+        self.processed: list[list[int]] = []
+        self.stop = asyncio.Event()
+
+    async def _poll_head(self, high_water, max_pages):
+        self.polls -= 1
+        if self.polls <= 0:
+            self.stop.set()
+        jobs = [(aid, None) for aid in self.articles if aid > (high_water or 0)]
+        return jobs, max(self.articles)
+
+    async def run_jobs(self, jobs):
+        self.processed.append([aid for aid, _ in jobs])
+        self.failed_article_ids = {aid for aid, _ in jobs} & self.failing
+
+
+def run_watch(pipeline: StubPipeline, **kwargs) -> list[tuple[int, dict]]:
+    states = []
+
+    async def on_state(high_water, failures):
+        states.append((high_water, dict(failures)))
+
+    asyncio.run(
+        pipeline.watch(
+            10, interval=0, jitter=0, on_state=on_state, stop=pipeline.stop, **kwargs
+        )
+    )
+    return states
+
+
+def test_failing_article_given_up_after_max_failures():
+    pipeline = StubPipeline([11, 12, 13], failing={12}, polls=4)
+    states = run_watch(pipeline, max_failures=3)
+
+    assert pipeline.processed == [[11, 12, 13], [12, 13], [12, 13]]
+    assert states == [(11, {12: 1}), (11, {12: 2}), (13, {})]
+    assert pipeline.stats["watch_gave_up"] == 1
+
+
+def test_failure_count_resumes_from_saved_state():
+    pipeline = StubPipeline([11, 12], failing={11}, polls=2)
+    states = run_watch(pipeline, max_failures=3, failures={11: 2})
+
+    assert pipeline.processed == [[11, 12]]
+    assert states == [(12, {})]
@@ -0,0 +1,22 @@
+import time
+
+from spider import PaiWorkQueue
+
+
+def test_stale_worker_cannot_complete_taken_over_shard(tmp_path):
+    queue = PaiWorkQueue(str(tmp_path / "queue.sqlite3"), lease_seconds=0.05)
+    queue.plan([(1, None), (2, None)], shard_size=2)
+
+    stale = queue.claim("a")
+    time.sleep(0.1)
+    current = queue.claim("b")
+    assert current.id == stale.id
+
+    assert not queue.complete(stale, "a", {"apps": 1}, failed_ids={2})
+    assert queue.summary()["shards"] == {"running": 1}
+
+    assert queue.complete(current, "b", {"apps": 2}, failed_ids={2})
+    summary = queue.summary()
+    assert summary["shards"] == {"done": 1, "pending": 1}
+    assert summary["apps"] == 2
+    queue.close()